@@ -1,7 +1,13 @@
 import gradio as gr
 import os
-from agentset_gradio_demo.rag_system import RAGSystem
-from agentset_gradio_demo.document_ingester import DocumentIngester
+import queue
+import threading
+import time
+from agentset_gradio_demo.client_pool import registry
+from agentset_gradio_demo.history import ChatHistory
+from agentset_gradio_demo.metrics import metrics
+from agentset_gradio_demo.prefetch import PrefetchManager
+from agentset_gradio_demo.router import AUTO_MODEL
 from agentset_gradio_demo import config
 
 css = """
@@ -11,89 +17,186 @@ footer { display: none !important; }
 """
 
 class AppState:
+    """Per-session settings; API clients come from the shared registry."""
     def __init__(self):
         self.openai_api_key, self.agentset_api_key, self.agentset_namespace = \
             config.OPENAI_API_KEY or "", config.AGENTSET_API_KEY or "", config.AGENTSET_NAMESPACE_ID or ""
         self.openai_model, self.top_k, self.min_score = config.OPENAI_MODEL, config.TOP_K, config.MIN_SCORE
+        self.multi_query, self.extra_namespaces = config.MULTI_QUERY_ENABLED, list(config.EXTRA_NAMESPACES)
+        self.history = ChatHistory(config.HISTORY_MAX_TURNS, config.HISTORY_TOKEN_BUDGET,
+                                   config.HISTORY_SUMMARY_LINES, config.HISTORY_SUMMARY_CHARS)
 
     def is_configured(self):
         return all([self.openai_api_key, self.agentset_api_key, self.agentset_namespace])
 
     def get_ingester(self):
-        return DocumentIngester(self.agentset_namespace, self.agentset_api_key)
+        return registry.get_ingester(self.agentset_namespace, self.agentset_api_key)
 
     def get_rag_system(self):
-        return RAGSystem(self.agentset_namespace, self.agentset_api_key, self.openai_api_key,
-                         config.SYSTEM_PROMPT, self.openai_model)
+        return registry.get_rag_system(self.agentset_namespace, self.agentset_api_key, self.openai_api_key,
+                                       config.SYSTEM_PROMPT, self.openai_model)
 
-state = AppState()
+    def get_async_rag_system(self):
+        return registry.get_async_rag_system(self.agentset_namespace, self.agentset_api_key, self.openai_api_key,
+                                             config.SYSTEM_PROMPT, self.openai_model)
 
-def save_config(openai_key, agentset_key, namespace_id):
+    def search_namespaces(self):
+        return [self.agentset_namespace, *self.extra_namespaces] if self.extra_namespaces else None
+
+    def retrieval_params(self):
+        return (self.agentset_namespace, self.openai_model, self.top_k, self.min_score, self.multi_query, tuple(self.extra_namespaces))
+
+prefetcher = PrefetchManager(debounce=config.PREFETCH_DEBOUNCE, max_inflight=config.PREFETCH_MAX_INFLIGHT,
+                             min_chars=config.PREFETCH_MIN_CHARS, ttl=config.PREFETCH_TTL,
+                             min_coverage=config.PREFETCH_MIN_COVERAGE)
+
+def save_config(openai_key, agentset_key, namespace_id, state):
+    # Pooled clients are shared across sessions; the registry drops them once no session has used them for a while
     state.openai_api_key, state.agentset_api_key, state.agentset_namespace = openai_key, agentset_key, namespace_id
-    return "Configuration saved" if state.is_configured() else "Missing required fields"
+    return gr.update(visible=True, value="Configuration saved" if state.is_configured() else "Missing required fields"), state
 
-def save_settings(model, top_k, min_score):
+def save_settings(model, top_k, min_score, multi_query, extra_namespaces, state):
     state.openai_model, state.top_k, state.min_score = model, int(top_k), min_score
-    return "Settings saved"
+    state.multi_query = multi_query
+    state.extra_namespaces = [ns.strip() for ns in extra_namespaces.split(",") if ns.strip() and ns.strip() != state.agentset_namespace]
+    return gr.update(visible=True, value="Settings saved"), state
+
+
+def _format_sources(chunks, preview=300):
+    items = "\n\n".join(f"**[{i}] {c['id']}** (score {c['score']:.3g}{', truncated' if c['truncated'] else ''})\n\n> {c['text'][:preview].replace(chr(10), ' ')}{'...' if len(c['text']) > preview else ''}"
+        for i, c in enumerate(chunks, start=1))
+    return f"\n\n<details><summary>View Sources ({len(chunks)})</summary>\n\n{items}\n</details>"
 
+async def prefetch(message, state, request: gr.Request = None):
+    if not config.PREFETCH_ENABLED or request is None or not state.is_configured(): return
+    rag = state.get_async_rag_system()
+    prefetcher.schedule(request.session_hash, message or "", state.retrieval_params(),
+                        lambda q: rag.aretrieve_chunks(q, top_k=state.top_k, min_score=state.min_score,
+                                                       multi_query=state.multi_query, namespaces=state.search_namespaces()))
 
-def chat(message, history):
-    if not message: return history, ""
-    history.append({"role": "user", "content": message})
+async def chat(message, state, request: gr.Request = None):
+    # The transcript lives in the session state; the browser does not send it back with every question
+    if not message:
+        yield gr.skip(), ""
+        return
+    shown = state.history.display() + [{"role": "user", "content": message}]
     if not state.is_configured():
-        history.append({"role": "assistant", "content": "Please configure your API keys in the Settings tab first."})
-        return history, ""
+        shown.append({"role": "assistant", "content": "Please configure your API keys in the Settings tab first."})
+        yield shown, ""
+        return
+    shown.append({"role": "assistant", "content": ""})
+    yield shown, ""
+    answer, footer = "", ""
     try:
-        result = state.get_rag_system().query(message, top_k=state.top_k, min_score=state.min_score)
-        response = result["response"]
-        if ctx := result.get("context", ""):
-            response += f"\n\n<details><summary>View Sources</summary>\n\n```\n{ctx[:1500]}{'...' if len(ctx) > 1500 else ''}\n```\n</details>"
-        history.append({"role": "assistant", "content": response})
+        chunks = await prefetcher.take(request.session_hash, message, state.retrieval_params()) if request else None
+        last_update = 0.0
+        async for event in state.get_async_rag_system().astream_query(message, top_k=state.top_k, min_score=state.min_score,
+                                                                       multi_query=state.multi_query, namespaces=state.search_namespaces(), chunks=chunks,
+                                                                       history=state.history.messages(state.openai_model)):
+            if event["type"] == "delta":
+                shown[-1]["content"] += event["content"]
+                # Coalesce tokens into UI updates; streamed updates reach the browser as diffs
+                if time.monotonic() - last_update >= config.CHAT_STREAM_UPDATE_INTERVAL:
+                    last_update = time.monotonic()
+                    yield shown, ""
+            elif event["type"] == "done":
+                answer = event["response"]
+                if event["chunks"]: footer += _format_sources(event["chunks"])
+                if state.openai_model == AUTO_MODEL: footer += f"\n\n<sub>Answered by {event['model']}</sub>"
     except Exception as e:
-        history.append({"role": "assistant", "content": f"Error: {e}"})
-    return history, ""
+        answer, footer = "", f"Error: {e}"
+    state.history.add(message, answer, footer)
+    yield state.history.display(), ""
 
-def _handle_ingest(check_fn, action_fn):
+def clear_history(state):
+    state.history.clear()
+
+def _handle_ingest(state, check_fn, action_fn):
     if not state.is_configured(): return gr.update(visible=True, value="Configure API keys first")
     if err := check_fn(): return gr.update(visible=True, value=err)
     try:
         result = action_fn()
-        msg = f"Job ID: {result['job_id']}" if result["success"] else f"Error: {result['message']}"
+        if not result["success"]: return gr.update(visible=True, value=f"Error: {result['message']}")
+        if result.get("skipped"): return gr.update(visible=True, value=f"Unchanged, skipped (Job ID: {result['job_id']})")
+        for job_id in result.get("job_ids") or [result["job_id"]]: state.get_ingester().job_tracker.track(job_id)
+        msg = f"Job ID: {result['job_id']}" + (" (replaced previous version)" if result.get("dedup") == "replaced" else "")
         return gr.update(visible=True, value=msg)
     except Exception as e: return gr.update(visible=True, value=f"Error: {e}")
 
-def ingest_text(text_content, file_name):
-    return _handle_ingest(lambda: "Enter text content" if not text_content else None,
+def ingest_text(text_content, file_name, state):
+    return _handle_ingest(state, lambda: "Enter text content" if not text_content else None,
         lambda: state.get_ingester().ingest_text(text_content, file_name or None, None))
 
-def ingest_url(doc_name, file_url):
-    return _handle_ingest(lambda: "Enter document name and URL" if not doc_name or not file_url else None,
+def ingest_url(doc_name, file_url, state):
+    return _handle_ingest(state, lambda: "Enter document name and URL" if not doc_name or not file_url else None,
         lambda: state.get_ingester().ingest_file_from_url(doc_name, file_url, None))
 
-def ingest_file(file, custom_name):
-    return _handle_ingest(lambda: "Upload a file" if file is None else None,
-        lambda: state.get_ingester().ingest_local_file(file.name, custom_name or os.path.basename(file.name), None))
+def ingest_file(file, custom_name, state):
+    return _handle_ingest(state, lambda: "Upload a file" if file is None else None,
+        lambda: state.get_ingester().ingest_local_file(file.name, custom_name or os.path.basename(file.name), None,
+                                                       config.PREPROCESS_FILES))
+
+def ingest_bulk(files, folder, state):
+    if not state.is_configured():
+        yield "Configure API keys first", []
+        return
+    paths = [getattr(f, "name", f) for f in (files or []) + (folder or [])]
+    if not paths:
+        yield "Upload files or a folder", []
+        return
+    updates, rows = queue.Queue(), []
+    on_progress = lambda done, total, result: updates.put((done, total, result))
+    items = [{"path": p, "file_name": os.path.basename(p)} for p in paths]
+    summary = {}
+    worker = threading.Thread(target=lambda: summary.update(state.get_ingester().ingest_batch(
+        items, config.INGEST_BATCH_CONCURRENCY, config.INGEST_MAX_RETRIES, progress_callback=on_progress,
+        preprocess=config.PREPROCESS_FILES)))
+    worker.start()
+    while worker.is_alive() or not updates.empty():
+        try: done, total, result = updates.get(timeout=0.5)
+        except queue.Empty: continue
+        status = "Error" if not result["success"] else "Unchanged" if result.get("skipped") else "Replaced" if result.get("dedup") == "replaced" else "Queued"
+        rows.append([os.path.basename(result["item"]), status, result.get("job_id") or result["message"]])
+        if status in ("Queued", "Replaced"):
+            for job_id in result.get("job_ids") or [result["job_id"]]: state.get_ingester().job_tracker.track(job_id)
+        yield f"Ingested {done}/{total} files...", rows
+    worker.join()
+    if not summary:
+        yield "Error: bulk ingestion failed, see logs", rows
+        return
+    yield (f"Done: {summary['succeeded']} succeeded ({summary['skipped']} unchanged, "
+           f"{summary['bytes_saved'] / 1e6:.1f} MB not re-uploaded), {summary['failed']} failed "
+           f"in {summary['elapsed_seconds']:.1f}s ({summary['docs_per_second']:.2f} docs/s)"), rows
 
-def check_status(job_id):
+def job_table(state):
+    if not state.is_configured(): return []
+    return [[j["job_id"], j["status"], j["polls"], f"{j['elapsed_seconds']:.0f}s"]
+            for j in state.get_ingester().job_tracker.jobs()]
+
+def check_status(job_id, state):
     if not state.is_configured(): return gr.update(visible=True, value="Configure API keys first")
     if not job_id: return gr.update(visible=True, value="Enter job ID")
     try: return gr.update(visible=True, value=state.get_ingester().get_job_status(job_id)["message"])
     except Exception as e: return gr.update(visible=True, value=f"Error: {e}")
 
 
-
-
-def create_chat_interface():
+def create_chat_interface(state):
     with gr.Column():
         chatbot = gr.Chatbot(show_label=False, height=400)
         msg = gr.Textbox(placeholder="Type your question...", show_label=False,
                          container=False, lines=1, max_lines=3, autofocus=True)
-        
-        msg.submit(chat, [msg, chatbot], [chatbot, msg])
+
+        msg.submit(chat, [msg, state], [chatbot, msg], api_name="chat",
+                   concurrency_id="chat", concurrency_limit=config.CHAT_CONCURRENCY_LIMIT)
+        chatbot.clear(clear_history, [state], None, queue=False, api_name=False)
+        msg.change(prefetch, [msg, state], None, trigger_mode="always_last", show_progress="hidden",
+                   concurrency_limit=None, api_name=False)
 
 
-def create_ingest_interface():
+def create_ingest_interface(state):
     result_box = lambda lbl="Result": gr.Textbox(label=lbl, interactive=False, lines=1, visible=False)
+    ingest_queue = dict(concurrency_id="ingest", concurrency_limit=config.INGEST_CONCURRENCY_LIMIT)
+    status_queue = dict(concurrency_id="status", concurrency_limit=config.STATUS_CONCURRENCY_LIMIT)
     with gr.Column():
         gr.Markdown("### Ingest Documents\nAdd documents to your knowledge base.")
         with gr.Tabs():
@@ -103,7 +206,7 @@ def create_ingest_interface():
                     txt_name = gr.Textbox(label="File name (optional)", placeholder="my-document.txt", scale=2)
                     txt_btn = gr.Button("Ingest Text", variant="primary", scale=1)
                 txt_out = result_box()
-                txt_btn.click(ingest_text, [txt_content, txt_name], txt_out)
+                txt_btn.click(ingest_text, [txt_content, txt_name, state], txt_out, **ingest_queue)
             with gr.Tab("URL"):
                 with gr.Row():
                     url_name = gr.Textbox(label="Document name", placeholder="My Document")
@@ -111,7 +214,7 @@ def create_ingest_interface():
                 with gr.Row():
                     url_out = result_box()
                     url_btn = gr.Button("Ingest from URL", variant="primary")
-                url_btn.click(ingest_url, [url_name, url_input], url_out)
+                url_btn.click(ingest_url, [url_name, url_input, state], url_out, **ingest_queue)
             with gr.Tab("Upload"):
                 with gr.Row():
                     file_input = gr.File(label="Choose a file")
@@ -119,43 +222,90 @@ def create_ingest_interface():
                 with gr.Row():
                     file_out = result_box()
                     file_btn = gr.Button("Upload & Ingest", variant="primary")
-                file_btn.click(ingest_file, [file_input, file_name], file_out)
+                file_btn.click(ingest_file, [file_input, file_name, state], file_out, **ingest_queue)
+            with gr.Tab("Bulk"):
+                with gr.Row():
+                    bulk_files = gr.File(label="Choose files", file_count="multiple")
+                    bulk_folder = gr.File(label="Or a folder", file_count="directory")
+                bulk_btn = gr.Button("Ingest All", variant="primary")
+                bulk_out = gr.Textbox(show_label=False, interactive=False, lines=1)
+                bulk_table = gr.Dataframe(headers=["File", "Status", "Job ID / Error"], interactive=False)
+                bulk_btn.click(ingest_bulk, [bulk_files, bulk_folder, state], [bulk_out, bulk_table],
+                               concurrency_id="bulk", concurrency_limit=config.BULK_INGEST_CONCURRENCY_LIMIT)
             with gr.Tab("Check Status"):
                 with gr.Row():
                     job_input = gr.Textbox(label="Job ID", placeholder="Enter the job ID...")
                     job_out = result_box("Status")
                 job_btn = gr.Button("Check Status", variant="primary")
-                job_btn.click(check_status, [job_input], job_out)
+                job_btn.click(check_status, [job_input, state], job_out, api_name="check_status", **status_queue)
+                gr.Markdown("#### Tracked jobs")
+                jobs_table = gr.Dataframe(headers=["Job ID", "Status", "Polls", "Elapsed"], interactive=False)
+                gr.Timer(3).tick(job_table, [state], jobs_table, show_progress="hidden", **status_queue)
 
 
-def create_settings_interface():
+def create_settings_interface(state):
+    defaults = AppState()
     with gr.Column():
         gr.Markdown("### Settings\nConfigure API keys and model preferences.")
         with gr.Tabs():
             with gr.Tab("API Configuration"):
-                cfg_openai = gr.Textbox(label="OpenAI API Key", type="password", value=state.openai_api_key, placeholder="sk-...")
-                cfg_agentset = gr.Textbox(label="Agentset API Key", type="password", value=state.agentset_api_key, placeholder="agentset_...")
-                cfg_namespace = gr.Textbox(label="Namespace ID", value=state.agentset_namespace, placeholder="ns_...")
+                cfg_openai = gr.Textbox(label="OpenAI API Key", type="password", value=defaults.openai_api_key, placeholder="sk-...")
+                cfg_agentset = gr.Textbox(label="Agentset API Key", type="password", value=defaults.agentset_api_key, placeholder="agentset_...")
+                cfg_namespace = gr.Textbox(label="Namespace ID", value=defaults.agentset_namespace, placeholder="ns_...")
                 cfg_out = gr.Textbox(show_label=False, interactive=False, visible=False, lines=1)
                 cfg_btn = gr.Button("Save Configuration", variant="primary")
-                cfg_btn.click(lambda *args: gr.update(visible=True, value=save_config(*args)), [cfg_openai, cfg_agentset, cfg_namespace], cfg_out)
+                cfg_btn.click(save_config, [cfg_openai, cfg_agentset, cfg_namespace, state], [cfg_out, state], api_name="save_config", queue=False)
             with gr.Tab("Model Settings"):
-                set_model = gr.Dropdown(label="Model", choices=config.AVAILABLE_MODELS, value=state.openai_model)
-                set_topk = gr.Slider(label="Results to retrieve (Top-K)", minimum=1, maximum=20, value=state.top_k, step=1)
-                set_score = gr.Slider(label="Minimum relevance score", minimum=0.0, maximum=1.0, value=state.min_score, step=0.05)
+                set_model = gr.Dropdown(label="Model", choices=config.AVAILABLE_MODELS, value=defaults.openai_model)
+                set_topk = gr.Slider(label="Results to retrieve (Top-K)", minimum=1, maximum=20, value=defaults.top_k, step=1)
+                set_score = gr.Slider(label="Minimum relevance score", minimum=0.0, maximum=1.0, value=defaults.min_score, step=0.05)
+                set_multi = gr.Checkbox(label="Multi-query retrieval (search the parts of compound questions in parallel)", value=defaults.multi_query)
+                set_namespaces = gr.Textbox(label="Additional namespaces to search", value=", ".join(defaults.extra_namespaces), placeholder="ns_..., ns_...")
                 set_out = gr.Textbox(show_label=False, interactive=False, visible=False, lines=1)
                 set_btn = gr.Button("Save Settings", variant="primary")
-                set_btn.click(lambda *args: gr.update(visible=True, value=save_settings(*args)), [set_model, set_topk, set_score], set_out)
+                set_btn.click(save_settings, [set_model, set_topk, set_score, set_multi, set_namespaces, state], [set_out, state],
+                              api_name="save_settings", queue=False)
+
+def build_demo():
+    """Build the Gradio UI; deferred so importing this module does not construct it."""
+    theme = gr.themes.Base(primary_hue="orange")
+    with gr.Blocks(title="Agentset Gradio Demo", theme=theme, css=css) as demo:
+        gr.Markdown("<div id='title'>Agentset Gradio Demo</div>")
+        gr.Markdown("<div id='desc'>Ask questions about your ingested documents.</div>")
+        session = gr.State(AppState())  # copied per browser session
+        with gr.Tabs():
+            with gr.Tab("Chat", id="chat"): create_chat_interface(session)
+            with gr.Tab("Ingest Documents", id="ingest"): create_ingest_interface(session)
+            with gr.Tab("Settings", id="settings"): create_settings_interface(session)
+    return demo.queue(default_concurrency_limit=config.QUEUE_DEFAULT_CONCURRENCY_LIMIT, max_size=config.QUEUE_MAX_SIZE)
+
+_demo = None
+
+def get_demo():
+    global _demo
+    if _demo is None: _demo = build_demo()
+    return _demo
+
+def __getattr__(name):
+    # Keeps `app.demo` (e.g. for `gradio app.py` reload mode) working with the deferred build
+    if name == "demo": return get_demo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_app():
+    """FastAPI app serving the Gradio UI at / and Prometheus metrics at /metrics (summed across workers)."""
+    from fastapi import FastAPI, Response
+
+    app = FastAPI()
+    if config.METRICS_DIR:
+        metrics.export_snapshots(config.METRICS_DIR, config.METRICS_EXPORT_INTERVAL)
 
-theme = gr.themes.Base(primary_hue="orange")
+    @app.get("/metrics")
+    def metrics_endpoint():
+        text = metrics.render_aggregated(config.METRICS_DIR) if config.METRICS_DIR else metrics.render()
+        return Response(text, media_type="text/plain; version=0.0.4")
 
-with gr.Blocks(title="Agentset Gradio Demo", theme=theme, css=css) as demo:
-    gr.Markdown("<div id='title'>Agentset Gradio Demo</div>")
-    gr.Markdown("<div id='desc'>Ask questions about your ingested documents.</div>")
-    with gr.Tabs():
-        with gr.Tab("Chat", id="chat"): create_chat_interface()
-        with gr.Tab("Ingest Documents", id="ingest"): create_ingest_interface()
-        with gr.Tab("Settings", id="settings"): create_settings_interface()
+    return gr.mount_gradio_app(app, get_demo(), path="/")
 
 if __name__ == "__main__":
-    demo.launch()
+    import uvicorn
+    uvicorn.run(create_app(), host="127.0.0.1", port=7860)
@@ -0,0 +1,225 @@
+"""
+Batch QA - Answers a file of questions concurrently for evaluation and cache warming
+Reads questions from JSONL or CSV, runs retrieval and generation for a
+bounded number of them at a time on the async pipeline, and appends one
+JSONL result per question with per-stage timings, so an interrupted run
+resumes where it stopped
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from agentset_gradio_demo.rag_system import AsyncRAGSystem
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 100  # Answered questions between progress log lines
+
+
+def read_questions(path: str, question_field: str = "question", id_field: str = "id") -> Iterator[dict]:
+    """
+    Stream the questions of a JSONL or CSV file (CSV needs a header row).
+
+    Args:
+        path: Input file; ".csv" files are read as CSV, anything else as JSONL
+        question_field: Field holding the question
+        id_field: Field holding a stable question ID (the row number when missing)
+
+    Yields:
+        Dictionaries with 'id', 'question' and 'fields' (the row's other fields)
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (_parse_line(line) for line in f if line.strip())
+        for number, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                logger.warning(f"Skipping row {number} of {path}: not a JSON object")
+                continue
+            question = row.pop(question_field, None)
+            if not isinstance(question, str) or not question.strip():
+                logger.warning(f"Skipping row {number} of {path}: no '{question_field}' text")
+                continue
+            question = question.strip()
+            question_id = row.pop(id_field, None)
+            yield {
+                "id": str(question_id) if question_id not in (None, "") else str(number),
+                "question": question,
+                "fields": row,
+            }
+
+
+def _parse_line(line: str):
+    """One JSONL row, or None when the line is not valid JSON."""
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return None
+
+
+def completed_ids(path: str) -> set:
+    """IDs of the questions an earlier run already answered (failed ones are retried)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # Last line of an interrupted run
+                continue
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    """Whether a file is empty or its last line is complete."""
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _percentiles(values: list) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"p50": None, "p95": None}
+    pick = lambda q: round(values[min(len(values) - 1, int(len(values) * q))], 3)
+    return {"p50": pick(0.5), "p95": pick(0.95)}
+
+
+async def _answer(rag: "AsyncRAGSystem", item: dict, options: dict) -> dict:
+    """Retrieve and answer one question, timing each stage."""
+    record = {"id": item["id"], "question": item["question"], "fields": item["fields"]}
+    timings = record["timings"] = {}
+    start = time.perf_counter()
+    try:
+        chunks = await rag.aretrieve_chunks(
+            item["question"],
+            top_k=options["top_k"],
+            min_score=options["min_score"],
+            multi_query=options["multi_query"],
+        )
+        timings["retrieve_s"] = round(time.perf_counter() - start, 4)
+        record["sources"] = [{"id": c.id, "score": c.score} for c in chunks]
+        if not options["retrieve_only"]:
+            generate_start = time.perf_counter()
+            result = await rag.aquery(item["question"], use_cache=options["use_cache"], chunks=chunks)
+            timings["generate_s"] = round(time.perf_counter() - generate_start, 4)
+            record["response"], record["model"] = result["response"], result["model"]
+    except Exception as e:
+        logger.error(f"Question {item['id']} failed: {str(e)}")
+        record["error"] = str(e)
+    timings["total_s"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+async def run_batch(
+    rag: "AsyncRAGSystem",
+    questions: Iterable[dict],
+    output_path: str,
+    concurrency: int = 16,
+    top_k: int = 10,
+    min_score: float = 0.5,
+    multi_query: bool = False,
+    retrieve_only: bool = False,
+    use_cache: bool = True,
+    resume: bool = True,
+) -> dict:
+    """
+    Answer questions with at most `concurrency` in flight and append the results to a JSONL file.
+
+    Results are written as they finish (not in input order) and flushed line
+    by line. With resume, questions whose ID already has a successful result
+    in output_path are skipped; otherwise the file is overwritten.
+
+    Args:
+        rag: Async RAG system answering the questions
+        questions: Dictionaries from read_questions()
+        output_path: JSONL file receiving one record per question
+        concurrency: Questions processed at the same time
+        top_k: Number of documents to retrieve
+        min_score: Minimum relevance score
+        multi_query: Expand questions into sub-queries searched in parallel
+        retrieve_only: Only retrieve (e.g. to warm the retrieval cache)
+        use_cache: Serve and store answers through the response cache
+        resume: Skip questions answered by an earlier run
+
+    Returns:
+        Summary with 'answered', 'failed', 'skipped', 'elapsed_seconds',
+        'questions_per_second' and p50/p95 seconds per stage
+    """
+    done = completed_ids(output_path) if resume else set()
+    options = dict(
+        top_k=top_k,
+        min_score=min_score,
+        multi_query=multi_query,
+        retrieve_only=retrieve_only,
+        use_cache=use_cache,
+    )
+    pending = asyncio.Queue(maxsize=concurrency * 2)  # Questions are read as workers free up
+    stages = {"retrieve_s": [], "generate_s": [], "total_s": []}
+    counts = {"answered": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+        if resume and not _ends_with_newline(output_path):
+            output.write("\n")  # Close a line left partial by an interrupted run
+
+        async def worker():
+            while (item := await pending.get()) is not None:
+                record = await _answer(rag, item, options)
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                counts["failed" if "error" in record else "answered"] += 1
+                for stage, seconds in record["timings"].items():
+                    stages[stage].append(seconds)
+                finished = counts["answered"] + counts["failed"]
+                if finished % PROGRESS_EVERY == 0:
+                    logger.info(
+                        f"Batch: {finished} questions done ({counts['failed']} failed) "
+                        f"in {time.perf_counter() - start:.0f}s"
+                    )
+
+        async def put(item):
+            """Queue an item, re-raising a worker's failure instead of waiting on a dead pool."""
+            put_task = asyncio.ensure_future(pending.put(item))
+            while not put_task.done():
+                running = [task for task in workers if not task.done()]
+                await asyncio.wait([put_task, *running], return_when=asyncio.FIRST_COMPLETED)
+                for task in workers:
+                    if task.done() and not task.cancelled() and task.exception() is not None:
+                        put_task.cancel()
+                        raise task.exception()
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            for item in questions:
+                if item["id"] in done:
+                    counts["skipped"] += 1
+                    continue
+                await put(item)
+            for _ in workers:
+                await put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    elapsed = time.perf_counter() - start
+    finished = counts["answered"] + counts["failed"]
+    return {
+        **counts,
+        "elapsed_seconds": round(elapsed, 3),
+        "questions_per_second": round(finished / elapsed, 3) if elapsed else None,
+        **{stage.removesuffix("_s"): _percentiles(values) for stage, values in stages.items()},
+    }
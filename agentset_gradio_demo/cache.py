@@ -0,0 +1,437 @@
+"""
+Cache - Result caches for the RAG pipeline
+In-memory LRU tier with TTL plus an optional on-disk SQLite tier
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+# Sentence punctuation ending a query; symbols inside words ("C++", "C#", "node.js") are kept
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups: casefolded, single spaces, no trailing punctuation."""
+    return _TRAILING_PUNCTUATION.sub("", " ".join(query.casefold().split()))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class LRUStore:
+    """
+    Thread-safe in-memory LRU map with per-entry TTL.
+
+    Args:
+        max_entries: Maximum number of entries kept (least recently used are evicted)
+        ttl: Seconds an entry stays valid (None keeps entries until evicted)
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_where(self, predicate) -> int:
+        """Delete every entry whose key matches predicate(key)."""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Persistent key/value tier backed by a SQLite file, with TTL and a row limit.
+
+    Values are stored as JSON, so only JSON-serializable values can be cached.
+    Every prune_every inserts, expired rows and the least recently used rows
+    beyond max_entries are deleted.
+
+    Args:
+        path: SQLite database file
+        table: Table name (lets several caches share one file)
+        ttl: Seconds an entry stays valid (None keeps entries forever)
+        max_entries: Rows kept (None for no limit)
+        prune_every: Inserts between prunes
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "cache",
+        ttl: float = None,
+        max_entries: int = None,
+        prune_every: int = 100,
+    ):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, namespace TEXT, value TEXT, created_at REAL, accessed_at REAL)"
+            )
+            columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+            if "accessed_at" not in columns:  # Files written before the row limit existed
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN accessed_at REAL")
+                self._conn.execute(f"UPDATE {table} SET accessed_at = created_at")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table}_generations ("
+                "namespace TEXT PRIMARY KEY, generation INTEGER)"
+            )
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return default
+        if self.ttl is not None and row[1] + self.ttl < time.time():
+            self.delete(key)
+            return default
+        if self.max_entries is not None:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                )
+        return json.loads(row[0])
+
+    def set(self, key: str, value, namespace: str = None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, json.dumps(value), now, now),
+            )
+            self._inserts += 1
+            if self._inserts % self.prune_every == 0:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        """Delete expired rows and the least recently used rows beyond max_entries (lock held)."""
+        removed = 0
+        if self.ttl is not None:
+            removed += self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        if self.max_entries is not None:
+            removed += self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        if removed:
+            logger.debug(f"Pruned {removed} rows from {self.path}:{self.table}")
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def delete_namespace(self, namespace: str) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE namespace = ?", (namespace,)
+            )
+            return cursor.rowcount
+
+    def generation(self, namespace: str) -> int:
+        """How many times a namespace was invalidated, by any process sharing the file."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT generation FROM {self.table}_generations WHERE namespace = ?", (namespace,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, namespace: str) -> int:
+        """Advance a namespace's generation and return the new value."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO {self.table}_generations VALUES (?, 1) "
+                "ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1",
+                (namespace,),
+            )
+            return self._conn.execute(
+                f"SELECT generation FROM {self.table}_generations WHERE namespace = ?", (namespace,)
+            ).fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+
+class RetrievalCache:
+    """
+    Cache for the raw search hits behind RAGSystem.retrieve_chunks.
+
+    Entries are keyed by the normalized query plus the search parameters
+    (namespace, top_k, min_score, rerank, rerank_model). A namespace's entries
+    are dropped when one of its ingest jobs completes. With a SQLite tier,
+    invalidation also advances the namespace's generation in the shared file,
+    and every process drops memory entries stored under an older generation,
+    so workers sharing the file stop serving stale results too.
+
+    Args:
+        max_entries: Size of the in-memory LRU tier
+        ttl: Seconds an entry stays valid
+        sqlite_path: Optional SQLite file for a persistent second tier
+        similarity_threshold: Optional token Jaccard similarity (0-1) above which
+            a near-duplicate query counts as a hit (memory tier only)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 300,
+        sqlite_path: str = None,
+        similarity_threshold: float = None,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self._memory = LRUStore(max_entries=max_entries, ttl=ttl)
+        self._disk = (
+            SQLiteStore(sqlite_path, table="retrieval_hits", ttl=ttl)
+            if sqlite_path
+            else None
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query, namespace_id, top_k, min_score, rerank, rerank_model) -> tuple:
+        return (namespace_id, top_k, min_score, rerank, rerank_model, normalize_query(query))
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(
+        self,
+        query: str,
+        namespace_id: str,
+        top_k: int,
+        min_score: float,
+        rerank: bool,
+        rerank_model: str,
+    ):
+        """Return the cached retrieval result, or None on a miss."""
+        key = self._key(query, namespace_id, top_k, min_score, rerank, rerank_model)
+
+        generation = self._generation(namespace_id)
+        value = self._memory_get(key, generation)
+        if value is _MISSING and self._disk is not None:
+            value = self._disk.get(json.dumps(key), _MISSING)
+            if value is not _MISSING:
+                self._memory.set(key, (generation, value))
+        if value is _MISSING and self.similarity_threshold:
+            value = self._get_similar(key, generation)
+
+        hit = value is not _MISSING
+        self._count(hit)
+        logger.debug(f"Retrieval cache {'hit' if hit else 'miss'} for '{query}'")
+        return value if hit else None
+
+    def _generation(self, namespace_id: str) -> int:
+        """Current invalidation generation of a namespace (always 0 without a SQLite tier)."""
+        return self._disk.generation(namespace_id) if self._disk is not None else 0
+
+    def _memory_get(self, key: tuple, generation: int):
+        """Memory-tier value for a key, dropping it when stored under an older generation."""
+        entry = self._memory.get(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        if entry[0] != generation:
+            self._memory.delete_where(lambda k: k == key)
+            return _MISSING
+        return entry[1]
+
+    def _get_similar(self, key: tuple, generation: int):
+        """Find a cached entry with the same parameters and a near-identical query."""
+        tokens = frozenset(key[-1].split())
+        best_key, best_score = None, 0.0
+        for candidate in self._memory.keys():
+            if candidate[:-1] != key[:-1]:
+                continue
+            score = _jaccard(tokens, frozenset(candidate[-1].split()))
+            if score > best_score:
+                best_key, best_score = candidate, score
+        if best_key is not None and best_score >= self.similarity_threshold:
+            return self._memory_get(best_key, generation)
+        return _MISSING
+
+    def set(
+        self,
+        query: str,
+        namespace_id: str,
+        top_k: int,
+        min_score: float,
+        rerank: bool,
+        rerank_model: str,
+        value,
+    ):
+        """Store a retrieval result."""
+        key = self._key(query, namespace_id, top_k, min_score, rerank, rerank_model)
+        self._memory.set(key, (self._generation(namespace_id), value))
+        if self._disk is not None:
+            self._disk.set(json.dumps(key), value, namespace=namespace_id)
+
+    def invalidate_namespace(self, namespace_id: str) -> int:
+        """Drop every cached result for a namespace."""
+        removed = self._memory.delete_where(lambda key: key[0] == namespace_id)
+        if self._disk is not None:
+            removed += self._disk.delete_namespace(namespace_id)
+            self._disk.bump_generation(namespace_id)
+        logger.info(f"Invalidated {removed} retrieval cache entries for namespace {namespace_id}")
+        return removed
+
+    def clear(self):
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size of the memory tier."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": len(self._memory),
+            }
+
+
+class ResponseCache:
+    """
+    Cache for generated answers.
+
+    Entries are keyed on a SHA-256 hash of the query, the retrieved context,
+    the formatted system prompt and the model, so an answer is only reused
+    when everything sent to OpenAI would have been identical.
+
+    Args:
+        max_entries: Size of the in-memory LRU tier
+        sqlite_path: Optional SQLite file for a persistent second tier
+        max_disk_entries: Answers kept in the SQLite tier, least recently used dropped first
+        disk_ttl: Seconds an answer stays in the SQLite tier (None keeps it until evicted)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        sqlite_path: str = None,
+        max_disk_entries: int = 100000,
+        disk_ttl: float = None,
+    ):
+        self._memory = LRUStore(max_entries=max_entries)
+        self._disk = (
+            SQLiteStore(
+                sqlite_path, table="response_cache", ttl=disk_ttl, max_entries=max_disk_entries
+            )
+            if sqlite_path
+            else None
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, context: str, system_prompt: str, model: str) -> str:
+        """Build a stable cache key for one generation request."""
+        payload = json.dumps([query, context, system_prompt, model])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached answer for a key, or None on a miss."""
+        value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                self._memory.set(key, value)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        """Store a generated answer."""
+        self._memory.set(key, value)
+        if self._disk is not None:
+            self._disk.set(key, value)
+
+    def clear(self):
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size of the memory tier."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": len(self._memory),
+            }
@@ -1,14 +1,324 @@
 """CLI entry point for agentset-gradio-demo"""
 
-import subprocess
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
 import sys
-from pathlib import Path
+import tempfile
+import threading
+import time
 
+from agentset_gradio_demo import config
 
-def main():
+logger = logging.getLogger(__name__)
+
+COMMANDS = ("serve", "sync", "batch")
+
+
+def _apply_queue_options(args):
+    """Override the queue settings in config before the app module builds the demo."""
+    if args.queue_size is not None:
+        config.QUEUE_MAX_SIZE = args.queue_size
+    if args.default_concurrency is not None:
+        config.QUEUE_DEFAULT_CONCURRENCY_LIMIT = args.default_concurrency
+    if args.chat_concurrency is not None:
+        config.CHAT_CONCURRENCY_LIMIT = args.chat_concurrency
+
+
+def _serve(args, port: int, detach: bool = False):
+    """Run one worker: build the app and serve it with uvicorn until shut down."""
+    import uvicorn
+
+    if detach and hasattr(os, "setsid"):
+        # Own process group: Ctrl+C reaches only the launcher, which stops workers once
+        os.setsid()
+    if detach:
+        # A replica directory belongs to one process; workers keep one each
+        config.REPLICA_PATH = os.path.join(config.REPLICA_PATH, f"worker-{port}")
+
+    _apply_queue_options(args)
+    from agentset_gradio_demo.app import create_app
+
+    uvicorn.run(
+        create_app(),
+        host=args.host,
+        port=port,
+        log_level=args.log_level,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+def _share_state_across_workers(args) -> str:
+    """
+    Point every worker at the same SQLite caches, ingest manifest and metrics directory.
+
+    Environment variables are inherited by the worker processes, whose config
+    module reads them on import.
+
+    Returns:
+        Temporary metrics directory to remove on exit
+    """
+    cache_dir = os.path.expanduser(args.cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ.setdefault("RETRIEVAL_CACHE_PATH", os.path.join(cache_dir, "retrieval.sqlite"))
+    os.environ.setdefault("RESPONSE_CACHE_PATH", os.path.join(cache_dir, "response.sqlite"))
+    os.environ.setdefault("INGEST_MANIFEST_PATH", os.path.join(cache_dir, "ingest_manifest.sqlite"))
+    metrics_dir = tempfile.mkdtemp(prefix="agentset-demo-metrics-")
+    os.environ["METRICS_DIR"] = metrics_dir
+    return metrics_dir
+
+
+def serve(args):
+    """Serve the app with one or more worker processes."""
+    if args.workers <= 1:
+        _serve(args, args.port)
+        return
+
+    metrics_dir = _share_state_across_workers(args)
+    # Gradio keeps each session's queue in the process that accepted it, so
+    # workers get their own ports for a sticky load balancer to spread sessions over
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_serve, args=(args, args.port + i, True), name=f"worker-{i}")
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(
+        f"Started {len(workers)} workers on http://{args.host}:{args.port}"
+        f"-{args.port + len(workers) - 1}"
+    )
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while all(worker.is_alive() for worker in workers):
+            time.sleep(1)
+        logger.error("A worker exited unexpectedly, shutting down")
+    except KeyboardInterrupt:
+        logger.info("Shutting down workers")
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+        deadline = time.monotonic() + args.graceful_timeout + 5
+        for worker in workers:
+            worker.join(timeout=max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                worker.kill()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def sync(args):
+    """Sync a folder into a namespace once, or keep watching it."""
+    from agentset_gradio_demo.client_pool import ClientRegistry, _replica_store
+    from agentset_gradio_demo.manifest import IngestManifest
+
+    manifest_path = os.path.expanduser(args.manifest)
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    registry = ClientRegistry(manifest=IngestManifest(manifest_path), replica=_replica_store())
+    ingester = registry.get_ingester(args.namespace, args.api_key)
+    metadata = json.loads(args.metadata) if args.metadata else None
+    options = dict(
+        include=args.include,
+        exclude=args.exclude,
+        delete_missing=not args.keep_deleted,
+        concurrency=args.concurrency,
+        metadata=metadata,
+        preprocess=args.preprocess,
+    )
+
+    def report(summary):
+        print(json.dumps({k: v for k, v in summary.items() if k != "results"}), flush=True)
+        for result in summary["results"]:
+            if not result["success"]:
+                logger.error(f"{result['item']}: {result['message']}")
+
+    if not args.watch:
+        summary = ingester.sync_directory(args.directory, **options)
+        report(summary)
+        print(json.dumps(registry.manifest.report()), flush=True)
+        if summary["failed"]:
+            sys.exit(1)
+        return
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    try:
+        ingester.watch_directory(
+            args.directory,
+            stop_event,
+            debounce=args.debounce,
+            max_delay=args.max_delay,
+            poll_interval=args.poll_interval,
+            on_sync=report,
+            **options,
+        )
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(registry.manifest.report()), flush=True)
+
+
+def batch(args):
+    """Answer a JSONL/CSV file of questions and write one JSONL result per question."""
+    import asyncio
+
+    from agentset_gradio_demo.batch_qa import read_questions, run_batch
+    from agentset_gradio_demo.cache import ResponseCache, RetrievalCache
+    from agentset_gradio_demo.client_pool import ClientRegistry
+
+    if args.no_cache:
+        registry = ClientRegistry()
+    else:
+        # The same SQLite caches `serve --workers` reads, so a run pre-warms them
+        cache_dir = os.path.expanduser(args.cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        registry = ClientRegistry(
+            retrieval_cache=RetrievalCache(
+                max_entries=config.RETRIEVAL_CACHE_MAX_ENTRIES,
+                ttl=config.RETRIEVAL_CACHE_TTL,
+                sqlite_path=os.path.join(cache_dir, "retrieval.sqlite"),
+                similarity_threshold=config.RETRIEVAL_CACHE_SIMILARITY,
+            ),
+            response_cache=ResponseCache(
+                max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                sqlite_path=os.path.join(cache_dir, "response.sqlite"),
+                max_disk_entries=config.RESPONSE_CACHE_MAX_DISK_ENTRIES,
+                disk_ttl=config.RESPONSE_CACHE_DISK_TTL,
+            ),
+        )
+    rag = registry.get_async_rag_system(
+        args.namespace, args.api_key, args.openai_api_key, config.SYSTEM_PROMPT, args.model
+    )
+    questions = read_questions(args.input, args.question_field, args.id_field)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Every finished question is already on disk, so a stopped run resumes where it ended
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        summary = asyncio.run(
+            run_batch(
+                rag,
+                questions,
+                args.output,
+                concurrency=args.concurrency,
+                top_k=args.top_k,
+                min_score=args.min_score,
+                multi_query=args.multi_query,
+                retrieve_only=args.retrieve_only,
+                use_cache=not args.no_cache,
+                resume=not args.restart,
+            )
+        )
+    except KeyboardInterrupt:
+        logger.info(f"Interrupted; run again with --output {args.output} to resume")
+        sys.exit(130)
+    print(json.dumps(summary), flush=True)
+    if summary["failed"]:
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="agentset-gradio-demo", description="Agentset Gradio demo")
+    commands = parser.add_subparsers(dest="command")
+
+    serve_parser = commands.add_parser("serve", help="Serve the web app (default)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    serve_parser.add_argument("--port", type=int, default=7860,
+                              help="Port of the first worker; worker i listens on port + i")
+    serve_parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    serve_parser.add_argument("--queue-size", type=int, help="Max pending events per worker")
+    serve_parser.add_argument("--default-concurrency", type=int,
+                              help="Concurrency limit for events without their own group")
+    serve_parser.add_argument("--chat-concurrency", type=int, help="Concurrent chat streams per worker")
+    serve_parser.add_argument("--graceful-timeout", type=int, default=30,
+                              help="Seconds to let in-flight requests finish on shutdown")
+    serve_parser.add_argument("--cache-dir", default="~/.cache/agentset-gradio-demo",
+                              help="Directory for the SQLite caches shared by workers")
+    serve_parser.add_argument("--log-level", default="info", help="Uvicorn log level")
+    serve_parser.set_defaults(func=serve)
+
+    sync_parser = commands.add_parser(
+        "sync", help="Ingest new and changed files of a folder and remove deleted ones"
+    )
+    sync_parser.add_argument("directory", help="Folder to sync")
+    sync_parser.add_argument("--namespace", default=os.getenv("AGENTSET_NAMESPACE_ID") or None,
+                             required=not os.getenv("AGENTSET_NAMESPACE_ID"),
+                             help="Agentset namespace ID (default: $AGENTSET_NAMESPACE_ID)")
+    sync_parser.add_argument("--api-key", default=config.AGENTSET_API_KEY,
+                             help="Agentset API key (default: $AGENTSET_API_KEY)")
+    sync_parser.add_argument("--manifest", default="~/.cache/agentset-gradio-demo/ingest_manifest.sqlite",
+                             help="SQLite ingest manifest recording what was synced")
+    sync_parser.add_argument("--include", action="append", help="Glob of files to sync (repeatable)")
+    sync_parser.add_argument("--exclude", action="append", help="Glob of files to skip (repeatable)")
+    sync_parser.add_argument("--keep-deleted", action="store_true",
+                             help="Keep the documents of files deleted from the folder")
+    sync_parser.add_argument("--metadata", help="JSON object of metadata for every file")
+    sync_parser.add_argument("--concurrency", type=int, default=config.INGEST_BATCH_CONCURRENCY,
+                             help="Files ingested in parallel")
+    sync_parser.add_argument("--preprocess", action="store_true",
+                             help="Extract text from txt/md/html/csv/json locally and send it as TEXT jobs")
+    sync_parser.add_argument("--watch", action="store_true", help="Keep syncing changes until stopped")
+    sync_parser.add_argument("--debounce", type=float, default=config.SYNC_DEBOUNCE,
+                             help="Quiet seconds before a batch of changes is synced")
+    sync_parser.add_argument("--max-delay", type=float, default=config.SYNC_MAX_DELAY,
+                             help="Longest a batch of changes is held back (s)")
+    sync_parser.add_argument("--poll-interval", type=float, default=config.SYNC_POLL_INTERVAL,
+                             help="Seconds between scans when watchdog is not installed")
+    sync_parser.set_defaults(func=sync)
+
+    batch_parser = commands.add_parser(
+        "batch", help="Answer a file of questions (evaluation runs, cache pre-warming)"
+    )
+    batch_parser.add_argument("input", help="JSONL or .csv file of questions")
+    batch_parser.add_argument("--output", required=True,
+                              help="JSONL file of results; an existing file is resumed")
+    batch_parser.add_argument("--restart", action="store_true",
+                              help="Overwrite --output instead of skipping answered questions")
+    batch_parser.add_argument("--namespace", default=os.getenv("AGENTSET_NAMESPACE_ID") or None,
+                              required=not os.getenv("AGENTSET_NAMESPACE_ID"),
+                              help="Agentset namespace ID (default: $AGENTSET_NAMESPACE_ID)")
+    batch_parser.add_argument("--api-key", default=config.AGENTSET_API_KEY,
+                              help="Agentset API key (default: $AGENTSET_API_KEY)")
+    batch_parser.add_argument("--openai-api-key", default=config.OPENAI_API_KEY,
+                              help="OpenAI API key (default: $OPENAI_API_KEY)")
+    batch_parser.add_argument("--model", default=config.OPENAI_MODEL,
+                              help='Model answering the questions ("auto" to route them)')
+    batch_parser.add_argument("--question-field", default="question", help="Field holding the question")
+    batch_parser.add_argument("--id-field", default="id",
+                              help="Field holding the question ID (default: the row number)")
+    batch_parser.add_argument("--concurrency", type=int, default=config.BATCH_CONCURRENCY,
+                              help="Questions answered at the same time")
+    batch_parser.add_argument("--top-k", type=int, default=config.TOP_K, help="Documents to retrieve")
+    batch_parser.add_argument("--min-score", type=float, default=config.MIN_SCORE,
+                              help="Minimum relevance score")
+    batch_parser.add_argument("--multi-query", action="store_true",
+                              help="Expand questions into sub-queries searched in parallel")
+    batch_parser.add_argument("--retrieve-only", action="store_true",
+                              help="Only retrieve, without generating answers")
+    batch_parser.add_argument("--no-cache", action="store_true",
+                              help="Search and answer every question afresh, without the caches")
+    batch_parser.add_argument("--cache-dir", default="~/.cache/agentset-gradio-demo",
+                              help="Directory of the SQLite caches to read and warm")
+    batch_parser.set_defaults(func=batch)
+    return parser
+
+
+def main(argv: list = None):
     """Launch the Gradio app"""
-    app_path = Path(__file__).parent / "app.py"
-    subprocess.run([sys.executable, str(app_path)])
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv = ["serve", *argv]
+    args = build_parser().parse_args(argv)
+    args.func(args)
 
 
 if __name__ == "__main__":
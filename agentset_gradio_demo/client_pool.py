@@ -0,0 +1,445 @@
+"""
+Client Pool - Process-wide registry of long-lived API clients
+Reuses OpenAI and Agentset clients (and their keep-alive connection pools)
+across requests instead of rebuilding them on every chat turn or ingest
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from agentset_gradio_demo import config
+from agentset_gradio_demo.cache import ResponseCache, RetrievalCache
+from agentset_gradio_demo.document_ingester import DocumentIngester
+from agentset_gradio_demo.manifest import IngestManifest
+from agentset_gradio_demo.job_tracker import TERMINAL_STATUSES
+from agentset_gradio_demo.metrics import metrics
+from agentset_gradio_demo.rag_system import AsyncRAGSystem, RAGSystem
+from agentset_gradio_demo.resilience import Resilience
+from agentset_gradio_demo.router import ModelRouter
+
+if TYPE_CHECKING:  # The SDKs are imported when the first client is built
+    import httpx
+    from agentset import Agentset
+    from openai import AsyncOpenAI as AsyncOpenAIClient
+    from openai import OpenAI as OpenAIClient
+
+    from agentset_gradio_demo.replica import ReplicaStore
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_limits() -> "httpx.Limits":
+    """Connection pool limits shared by every pooled HTTP client."""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _resilience() -> Resilience:
+    """Resilience policy configured from config.py."""
+    return Resilience(
+        max_attempts=config.RETRY_MAX_ATTEMPTS,
+        base_delay=config.RETRY_BASE_DELAY,
+        max_delay=config.RETRY_MAX_DELAY,
+        timeouts={
+            "agentset_search": config.SEARCH_TIMEOUT,
+            "agentset_ingest": config.INGEST_TIMEOUT,
+            "openai": config.OPENAI_TIMEOUT,
+        },
+        default_timeout=config.HTTP_TIMEOUT,
+        failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=config.CIRCUIT_RESET_TIMEOUT,
+        hedge_delay=config.SEARCH_HEDGE_DELAY,
+        max_hedge_ratio=config.SEARCH_HEDGE_MAX_RATIO,
+    )
+
+
+def _model_router() -> ModelRouter:
+    """Model router configured from config.py."""
+    return ModelRouter(
+        tiers=config.MODEL_ROUTER_TIERS,
+        latency_slo=config.MODEL_ROUTER_LATENCY_SLO,
+        first_token_slo=config.MODEL_ROUTER_FIRST_TOKEN_SLO,
+        window=config.MODEL_ROUTER_WINDOW,
+        probe_ratio=config.MODEL_ROUTER_PROBE_RATIO,
+    )
+
+
+def _replica_store() -> "ReplicaStore":
+    """Local replica configured from config.py, or None when it is off or unavailable."""
+    if config.REPLICA_MODE == "off":
+        return None
+    try:
+        # numpy is only imported when the replica is enabled
+        from agentset_gradio_demo.replica import ReplicaStore
+
+        return ReplicaStore(config.REPLICA_PATH, config.REPLICA_DIMS, config.REPLICA_DTYPE)
+    except (ImportError, RuntimeError) as e:
+        logger.warning(f"Local replica disabled: {str(e)}")
+        return None
+
+
+def _tracking_jobs(ingester: DocumentIngester) -> bool:
+    """Whether an ingester's job tracker still follows unfinished jobs."""
+    return any(job["status"] not in TERMINAL_STATUSES for job in ingester.job_tracker.jobs())
+
+
+class ClientRegistry:
+    """
+    Thread-safe registry of pooled API clients.
+
+    OpenAI clients are keyed by API key and Agentset clients by
+    (namespace, token). RAG systems and ingesters built on top of them are
+    keyed by the full set of credentials (plus the model for RAG systems),
+    so repeated requests with the same settings share one instance.
+
+    The registry is bounded: at most max_entries RAG systems (and as many
+    async ones and ingesters) are kept, the least recently used going first,
+    and entries no session asked for in idle_ttl seconds are dropped. Clients
+    no remaining entry uses are then dropped too. Ingesters still tracking
+    jobs are kept until the jobs finish.
+
+    Async clients keep their connections bound to the event loop that first
+    used them, so async RAG systems should only be awaited from one loop
+    (the Gradio server loop).
+
+    Args:
+        retrieval_cache: Search-result cache shared by every RAG system and
+            ingester handed out (optional)
+        response_cache: Answer cache shared by every RAG system handed out (optional)
+        manifest: Ingest manifest shared by every ingester handed out (optional)
+        resilience: Retry, hedging and circuit-breaker policy shared by every
+            client handed out (built from config when omitted)
+        replica: Local replica shared by every RAG system and ingester handed out (optional)
+        router: Model router shared by every RAG system handed out, so model
+            latency is tracked across sessions (built from config when omitted)
+        max_entries: RAG systems, async RAG systems and ingesters kept each
+        idle_ttl: Seconds an entry is kept after it was last handed out
+    """
+
+    def __init__(
+        self,
+        retrieval_cache: RetrievalCache = None,
+        response_cache: ResponseCache = None,
+        manifest: IngestManifest = None,
+        resilience: Resilience = None,
+        replica: "ReplicaStore" = None,
+        router: ModelRouter = None,
+        max_entries: int = 256,
+        idle_ttl: float = 3600,
+    ):
+        self.retrieval_cache = retrieval_cache
+        self.response_cache = response_cache
+        self.manifest = manifest
+        self.resilience = resilience or _resilience()
+        self.replica = replica
+        self.router = router or _model_router()
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._openai_clients = {}
+        self._async_openai_clients = {}
+        self._agentset_clients = {}
+        # (entry, time last handed out), least recently used first
+        self._rag_systems = OrderedDict()
+        self._async_rag_systems = OrderedDict()
+        self._ingesters = OrderedDict()
+
+    def get_openai_client(self, openai_api_key: str) -> "OpenAIClient":
+        """Return the pooled OpenAI client for an API key, creating it on first use."""
+        with self._lock:
+            client = self._openai_clients.get(openai_api_key)
+            if client is None:
+                from openai import DefaultHttpxClient, OpenAI as OpenAIClient
+
+                logger.info("Creating pooled OpenAI client")
+                client = OpenAIClient(
+                    api_key=openai_api_key,
+                    base_url=config.OPENAI_BASE_URL,
+                    max_retries=0,  # Retried by self.resilience
+                    http_client=DefaultHttpxClient(
+                        limits=_pool_limits(), timeout=config.HTTP_TIMEOUT
+                    ),
+                )
+                self._openai_clients[openai_api_key] = client
+            return client
+
+    def get_async_openai_client(self, openai_api_key: str) -> "AsyncOpenAIClient":
+        """Return the pooled async OpenAI client for an API key, creating it on first use."""
+        with self._lock:
+            client = self._async_openai_clients.get(openai_api_key)
+            if client is None:
+                from openai import AsyncOpenAI as AsyncOpenAIClient
+                from openai import DefaultAsyncHttpxClient
+
+                logger.info("Creating pooled async OpenAI client")
+                client = AsyncOpenAIClient(
+                    api_key=openai_api_key,
+                    base_url=config.OPENAI_BASE_URL,
+                    max_retries=0,  # Retried by self.resilience
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=_pool_limits(), timeout=config.HTTP_TIMEOUT
+                    ),
+                )
+                self._async_openai_clients[openai_api_key] = client
+            return client
+
+    def get_agentset_client(self, namespace_id: str, api_token: str) -> "Agentset":
+        """Return the pooled Agentset client for a namespace, creating it on first use."""
+        key = (namespace_id, api_token)
+        with self._lock:
+            client = self._agentset_clients.get(key)
+            if client is None:
+                import httpx
+                from agentset import Agentset
+
+                logger.info(f"Creating pooled Agentset client for namespace {namespace_id}")
+                client = Agentset(
+                    namespace_id=namespace_id,
+                    token=api_token,
+                    server_url=config.AGENTSET_BASE_URL,
+                    client=httpx.Client(
+                        follow_redirects=True,
+                        limits=_pool_limits(),
+                        timeout=config.HTTP_TIMEOUT,
+                    ),
+                    async_client=httpx.AsyncClient(
+                        follow_redirects=True,
+                        limits=_pool_limits(),
+                        timeout=config.HTTP_TIMEOUT,
+                    ),
+                )
+                self._agentset_clients[key] = client
+            return client
+
+    def get_rag_system(
+        self,
+        namespace_id: str,
+        api_token: str,
+        openai_api_key: str,
+        system_prompt: str = None,
+        model: str = config.OPENAI_MODEL,
+    ) -> RAGSystem:
+        """Return a shared RAGSystem for the given credentials and model."""
+        key = (namespace_id, api_token, openai_api_key, model, system_prompt)
+        with self._lock:
+            rag = self._pooled(self._rag_systems, key)
+        if rag is not None:
+            return rag
+
+        rag = RAGSystem(
+            namespace_id,
+            api_token,
+            openai_api_key,
+            system_prompt,
+            model,
+            openai_client=self.get_openai_client(openai_api_key),
+            agentset_client=self.get_agentset_client(namespace_id, api_token),
+            retrieval_cache=self.retrieval_cache,
+            response_cache=self.response_cache,
+            context_token_budget=config.CONTEXT_TOKEN_BUDGET,
+            agentset_client_factory=lambda ns: self.get_agentset_client(ns, api_token),
+            query_expander=config.MULTI_QUERY_EXPANDER,
+            expansion_model=config.MULTI_QUERY_MODEL,
+            max_queries=config.MULTI_QUERY_MAX_QUERIES,
+            fanout_workers=config.RETRIEVAL_FANOUT_WORKERS,
+            resilience=self.resilience,
+            coalesce_requests=config.COALESCE_REQUESTS,
+            replica=self.replica,
+            replica_mode=config.REPLICA_MODE,
+            replica_min_score=config.REPLICA_MIN_SCORE,
+            router=self.router,
+        )
+        return self._add(self._rag_systems, key, rag)
+
+    def get_async_rag_system(
+        self,
+        namespace_id: str,
+        api_token: str,
+        openai_api_key: str,
+        system_prompt: str = None,
+        model: str = config.OPENAI_MODEL,
+    ) -> AsyncRAGSystem:
+        """Return a shared AsyncRAGSystem for the given credentials and model."""
+        key = (namespace_id, api_token, openai_api_key, model, system_prompt)
+        with self._lock:
+            rag = self._pooled(self._async_rag_systems, key)
+        if rag is not None:
+            return rag
+
+        rag = AsyncRAGSystem(
+            namespace_id,
+            api_token,
+            openai_api_key,
+            system_prompt,
+            model,
+            openai_client=self.get_async_openai_client(openai_api_key),
+            agentset_client=self.get_agentset_client(namespace_id, api_token),
+            retrieval_cache=self.retrieval_cache,
+            response_cache=self.response_cache,
+            context_token_budget=config.CONTEXT_TOKEN_BUDGET,
+            agentset_client_factory=lambda ns: self.get_agentset_client(ns, api_token),
+            query_expander=config.MULTI_QUERY_EXPANDER,
+            expansion_model=config.MULTI_QUERY_MODEL,
+            max_queries=config.MULTI_QUERY_MAX_QUERIES,
+            resilience=self.resilience,
+            coalesce_requests=config.COALESCE_REQUESTS,
+            replica=self.replica,
+            replica_mode=config.REPLICA_MODE,
+            replica_min_score=config.REPLICA_MIN_SCORE,
+            router=self.router,
+        )
+        return self._add(self._async_rag_systems, key, rag)
+
+    def get_ingester(self, namespace_id: str, api_token: str) -> DocumentIngester:
+        """Return a shared DocumentIngester for the given namespace credentials."""
+        key = (namespace_id, api_token)
+        with self._lock:
+            ingester = self._pooled(self._ingesters, key)
+        if ingester is not None:
+            return ingester
+
+        ingester = DocumentIngester(
+            namespace_id,
+            api_token,
+            client=self.get_agentset_client(namespace_id, api_token),
+            retrieval_cache=self.retrieval_cache,
+            manifest=self.manifest,
+            preprocess_workers=config.PREPROCESS_WORKERS,
+            preprocess_max_chars=config.PREPROCESS_MAX_CHARS,
+            resilience=self.resilience,
+            upload_timeout=(config.UPLOAD_CONNECT_TIMEOUT, config.UPLOAD_READ_TIMEOUT),
+            replica=self.replica,
+            replica_chunk_chars=config.REPLICA_CHUNK_CHARS,
+        )
+        return self._add(self._ingesters, key, ingester)
+
+    def _pooled(self, entries: OrderedDict, key: tuple):
+        """Return a pooled entry and mark it as just used. Caller holds the lock."""
+        if key not in entries:
+            return None
+        entry, _ = entries.pop(key)
+        entries[key] = (entry, time.monotonic())
+        return entry
+
+    def _add(self, entries: OrderedDict, key: tuple, entry):
+        """Pool a new entry (unless another thread pooled one first) and drop stale entries."""
+        with self._lock:
+            entry = self._pooled(entries, key) or entry
+            entries[key] = (entry, time.monotonic())
+            evicted = self._prune()
+        for ingester in evicted:
+            ingester.close()
+        return entry
+
+    def _prune(self) -> list:
+        """
+        Drop least recently used and idle entries, then the clients no entry uses any more.
+
+        Caller holds the lock.
+
+        Returns:
+            Evicted ingesters, to be closed once the lock is released
+        """
+        now = time.monotonic()
+        evicted = []
+        for kind, entries in (
+            ("rag", self._rag_systems),
+            ("async_rag", self._async_rag_systems),
+            ("ingester", self._ingesters),
+        ):
+            for key, (entry, last_used) in list(entries.items()):
+                if now - last_used <= self.idle_ttl and len(entries) <= self.max_entries:
+                    break  # Every later entry was used more recently
+                if kind == "ingester":
+                    if _tracking_jobs(entry):
+                        continue
+                    evicted.append(entry)
+                del entries[key]
+                metrics.inc("client_registry_evictions_total", kind=kind)
+
+        # RAG systems keep their own reference to the clients of extra namespaces they search
+        pools = (self._rag_systems, self._async_rag_systems, self._ingesters)
+        used = {key[:2] for entries in pools for key in entries}
+        for key in [key for key in self._agentset_clients if key not in used]:
+            del self._agentset_clients[key]
+        for clients, entries in (
+            (self._openai_clients, self._rag_systems),
+            (self._async_openai_clients, self._async_rag_systems),
+        ):
+            used = {key[2] for key in entries}
+            for key in [key for key in clients if key not in used]:
+                del clients[key]
+        return evicted
+
+    def clear(self):
+        """Drop every pooled client."""
+        with self._lock:
+            self._openai_clients.clear()
+            self._async_openai_clients.clear()
+            self._agentset_clients.clear()
+            self._rag_systems.clear()
+            self._async_rag_systems.clear()
+            self._ingesters.clear()
+
+    def collect_metrics(self) -> dict:
+        """Gauge values for the metrics endpoint: cache counters and tracked jobs."""
+        gauges = {}
+        for name, cache in (
+            ("retrieval_cache", self.retrieval_cache),
+            ("response_cache", self.response_cache),
+        ):
+            if cache is not None:
+                stats = cache.stats()
+                gauges[f"{name}_hits"] = stats["hits"]
+                gauges[f"{name}_misses"] = stats["misses"]
+                gauges[f"{name}_hit_ratio"] = stats["hit_ratio"]
+                gauges[f"{name}_entries"] = stats["size"]
+        with self._lock:
+            ingesters = [ingester for ingester, _ in self._ingesters.values()]
+            gauges["pooled_entries"] = len(self._rag_systems) + len(self._async_rag_systems) + len(ingesters)
+        gauges["tracked_jobs"] = sum(
+            1
+            for ingester in ingesters
+            for job in ingester.job_tracker.jobs()
+            if job["status"] not in TERMINAL_STATUSES
+        )
+        for endpoint, state in self.resilience.breaker_states().items():
+            gauges[f"circuit_open_{endpoint}"] = int(state != "closed")
+        if self.replica is not None:
+            gauges["replica_chunks"] = self.replica.chunk_count()
+        return gauges
+
+
+# Process-wide registry used by the Gradio app
+registry = ClientRegistry(
+    retrieval_cache=RetrievalCache(
+        max_entries=config.RETRIEVAL_CACHE_MAX_ENTRIES,
+        ttl=config.RETRIEVAL_CACHE_TTL,
+        sqlite_path=config.RETRIEVAL_CACHE_PATH,
+        similarity_threshold=config.RETRIEVAL_CACHE_SIMILARITY,
+    )
+    if config.RETRIEVAL_CACHE_ENABLED
+    else None,
+    response_cache=ResponseCache(
+        max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+        sqlite_path=config.RESPONSE_CACHE_PATH,
+        max_disk_entries=config.RESPONSE_CACHE_MAX_DISK_ENTRIES,
+        disk_ttl=config.RESPONSE_CACHE_DISK_TTL,
+    )
+    if config.RESPONSE_CACHE_ENABLED
+    else None,
+    manifest=IngestManifest(config.INGEST_MANIFEST_PATH) if config.INGEST_MANIFEST_ENABLED else None,
+    replica=_replica_store(),
+    max_entries=config.CLIENT_REGISTRY_MAX_ENTRIES,
+    idle_ttl=config.CLIENT_REGISTRY_IDLE_TTL,
+)
+
+metrics.register_collector(registry.collect_metrics)
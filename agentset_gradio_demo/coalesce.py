@@ -0,0 +1,329 @@
+"""
+Coalesce - Single-flight sharing of identical in-flight requests
+When several sessions ask the same thing at the same time, only the first
+call goes upstream; the others wait for it and receive the same result,
+or replay the same token stream
+"""
+
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Callable, Hashable, Iterator
+
+from agentset_gradio_demo.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_PUMP = object()
+
+
+class _Call:
+    """One in-flight synchronous call and the outcome its waiters share."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedStream:
+    """
+    An iterator consumed once and replayed to every subscriber.
+
+    There is no pump thread: whichever subscriber first needs an item that
+    has not arrived yet pulls it from the source while the others wait, so
+    the stream keeps flowing when any one subscriber stops reading.
+    """
+
+    def __init__(self, source: Iterator, on_done: Callable[[], None]):
+        self._source = source
+        self._on_done = on_done
+        self._items = []
+        self._done = False
+        self._error = None
+        self._pumping = False
+        self._subscribers = 0
+        self._abandoned = False
+        self._cond = threading.Condition()
+
+    def subscribe(self) -> Iterator:
+        """Iterator over every item, or None if the stream was already abandoned."""
+        # Counted right away, so a subscriber that has not started reading
+        # keeps the stream alive when an earlier one leaves
+        with self._cond:
+            if self._abandoned:
+                return None
+            self._subscribers += 1
+        return self._iterate()
+
+    def _iterate(self) -> Iterator:
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    while index >= len(self._items) and not self._done and self._pumping:
+                        self._cond.wait()
+                    if index < len(self._items):
+                        item = self._items[index]
+                    elif self._done:
+                        if self._error is not None:
+                            raise self._error
+                        return
+                    else:
+                        self._pumping = True
+                        item = _PUMP
+                if item is _PUMP:
+                    self._pump()
+                    continue
+                index += 1
+                yield item
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+                abandoned = not self._subscribers and not self._done
+                if abandoned:
+                    self._done = self._abandoned = True
+            if abandoned:
+                # Nobody is reading any more; stop the upstream request
+                self._on_done()
+                close = getattr(self._source, "close", None)
+                if close is not None:
+                    close()
+
+    def _pump(self):
+        item, finished, error = None, False, None
+        try:
+            item = next(self._source)
+        except StopIteration:
+            finished = True
+        except Exception as e:
+            finished, error = True, e
+        with self._cond:
+            if finished:
+                self._done, self._error = True, error
+            else:
+                self._items.append(item)
+            self._pumping = False
+            self._cond.notify_all()
+        if finished:
+            self._on_done()
+
+
+class SingleFlight:
+    """
+    Shares one call among all threads asking for the same key at the same time.
+
+    Keys only live while their call is in flight; a request arriving after
+    the call finished starts a new one (completed results are the caches' job).
+
+    Args:
+        name: Operation name used as the metrics label
+        enabled: Share calls (False runs every call on its own)
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs), or wait for the identical call already running.
+
+        Returns:
+            The call's result; its exception is raised in every waiter
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.inc("coalesced_total", operation=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key: Hashable, factory: Callable[[], Iterator]) -> Iterator:
+        """
+        Iterate the stream for key, sharing an identical stream already running.
+
+        Subscribers that join late first receive every item produced so far.
+
+        Args:
+            key: Identity of the stream
+            factory: Opens the upstream stream (called only by the first subscriber)
+
+        Yields:
+            The items of the shared stream
+        """
+        if not self.enabled:
+            return factory()
+        with self._lock:
+            shared = self._streams.get(key)
+            iterator = shared.subscribe() if shared is not None else None
+            if iterator is None:
+                shared = self._streams[key] = _SharedStream(
+                    factory(), lambda: self._forget_stream(key, shared)
+                )
+                iterator = shared.subscribe()
+            else:
+                metrics.inc("coalesced_total", operation=self.name)
+        return iterator
+
+    def inflight(self) -> int:
+        """Number of distinct calls and streams currently running."""
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+    def _forget_stream(self, key: Hashable, shared: _SharedStream):
+        with self._lock:
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class _AsyncSharedStream:
+    """An async iterator consumed once by a pump task and replayed to every subscriber."""
+
+    def __init__(self, source: AsyncIterator, on_done: Callable[[], None]):
+        self._source = source
+        self._on_done = on_done
+        self._items = []
+        self._done = False
+        self._error = None
+        self._changed = asyncio.Event()
+        self._subscribers = 0
+        self._abandoned = False
+        self._task = asyncio.ensure_future(self._pump())
+
+    def subscribe(self) -> AsyncIterator:
+        """Async iterator over every item, or None if the stream was already abandoned."""
+        if self._abandoned:
+            return None
+        self._subscribers += 1
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator:
+        index = 0
+        try:
+            while True:
+                while index >= len(self._items) and not self._done:
+                    await self._changed.wait()
+                if index < len(self._items):
+                    index += 1
+                    yield self._items[index - 1]
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+        finally:
+            self._subscribers -= 1
+            if not self._subscribers and not self._done:
+                # Nobody is reading any more; stop the upstream request
+                self._abandoned = True
+                self._task.cancel()
+                self._on_done()
+
+    async def _pump(self):
+        try:
+            async for item in self._source:
+                self._items.append(item)
+                self._notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+            self._on_done()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight for coroutines on one event loop.
+
+    The shared call runs as its own task, so a cancelled waiter does not
+    cancel it for the others; it is cancelled once every waiter is gone.
+
+    Args:
+        name: Operation name used as the metrics label
+        enabled: Share calls (False runs every call on its own)
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls = {}
+        self._streams = {}
+
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Await fn(*args, **kwargs), or the identical call already running."""
+        if not self.enabled:
+            return await fn(*args, **kwargs)
+        call = self._calls.get(key)
+        if call is None or call.abandoned:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn(*args, **kwargs)))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            metrics.inc("coalesced_total", operation=self.name)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1:
+                call.abandoned = True
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Async variant of SingleFlight.stream()."""
+        if not self.enabled:
+            return factory()
+        shared = self._streams.get(key)
+        iterator = shared.subscribe() if shared is not None else None
+        if iterator is None:
+            shared = self._streams[key] = _AsyncSharedStream(
+                factory(), lambda: self._forget(self._streams, key, shared)
+            )
+            iterator = shared.subscribe()
+        else:
+            metrics.inc("coalesced_total", operation=self.name)
+        return iterator
+
+    def inflight(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    @staticmethod
+    def _forget(flights: dict, key: Hashable, flight):
+        if flights.get(key) is flight:
+            del flights[key]
@@ -19,13 +19,123 @@ AGENTSET_NAMESPACE_ID = ""
 AGENTSET_API_KEY = os.getenv("AGENTSET_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Optional API base URLs (e.g. local stub servers for benchmarking)
+AGENTSET_BASE_URL = os.getenv("AGENTSET_BASE_URL") or None
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# HTTP Connection Pool Settings (shared by the pooled API clients)
+HTTP_MAX_CONNECTIONS = 100  # Max open connections per client
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20  # Idle connections kept warm per client
+HTTP_KEEPALIVE_EXPIRY = 60.0  # Seconds an idle connection stays open
+HTTP_TIMEOUT = 60.0  # Default request timeout in seconds
+
+# Client Registry Settings (RAG systems and ingesters pooled per set of credentials)
+CLIENT_REGISTRY_MAX_ENTRIES = 256  # RAG systems (and ingesters) kept; least recently used are dropped first
+CLIENT_REGISTRY_IDLE_TTL = 3600  # Seconds an entry no session asked for is kept
+
+# Resilience Settings (timeouts, retries, hedging and circuit breaking for API calls)
+SEARCH_TIMEOUT = 10.0  # Seconds per Agentset search attempt
+OPENAI_TIMEOUT = 60.0  # Seconds per OpenAI request (until the first byte when streaming)
+INGEST_TIMEOUT = 30.0  # Seconds per Agentset upload/job API call
+UPLOAD_CONNECT_TIMEOUT = 10.0  # Seconds to connect for a presigned upload
+UPLOAD_READ_TIMEOUT = 120.0  # Seconds without progress before a presigned upload fails
+RETRY_MAX_ATTEMPTS = 3  # Attempts per call for timeouts, 429 and 5xx (1 disables retries)
+RETRY_BASE_DELAY = 0.2  # Seconds before the first retry; doubles per retry, with full jitter
+RETRY_MAX_DELAY = 10.0  # Longest single backoff, also caps waits asked for by Retry-After
+SEARCH_HEDGE_DELAY = None  # Seconds before a duplicate search is sent (None = observed p95 latency)
+SEARCH_HEDGE_MAX_RATIO = 0.1  # Share of searches that may be hedged (0 disables hedging)
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive calls failing after their retries that make an endpoint fail fast
+CIRCUIT_RESET_TIMEOUT = 30.0  # Seconds before a failing endpoint is probed again
+
 # RAG Settings
 TOP_K = 10  # Number of documents to retrieve
 MIN_SCORE = 0.6  # Minimum relevance score (0-1)
+CONTEXT_TOKEN_BUDGET = 3000  # Max prompt context tokens per query (None for no limit)
+COALESCE_REQUESTS = True  # Identical concurrent searches/completions share one upstream call
+
+# Multi-Query Retrieval Settings
+MULTI_QUERY_ENABLED = False  # Expand compound questions into sub-queries searched in parallel
+MULTI_QUERY_EXPANDER = "rules"  # "rules" (split on conjunctions) or "model" (ask an LLM)
+MULTI_QUERY_MODEL = "gpt-4o-mini"  # Cheap model used by the "model" expander
+MULTI_QUERY_MAX_QUERIES = 4  # Queries per question, including the original
+RETRIEVAL_FANOUT_WORKERS = 8  # Concurrent searches per RAG system (sync path)
+EXTRA_NAMESPACES = [ns for ns in os.getenv("AGENTSET_EXTRA_NAMESPACES", "").split(",") if ns.strip()]
+
+# Chat History Settings (kept per session on the server)
+HISTORY_MAX_TURNS = 10  # Turns kept verbatim and shown in the chat window
+HISTORY_TOKEN_BUDGET = 1000  # Tokens of earlier conversation sent with each question (0 disables follow-ups)
+HISTORY_SUMMARY_LINES = 20  # Older turns kept as one compacted line each
+HISTORY_SUMMARY_CHARS = 160  # Characters per compacted question and answer
+
+# Speculative Prefetch Settings (retrieval starts while the user is typing)
+PREFETCH_ENABLED = True
+PREFETCH_DEBOUNCE = 0.4  # Seconds of typing inactivity before a prefetch searches
+PREFETCH_MAX_INFLIGHT = 4  # Concurrent prefetch searches across all sessions
+PREFETCH_MIN_CHARS = 10  # Shortest partial message worth prefetching
+PREFETCH_TTL = 60  # Seconds a prefetched result stays usable
+PREFETCH_MIN_COVERAGE = 0.75  # Share of the submitted question's words the prefetch must cover
+
+# Local Replica Settings (NumPy index of ingested and retrieved chunks, needs numpy)
+REPLICA_MODE = os.getenv("REPLICA_MODE", "off")  # "off", "fallback" (when a search fails) or "first" (confident local hits skip the search)
+REPLICA_PATH = os.getenv("REPLICA_PATH") or os.path.expanduser("~/.cache/agentset-gradio-demo/replica")
+REPLICA_DIMS = 2048  # Hash buckets per chunk vector
+REPLICA_DTYPE = "int8"  # Matrix entries: "int8" or "float16"
+REPLICA_MIN_SCORE = 0.6  # Lowest local score (0-1) served without a search in "first" mode
+REPLICA_CHUNK_CHARS = 1500  # Characters per locally kept chunk of ingested text
+
+# Retrieval Cache Settings
+RETRIEVAL_CACHE_ENABLED = True
+RETRIEVAL_CACHE_MAX_ENTRIES = 1024  # Entries kept in the in-memory LRU tier
+RETRIEVAL_CACHE_TTL = 300  # Seconds a cached search result stays valid
+RETRIEVAL_CACHE_PATH = os.getenv("RETRIEVAL_CACHE_PATH") or None  # Optional SQLite tier
+RETRIEVAL_CACHE_SIMILARITY = None  # e.g. 0.9 to serve near-duplicate queries
+
+# Response Cache Settings
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 512  # Answers kept in the in-memory LRU tier
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH") or None  # Optional SQLite tier
+RESPONSE_CACHE_MAX_DISK_ENTRIES = 100000  # Answers kept in the SQLite tier (least recently used dropped first)
+RESPONSE_CACHE_DISK_TTL = 7 * 24 * 3600  # Seconds an answer stays in the SQLite tier (None for no limit)
+
+# Batch Ingestion Settings
+INGEST_BATCH_CONCURRENCY = 4  # Documents ingested in parallel
+INGEST_MAX_RETRIES = 3  # Retries per document after a transient failure (on top of per-call retries)
+
+# Ingest Manifest Settings (skip unchanged documents, replace changed ones)
+INGEST_MANIFEST_ENABLED = True
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH") or ":memory:"  # SQLite file; in-memory if unset
+
+# Local Preprocessing Settings (extract txt/md/html/csv/json locally and send TEXT jobs)
+PREPROCESS_FILES = False  # Applies to files ingested through the UI
+PREPROCESS_WORKERS = None  # Extraction processes (None = number of CPUs)
+PREPROCESS_MAX_CHARS = 32000  # Largest TEXT job created from one file; longer files are split
+
+# Folder Sync Settings (`agentset-gradio-demo sync --watch`)
+SYNC_DEBOUNCE = 2.0  # Quiet seconds before a batch of file changes is synced
+SYNC_MAX_DELAY = 30.0  # Longest a batch of changes is held back while files keep changing
+SYNC_POLL_INTERVAL = 5.0  # Seconds between scans when watchdog is not installed
+
+# Batch Question Answering Settings (`agentset-gradio-demo batch`)
+BATCH_CONCURRENCY = 16  # Questions retrieved and answered at the same time
+
+# Request Queue Settings (Gradio concurrency per event group)
+QUEUE_MAX_SIZE = 256  # Pending events before new ones are rejected
+QUEUE_DEFAULT_CONCURRENCY_LIMIT = 4  # Events without their own group
+CHAT_CONCURRENCY_LIMIT = 64  # Concurrent chat streams (async, mostly waiting on OpenAI)
+INGEST_CONCURRENCY_LIMIT = 8  # Concurrent single-document ingests
+BULK_INGEST_CONCURRENCY_LIMIT = 2  # Concurrent bulk ingests (each runs its own worker pool)
+STATUS_CONCURRENCY_LIMIT = 16  # Concurrent job status checks and job table refreshes
+CHAT_STREAM_UPDATE_INTERVAL = 0.05  # Min seconds between streamed chat UI updates
+
+# Metrics Settings
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+METRICS_DIR = os.getenv("METRICS_DIR") or None  # Shared snapshot directory when running several workers
+METRICS_EXPORT_INTERVAL = 5  # Seconds between snapshot writes in multi-worker mode
 
 # OpenAI Model Configuration
 OPENAI_MODEL = "gpt-4o-mini"  # Default model
 AVAILABLE_MODELS = [
+    "auto",  # Picked per question by the model router (see MODEL_ROUTER_TIERS)
     "gpt-5.1",
     "gpt-4o",
     "gpt-4o-mini",
@@ -37,6 +147,30 @@ AVAILABLE_MODELS = [
     "o3-mini"
 ]
 
+# Model Routing Settings (for the "auto" model)
+MODEL_ROUTER_TIERS = [  # Fastest first; a question goes to the first tier whose limits all hold
+    {
+        "name": "fast",
+        "model": "gpt-4o-mini",
+        "max_query_words": 16,  # Words in the question
+        "max_context_tokens": 1500,  # Tokens of selected context
+        "min_score_spread": 0.15,  # Top retrieval score minus the median of the others
+        "reasoning": False,  # Send "why/how/compare/explain" questions to a later tier
+    },
+    {
+        "name": "standard",
+        "model": "gpt-4o",
+        "max_query_words": 60,
+        "max_context_tokens": 6000,
+        "reasoning": False,
+    },
+    {"name": "reasoning", "model": "gpt-5.1"},
+]
+MODEL_ROUTER_LATENCY_SLO = 20.0  # p95 seconds per full answer before a faster tier takes over
+MODEL_ROUTER_FIRST_TOKEN_SLO = 4.0  # p95 seconds to the first streamed token before a faster tier takes over
+MODEL_ROUTER_WINDOW = 300  # Seconds of latency samples behind each model's p95
+MODEL_ROUTER_PROBE_RATIO = 0.05  # Share of fallbacks still sent to the slow model to notice its recovery
+
 # System Prompt for RAG responses
 SYSTEM_PROMPT = """You are a helpful assistant. Answer questions based on the following context.
 If you cannot find the answer in the context, say so clearly.
@@ -0,0 +1,156 @@
+"""
+Context Builder - Turns search hits into a token-budgeted prompt context
+Drops duplicate/overlapping chunks, orders by score, and fits the rest into
+a token budget using the target model's tokenizer when tiktoken is installed
+"""
+
+import functools
+import logging
+import re
+from dataclasses import asdict, dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+SOURCE_SEPARATOR = "\n\n---\n\n"
+
+
+@dataclass
+class ContextChunk:
+    """One retrieved chunk selected for the prompt context."""
+
+    id: str
+    text: str
+    score: float = 0.0
+    metadata: dict = field(default_factory=dict)
+    tokens: int = 0
+    truncated: bool = False
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@functools.lru_cache(maxsize=16)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:  # optional dependency
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Count tokens with the model's tokenizer, or estimate them without tiktoken."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Cut text down to at most max_tokens tokens."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _overlaps(a: set, b: set, threshold: float) -> bool:
+    """True if the smaller shingle set is at least `threshold` contained in the other."""
+    if not a or not b:
+        return False
+    return len(a & b) / min(len(a), len(b)) >= threshold
+
+
+def _rank_score(hit: dict) -> float:
+    """Score a hit is ordered by: the fused score of fused hits, the search score otherwise."""
+    return hit.get("rrf_score") or hit.get("score") or 0.0
+
+
+def build_context(
+    hits: list,
+    model: str = "gpt-4o-mini",
+    token_budget: int = 3000,
+    overlap_threshold: float = 0.8,
+    min_truncated_tokens: int = 64,
+) -> list:
+    """
+    Select the chunks that go into the prompt.
+
+    Hits are taken highest score first (fused hits by their 'rrf_score'). A hit is dropped when its text
+    duplicates or largely overlaps (shingle containment >= overlap_threshold)
+    a chunk already selected. Chunks are added until token_budget is used up.
+    The first chunk that does not fit is truncated, if at least
+    min_truncated_tokens tokens remain.
+
+    Args:
+        hits: Search hits as dictionaries with 'id', 'text', 'score' and 'metadata'
+        model: Model whose tokenizer measures the budget
+        token_budget: Maximum context tokens (None for no limit)
+        overlap_threshold: Containment ratio (0-1) at which a chunk counts as duplicate
+        min_truncated_tokens: Smallest remaining budget worth filling with a truncated chunk
+
+    Returns:
+        Selected ContextChunk objects in selection order, each keeping its search score
+    """
+    selected, selected_shingles = [], []
+    used = 0
+    dropped = 0
+
+    for hit in sorted(hits, key=_rank_score, reverse=True):
+        text = (hit.get("text") or "").strip()
+        if not text:
+            continue
+
+        shingles = _shingles(text)
+        if any(_overlaps(shingles, seen, overlap_threshold) for seen in selected_shingles):
+            dropped += 1
+            continue
+
+        tokens = count_tokens(text, model)
+        chunk = ContextChunk(
+            id=hit.get("id", ""),
+            text=text,
+            score=hit.get("score") or 0.0,
+            metadata=hit.get("metadata") or {},
+            tokens=tokens,
+        )
+
+        if token_budget is not None and used + tokens > token_budget:
+            remaining = token_budget - used
+            if remaining >= min_truncated_tokens:
+                chunk.text = truncate_to_tokens(text, remaining, model)
+                chunk.tokens = count_tokens(chunk.text, model)
+                chunk.truncated = True
+                selected.append(chunk)
+                used += chunk.tokens
+            break
+
+        selected.append(chunk)
+        selected_shingles.append(shingles)
+        used += tokens
+
+    logger.info(
+        f"Built context of {used} tokens from {len(selected)} chunks "
+        f"({dropped} duplicates dropped, {len(hits)} hits)"
+    )
+    return selected
+
+
+def format_context(chunks: list) -> str:
+    """Join chunks into the prompt context, keeping each source's boundary and ID."""
+    return SOURCE_SEPARATOR.join(
+        f"[Source {i}: {chunk.id}]\n{chunk.text}" for i, chunk in enumerate(chunks, start=1)
+    )
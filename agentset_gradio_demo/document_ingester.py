@@ -3,13 +3,62 @@ Document Ingester - Handles document ingestion into Agentset namespace
 Supports multiple ingestion types: TEXT, FILE, and MANAGED_FILE
 """
 
+import asyncio
 import logging
+import multiprocessing
+import os
+import random
+import threading
 import time
-import requests
-from agentset import Agentset
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from agentset_gradio_demo.cache import RetrievalCache
+from agentset_gradio_demo.job_tracker import JobTracker
+from agentset_gradio_demo.manifest import IngestManifest, hash_metadata, hash_text, url_fingerprint
+from agentset_gradio_demo.metrics import metrics
+from agentset_gradio_demo.preprocess import preprocess_file, supports
+from agentset_gradio_demo.resilience import Resilience, classify
+from agentset_gradio_demo.sync import DirectoryWatcher, path_filter, scan_directory
+
+if TYPE_CHECKING:  # The SDKs are imported on first use to keep startup fast
+    from agentset import Agentset
+
+    from agentset_gradio_demo.replica import ReplicaStore
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read from disk per upload chunk
+
+
+def _worth_retrying(error: Exception) -> bool:
+    """Whether a failed ingest may run again: transient, and the failed request certainly did not take effect."""
+    retryable, unprocessed = classify(error)
+    return retryable and unprocessed
+
+
+class _FileChunks:
+    """
+    Iterable request body that reads a file lazily in fixed-size chunks.
+
+    Defining __len__ lets requests send a Content-Length header (presigned
+    URLs reject chunked transfer encoding) while still streaming the body.
+    """
+
+    def __init__(self, file_path: str, file_size: int, chunk_size: int):
+        self.file_path = file_path
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.file_size
+
+    def __iter__(self):
+        with open(self.file_path, "rb") as f:
+            while chunk := f.read(self.chunk_size):
+                yield chunk
+
 
 class DocumentIngester:
     """
@@ -17,36 +66,78 @@ class DocumentIngester:
     Supports ingesting documents from URLs, text content, and local files.
     """
 
-    def __init__(self, agentset_namespace_id: str, agentset_api_token: str):
+    def __init__(
+        self,
+        agentset_namespace_id: str,
+        agentset_api_token: str,
+        client: "Agentset" = None,
+        retrieval_cache: RetrievalCache = None,
+        manifest: IngestManifest = None,
+        preprocess_workers: int = None,
+        preprocess_max_chars: int = 32000,
+        resilience: Resilience = None,
+        upload_timeout: tuple = (10.0, 120.0),
+        replica: "ReplicaStore" = None,
+        replica_chunk_chars: int = 1500,
+    ):
         """
         Initialize the Document Ingester.
 
         Args:
             agentset_namespace_id: Agentset namespace ID
             agentset_api_token: Agentset API token
+            client: Pre-built Agentset client to reuse (optional)
+            retrieval_cache: Retrieval cache to invalidate when a job completes (optional)
+            manifest: Ingest manifest used to skip unchanged documents and
+                replace changed ones (optional; without it every call ingests)
+            preprocess_workers: Processes extracting text for preprocessed
+                files (defaults to the number of CPUs)
+            preprocess_max_chars: Largest TEXT job created from a preprocessed file
+            resilience: Timeout/retry policy, shared between clients (optional)
+            upload_timeout: (connect, read) timeouts in seconds for presigned uploads
+            replica: Local replica that keeps the text this ingester sends (optional)
+            replica_chunk_chars: Characters per chunk kept in the replica
         """
         logger.info("Initializing Document Ingester")
 
         self.agentset_namespace_id = agentset_namespace_id
         self.agentset_api_token = agentset_api_token
+        self.retrieval_cache = retrieval_cache
+        self.manifest = manifest
+        self.preprocess_workers = preprocess_workers
+        self.preprocess_max_chars = preprocess_max_chars
+        self.resilience = resilience or Resilience()
+        self.upload_timeout = upload_timeout
+        self.replica = replica
+        self.replica_chunk_chars = replica_chunk_chars
+        self._job_tracker = None
+        self._job_tracker_lock = threading.Lock()
+        self._preprocess_pool = None
 
         # Initialize Agentset client
-        self.client = Agentset(
-            namespace_id=agentset_namespace_id,
-            token=agentset_api_token,
-        )
+        if client is None:
+            from agentset import Agentset
+
+            client = Agentset(namespace_id=agentset_namespace_id, token=agentset_api_token)
+        self.client = client
         logger.debug("Agentset client initialized for ingestion")
 
     def ingest_text(
-        self, text_content: str, file_name: str = None, metadata: dict = None
+        self, text_content: str, file_name: str = None, metadata: dict = None, document_id: str = None
     ) -> dict:
         """
         Ingest text content into the namespace.
 
+        Texts are tracked in the manifest by their content, so ingesting a
+        different text under the same file name adds a document instead of
+        replacing one. Pass document_id to replace the text ingested earlier
+        under that ID.
+
         Args:
             text_content: The text content to ingest
             file_name: Optional file name for the content
             metadata: Optional metadata dictionary
+            document_id: Stable ID of the document, whose earlier version is replaced (optional)
 
         Returns:
             Dictionary containing the job ID and status
@@ -56,38 +147,67 @@ class DocumentIngester:
         )
 
         try:
-            payload = {
-                "type": "TEXT",
-                "text": text_content,
-            }
-
-            if file_name:
-                payload["fileName"] = file_name
-
-            config = {}
-            if metadata:
-                config["metadata"] = metadata
-
-            job = self.client.ingest_jobs.create(
-                payload=payload, config=config if config else None
+            content_hash = hash_text(text_content)
+            size = len(text_content.encode("utf-8"))
+            # The file name is only a display name; replacing needs an explicit ID
+            source = f"text-id:{document_id}" if document_id else f"text:{content_hash}"
+            skipped, previous = self._check_manifest(
+                source, content_hash, metadata, size, file_name or "text-content"
             )
+            if skipped:
+                return skipped
 
-            logger.info(f"Text ingestion job created: {job.data.id}")
+            job_id = self._create_text_job(text_content, file_name, metadata)
+            logger.info(f"Text ingestion job created: {job_id}")
+            dedup = self._record_ingest(source, content_hash, metadata, job_id, previous, size)
+            self._replicate(source, job_id, [text_content], metadata)
 
             return {
                 "success": True,
-                "job_id": job.data.id,
+                "job_id": job_id,
                 "document_name": file_name or "text-content",
+                "dedup": dedup,
+                "bytes": size,
                 "message": f"Successfully initiated ingestion of text content",
             }
         except Exception as e:
             logger.error(f"Error ingesting text: {str(e)}")
+            metrics.inc("errors_total", operation="ingest_text")
             return {
                 "success": False,
                 "error": str(e),
+                "retryable": _worth_retrying(e),
                 "message": f"Error ingesting text: {str(e)}",
             }
 
+    def _create_text_job(self, text: str, file_name: str = None, metadata: dict = None) -> str:
+        """Create a TEXT ingest job and return its ID."""
+        payload = {
+            "type": "TEXT",
+            "text": text,
+        }
+
+        if file_name:
+            payload["fileName"] = file_name
+
+        config = {}
+        if metadata:
+            config["metadata"] = metadata
+
+        with metrics.timed("ingest_stage", stage="job_create"):
+            job = self._create_job(payload=payload, config=config if config else None)
+        return job.data.id
+
+    def _create_job(self, **kwargs):
+        """Create an ingest job, retrying only failures where the request was not processed."""
+        return self.resilience.call(
+            "agentset_ingest",
+            self.client.ingest_jobs.create,
+            idempotent=False,
+            timeout_ms=self.resilience.timeout_ms("agentset_ingest"),
+            **kwargs,
+        )
+
     def ingest_file_from_url(
         self, document_name: str, file_url: str, metadata: dict = None
     ) -> dict:
@@ -105,6 +225,17 @@ class DocumentIngester:
         logger.info(f"Ingesting document: '{document_name}' from URL: {file_url}")
 
         try:
+            content_hash = None
+            previous = None
+            if self.manifest is not None:
+                with metrics.timed("ingest_stage", stage="hash"):
+                    content_hash = url_fingerprint(file_url)
+                skipped, previous = self._check_manifest(
+                    file_url, content_hash, metadata, None, document_name
+                )
+                if skipped:
+                    return skipped
+
             payload = {
                 "type": "FILE",
                 "fileUrl": file_url,
@@ -114,52 +245,97 @@ class DocumentIngester:
             if metadata:
                 config["metadata"] = metadata
 
-            job = self.client.ingest_jobs.create(
-                name=document_name, payload=payload, config=config if config else None
-            )
+            with metrics.timed("ingest_stage", stage="job_create"):
+                job = self._create_job(
+                    name=document_name, payload=payload, config=config if config else None
+                )
 
             logger.info(f"Document ingestion job created: {job.data.id}")
+            dedup = self._record_ingest(file_url, content_hash, metadata, job.data.id, previous)
 
             return {
                 "success": True,
                 "job_id": job.data.id,
                 "document_name": document_name,
+                "dedup": dedup,
                 "message": f"Successfully initiated ingestion of '{document_name}'",
             }
         except Exception as e:
             logger.error(f"Error ingesting document: {str(e)}")
+            metrics.inc("errors_total", operation="ingest_file_from_url")
             return {
                 "success": False,
                 "error": str(e),
+                "retryable": _worth_retrying(e),
                 "message": f"Error ingesting document: {str(e)}",
             }
 
     def ingest_local_file(
-        self, file_path: str, file_name: str = None, metadata: dict = None
+        self, file_path: str, file_name: str = None, metadata: dict = None, preprocess: bool = False
     ) -> dict:
         """
         Upload and ingest a local file.
 
+        With preprocess, txt/md/html/csv/json files are not uploaded: their
+        text is extracted, cleaned and split locally (in the preprocessing
+        process pool) and sent as one TEXT job per part of at most
+        preprocess_max_chars characters. Other file types are uploaded as usual.
+
         Args:
             file_path: Path to the local file
             file_name: Optional custom file name (uses original if not provided)
             metadata: Optional metadata dictionary
+            preprocess: Extract text locally for supported file types
 
         Returns:
-            Dictionary containing the job ID and status
+            Dictionary containing the job ID and status ('job_ids' lists
+            every part of a preprocessed file)
         """
         logger.info(f"Ingesting local file: {file_path}")
 
         try:
-            # Read the file
-            with open(file_path, "rb") as f:
-                file_data = f.read()
-
             # Use provided file_name or extract from path
             if not file_name:
                 file_name = file_path.split("/")[-1]
 
-            file_size = len(file_data)
+            stat = os.stat(file_path)
+            file_size = stat.st_size
+            source = os.path.abspath(file_path)
+            preprocess = preprocess and supports(file_name)
+            manifest_metadata = self._manifest_metadata(metadata, preprocess)
+            content_hash = None
+            previous = None
+            if self.manifest is not None:
+                with metrics.timed("ingest_stage", stage="hash"):
+                    content_hash = self.manifest.file_hash(
+                        self.agentset_namespace_id, source, file_size, stat.st_mtime_ns
+                    )
+                skipped, previous = self._check_manifest(
+                    source, content_hash, manifest_metadata, file_size, file_name, stat.st_mtime_ns
+                )
+                if skipped:
+                    return skipped
+
+            if preprocess:
+                job_ids, parts = self._ingest_parts(file_path, file_name, metadata)
+                sent = sum(len(part.encode("utf-8")) for part in parts)
+                dedup = self._record_ingest(
+                    source, content_hash, manifest_metadata, ",".join(job_ids), previous,
+                    file_size, stat.st_mtime_ns,
+                )
+                self._replicate(source, job_ids[0], parts, metadata)
+                return {
+                    "success": True,
+                    "job_id": job_ids[0],
+                    "job_ids": job_ids,
+                    "document_name": file_name,
+                    "dedup": dedup,
+                    "bytes": file_size,
+                    "bytes_sent": sent,
+                    "message": f"Successfully extracted and initiated ingestion of '{file_name}' "
+                    f"({len(job_ids)} text part{'s' if len(job_ids) > 1 else ''})",
+                }
+
             # Determine content type from the actual file name being used
             content_type = self._get_content_type(file_name)
 
@@ -169,29 +345,19 @@ class DocumentIngester:
 
             # Get a presigned upload URL
             logger.info(f"Requesting presigned upload URL for {file_name}")
-            upload = self.client.uploads.create(
-                file_name=file_name,
-                file_size=file_size,
-                content_type=content_type,
-            )
+            with metrics.timed("ingest_stage", stage="presign"):
+                upload = self.resilience.call(
+                    "agentset_ingest",
+                    self.client.uploads.create,
+                    file_name=file_name,
+                    file_size=file_size,
+                    content_type=content_type,
+                    timeout_ms=self.resilience.timeout_ms("agentset_ingest"),
+                )
 
             # Upload the file
-            logger.info(
-                f"Uploading file to presigned URL with Content-Type: {content_type}"
-            )
-            response = requests.put(
-                upload.data.url,
-                data=file_data,
-                headers={"Content-Type": content_type},
-            )
-
-            if response.status_code not in [200, 204]:
-                logger.error(
-                    f"Upload failed with status {response.status_code}: {response.text}"
-                )
-                raise Exception(
-                    f"File upload failed: {response.status_code} - {response.text}"
-                )
+            with metrics.timed("ingest_stage", stage="put"):
+                self._upload_file(upload.data.url, file_path, file_size, content_type)
 
             # Create an ingest job for the uploaded file
             logger.info(f"Creating ingest job for {file_name}")
@@ -205,30 +371,707 @@ class DocumentIngester:
             if metadata:
                 config["metadata"] = metadata
 
-            job = self.client.ingest_jobs.create(
-                payload=payload, config=config if config else None
-            )
+            with metrics.timed("ingest_stage", stage="job_create"):
+                job = self._create_job(payload=payload, config=config if config else None)
 
             logger.info(f"Local file ingestion job created: {job.data.id}")
+            dedup = self._record_ingest(
+                source, content_hash, manifest_metadata, job.data.id, previous, file_size, stat.st_mtime_ns
+            )
 
             return {
                 "success": True,
                 "job_id": job.data.id,
                 "document_name": file_name,
+                "dedup": dedup,
+                "bytes": file_size,
                 "message": f"Successfully uploaded and initiated ingestion of '{file_name}'",
             }
         except Exception as e:
             logger.error(f"Error ingesting local file: {str(e)}")
+            metrics.inc("errors_total", operation="ingest_local_file")
             return {
                 "success": False,
                 "error": str(e),
+                "retryable": _worth_retrying(e),
                 "message": f"Error ingesting file: {str(e)}",
             }
 
+    def _ingest_parts(self, file_path: str, file_name: str, metadata: dict = None) -> tuple:
+        """
+        Extract a file's text in the preprocessing pool and ingest every part as a TEXT job.
+
+        Returns:
+            (job IDs in part order, text of the parts)
+
+        Raises:
+            ValueError: If no text was found in the file
+        """
+        with metrics.timed("ingest_stage", stage="preprocess"):
+            prepared = self.preprocess_pool.submit(
+                preprocess_file, file_path, self.preprocess_max_chars
+            ).result()
+        parts = prepared["parts"]
+        if not parts:
+            raise ValueError(f"No text found in '{file_name}'")
+        metrics.inc("preprocess_bytes_total", prepared["bytes_in"], direction="in")
+        metrics.inc("preprocess_bytes_total", prepared["chars_out"], direction="out")
+        logger.info(
+            f"Extracted {prepared['chars_out']} characters in {len(parts)} parts from "
+            f"{file_name} ({prepared['bytes_in']} bytes) in {prepared['seconds']:.3f}s"
+        )
+
+        job_ids = []
+        try:
+            for i, part in enumerate(parts):
+                if len(parts) == 1:
+                    job_ids.append(self._create_text_job(part, file_name, metadata))
+                else:
+                    job_ids.append(self._create_text_job(
+                        part,
+                        f"{file_name} [{i + 1}/{len(parts)}]",
+                        {**(metadata or {}), "part": i + 1, "parts": len(parts)},
+                    ))
+        except Exception:
+            # Do not leave a partial document behind; a retry ingests every part again
+            for job_id in job_ids:
+                self._delete_job(job_id)
+            raise
+        return job_ids, parts
+
+    @property
+    def preprocess_pool(self) -> ProcessPoolExecutor:
+        """Process pool extracting text for preprocessed files, started on first use."""
+        if self._preprocess_pool is None:
+            with self._job_tracker_lock:
+                if self._preprocess_pool is None:
+                    # spawn: forking a process that runs server threads is unsafe
+                    self._preprocess_pool = ProcessPoolExecutor(
+                        max_workers=self.preprocess_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._preprocess_pool
+
+    def close(self):
+        """Stop the job tracker thread and the preprocessing processes; both restart on next use."""
+        if self._job_tracker is not None:
+            self._job_tracker.stop()
+        with self._job_tracker_lock:
+            pool, self._preprocess_pool = self._preprocess_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _manifest_metadata(self, metadata: dict, preprocess: bool) -> dict:
+        """Metadata hashed into the manifest; preprocessed and uploaded ingests differ."""
+        if not preprocess:
+            return metadata
+        return {**(metadata or {}), "_preprocess_max_chars": self.preprocess_max_chars}
+
+    def _check_manifest(
+        self,
+        source: str,
+        content_hash: str,
+        metadata: dict,
+        size: int,
+        document_name: str,
+        mtime_ns: int = None,
+    ) -> tuple:
+        """
+        Look a document up in the manifest before ingesting it.
+
+        A document is skipped when its source was last ingested with the same
+        content and metadata, or when a new source carries content that is
+        already in the namespace under another source. In the second case the
+        new source is recorded against the existing job, so a renamed file
+        keeps its documents when the old path is deleted.
+
+        Returns:
+            (skip result or None, previous manifest entry of the source or None)
+        """
+        if self.manifest is None:
+            return None, None
+
+        namespace = self.agentset_namespace_id
+        metadata_hash = hash_metadata(metadata)
+        previous = self.manifest.lookup(namespace, source)
+        match = None
+        if content_hash is not None:
+            if previous is None:
+                match = self.manifest.find_content(namespace, content_hash, metadata_hash)
+            elif previous["content_hash"] == content_hash and previous["metadata_hash"] == metadata_hash:
+                match = previous
+        if match is None:
+            return None, previous
+
+        logger.info(f"Skipping '{document_name}': unchanged since job {match['job_id']}")
+        if previous is None:
+            self.manifest.record(
+                namespace, source, content_hash, metadata_hash, match["job_id"], size, mtime_ns
+            )
+        elif mtime_ns is not None and previous["mtime_ns"] != mtime_ns:
+            # Touched but unchanged: store the new mtime so the next check needs no hashing
+            self.manifest.record(
+                namespace, source, content_hash, metadata_hash, previous["job_id"], size, mtime_ns
+            )
+        self.manifest.count("skipped", size)
+        metrics.inc("ingest_dedup_total", outcome="skipped")
+        if size:
+            metrics.inc("ingest_bytes_saved_total", size)
+        return {
+            "success": True,
+            "skipped": True,
+            "job_id": match["job_id"],
+            "document_name": document_name,
+            "dedup": "skipped",
+            "bytes": size,
+            "message": f"'{document_name}' is unchanged since its last ingest, skipped",
+        }, previous
+
+    def _record_ingest(
+        self,
+        source: str,
+        content_hash: str,
+        metadata: dict,
+        job_id: str,
+        previous: dict = None,
+        size: int = None,
+        mtime_ns: int = None,
+    ) -> str:
+        """
+        Record a new ingest job in the manifest and retire the job it replaces.
+
+        The replaced job is deleted only once the new one has completed, so
+        the source stays searchable meanwhile; if the new job fails, the
+        source is pointed back at the replaced job.
+
+        Returns:
+            "new" or "replaced" (None without a manifest)
+        """
+        if self.manifest is None:
+            return None
+
+        outcome = "new" if previous is None else "replaced"
+        self.manifest.record(
+            self.agentset_namespace_id,
+            source,
+            content_hash,
+            hash_metadata(metadata),
+            job_id,
+            size,
+            mtime_ns,
+        )
+        self.manifest.count(outcome, size)
+        metrics.inc("ingest_dedup_total", outcome=outcome)
+        if previous is not None and previous["job_id"] != job_id:
+            self._replace_when_completed(source, job_id, previous)
+        return outcome
+
+    def _replace_when_completed(self, source: str, job_id: str, previous: dict):
+        """Delete a source's replaced job once every job of its new version has completed."""
+        # Preprocessed files are recorded with the comma-separated jobs of their parts
+        pending = set(job_id.split(","))
+        lock = threading.Lock()
+
+        def on_finished(result: dict):
+            with lock:
+                if not pending:  # Another part already failed
+                    return
+                if result["success"]:
+                    pending.discard(result["job_id"])
+                    if pending:
+                        return
+                else:
+                    pending.clear()
+            if result["success"]:
+                self._release_job(previous["job_id"])
+                logger.info(f"Replaced job {previous['job_id']} for {source} with {job_id}")
+                return
+            # The failure hook dropped the new entry; fall back to the content still ingested
+            if self.manifest.lookup(self.agentset_namespace_id, source) is None:
+                self.manifest.record(
+                    self.agentset_namespace_id,
+                    source,
+                    previous["content_hash"],
+                    previous["metadata_hash"],
+                    previous["job_id"],
+                    previous["size"],
+                    previous["mtime_ns"],
+                )
+            logger.warning(f"Job {job_id} for {source} did not complete, kept job {previous['job_id']}")
+
+        for part_job_id in list(pending):
+            self.job_tracker.track(part_job_id, callback=on_finished)
+
+    def _replicate(self, source: str, job_id: str, texts: list, metadata: dict = None):
+        """Keep the chunks of an ingested document in the replica, replacing its earlier version."""
+        if self.replica is None:
+            return
+        from agentset_gradio_demo.replica import split_text
+
+        try:
+            namespace = self.agentset_namespace_id
+            self.replica.remove_source(namespace, source)
+            chunks = [
+                {"id": f"{job_id}:{i}", "text": chunk, "metadata": {**(metadata or {}), "source": source}}
+                for i, chunk in enumerate(
+                    c for text in texts for c in split_text(text, self.replica_chunk_chars)
+                )
+            ]
+            self.replica.add(namespace, chunks, source)
+        except Exception as e:
+            logger.warning(f"Could not add {source} to the replica: {str(e)}")
+
+    def _release_job(self, job_id: str):
+        """Delete an ingest job (and so its documents) once no manifest source refers to it."""
+        if self.manifest.references(job_id):
+            return
+        # Preprocessed files are recorded with the comma-separated jobs of their parts
+        for part_job_id in job_id.split(","):
+            self._delete_job(part_job_id)
+
+    def _delete_job(self, job_id: str):
+        """Delete an ingest job, tolerating jobs that are already gone."""
+        from agentset.errors import AgentsetError
+
+        try:
+            self.resilience.call(
+                "agentset_ingest",
+                self.client.ingest_jobs.delete,
+                job_id=job_id,
+                timeout_ms=self.resilience.timeout_ms("agentset_ingest"),
+            )
+        except AgentsetError as e:
+            # A 204 without a JSON body fails the SDK's response parsing but is a
+            # successful delete, and 404 means the job is already gone
+            if e.status_code not in (204, 404):
+                logger.warning(f"Could not delete job {job_id}: {str(e)}")
+        except Exception as e:
+            logger.warning(f"Could not delete job {job_id}: {str(e)}")
+
+    def ingest_batch(
+        self,
+        items: Iterable,
+        concurrency: int = 4,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        metadata: dict = None,
+        progress_callback: Callable[[int, int, dict], None] = None,
+        preprocess: bool = False,
+    ) -> dict:
+        """
+        Ingest many documents with bounded concurrency.
+
+        Items may be mixed. Strings starting with http:// or https:// are
+        ingested as URLs, strings naming an existing file as local files, and
+        any other string as text. Dictionaries can be explicit:
+        {"text": ..., "file_name": ..., "id": ...}, {"url": ..., "name": ...} or
+        {"path": ..., "file_name": ...}, each with optional "metadata". A text's
+        "id" replaces the text ingested earlier with the same ID.
+
+        Args:
+            items: Iterable of texts, URLs, local paths or item dictionaries
+            concurrency: Maximum number of ingestions in flight
+            max_retries: Retries per item after a transient failure
+            backoff: Base delay in seconds for exponential backoff with jitter
+            metadata: Metadata applied to items that do not carry their own
+            progress_callback: Called as progress_callback(done, total, result)
+                after every item finishes
+            preprocess: Extract text locally for supported local files (see
+                ingest_local_file); up to `concurrency` files are extracted
+                at once, in parallel worker processes
+
+        Returns:
+            Dictionary with per-item 'results' (in input order), 'succeeded',
+            'failed', 'elapsed_seconds' and 'docs_per_second'
+        """
+        items = list(items)
+        total = len(items)
+        logger.info(f"Ingesting batch of {total} items (concurrency={concurrency})")
+
+        start_time = time.perf_counter()
+        results = [None] * total
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {
+                pool.submit(self._ingest_item, item, max_retries, backoff, metadata, preprocess): index
+                for index, item in enumerate(items)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, results[index])
+
+        return self._batch_summary(results, time.perf_counter() - start_time)
+
+    async def aingest_batch(
+        self,
+        items: Iterable,
+        concurrency: int = 4,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        metadata: dict = None,
+        progress_callback: Callable[[int, int, dict], None] = None,
+        preprocess: bool = False,
+    ) -> dict:
+        """
+        Async variant of ingest_batch for callers running in an event loop.
+
+        Items are processed in worker threads, at most `concurrency` at a time,
+        so the event loop stays free while uploads are in flight.
+
+        Args:
+            items: Iterable of texts, URLs, local paths or item dictionaries
+            concurrency: Maximum number of ingestions in flight
+            max_retries: Retries per item after a transient failure
+            backoff: Base delay in seconds for exponential backoff with jitter
+            metadata: Metadata applied to items that do not carry their own
+            progress_callback: Called as progress_callback(done, total, result)
+                after every item finishes
+            preprocess: Extract text locally for supported local files
+
+        Returns:
+            Same summary dictionary as ingest_batch
+        """
+        items = list(items)
+        total = len(items)
+        logger.info(f"Ingesting batch of {total} items asynchronously (concurrency={concurrency})")
+
+        start_time = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        done = 0
+
+        async def run(item):
+            nonlocal done
+            async with semaphore:
+                result = await asyncio.to_thread(
+                    self._ingest_item, item, max_retries, backoff, metadata, preprocess
+                )
+            done += 1
+            if progress_callback:
+                progress_callback(done, total, result)
+            return result
+
+        results = await asyncio.gather(*(run(item) for item in items))
+        return self._batch_summary(list(results), time.perf_counter() - start_time)
+
+    def sync_directory(
+        self,
+        root: str,
+        paths: Iterable = None,
+        include: Iterable = None,
+        exclude: Iterable = None,
+        delete_missing: bool = True,
+        concurrency: int = 4,
+        max_retries: int = 3,
+        metadata: dict = None,
+        progress_callback: Callable[[int, int, dict], None] = None,
+        preprocess: bool = False,
+    ) -> dict:
+        """
+        Bring the namespace in line with the files of a directory.
+
+        New and changed files are ingested (changed ones replace their previous
+        job), files whose size and mtime match the manifest are skipped without
+        being read, and with delete_missing the jobs of files that disappeared
+        are deleted. Documents are named by their path relative to root.
+
+        Args:
+            root: Directory to sync
+            paths: Only sync these files or directories under root (e.g. a
+                batch from DirectoryWatcher) instead of scanning the whole tree
+            include: Glob patterns a file must match (all files when empty)
+            exclude: Glob patterns of files to leave out
+            delete_missing: Delete the documents of files no longer present
+            concurrency: Maximum number of ingestions in flight
+            max_retries: Retries per file after a transient failure
+            metadata: Metadata applied to every file
+            progress_callback: Called as progress_callback(done, total, result)
+            preprocess: Extract text locally for supported files
+
+        Returns:
+            The ingest_batch summary of the new and changed files, plus
+            'scanned', 'unchanged', 'deleted' and 'deleted_sources'
+
+        Raises:
+            ValueError: If the ingester has no manifest to compare against
+        """
+        if self.manifest is None:
+            raise ValueError("sync_directory needs an ingester with an ingest manifest")
+
+        start_time = time.perf_counter()
+        root = os.path.abspath(root)
+        accept = path_filter(root, include, exclude)
+        namespace = self.agentset_namespace_id
+
+        if paths is None:
+            files = scan_directory(root, accept)
+            known = self.manifest.entries(namespace, prefix=root + os.sep)
+        else:
+            files, known = {}, []
+            for path in {os.path.abspath(p) for p in paths}:
+                if os.path.isdir(path):
+                    files.update(scan_directory(path, accept))
+                elif os.path.isfile(path) and accept(path):
+                    files[path] = os.stat(path)
+                # Covers a deleted file as well as the files of a deleted or moved-away folder
+                entry = self.manifest.lookup(namespace, path)
+                known.extend([entry] if entry else [])
+                known.extend(self.manifest.entries(namespace, prefix=path + os.sep))
+        known = {entry["source"]: entry for entry in known}
+
+        changed, unchanged = [], 0
+        for path, stat in sorted(files.items()):
+            entry = known.get(path)
+            metadata_hash = hash_metadata(self._manifest_metadata(metadata, preprocess and supports(path)))
+            if (
+                entry is not None
+                and entry["size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["metadata_hash"] == metadata_hash
+            ):
+                unchanged += 1
+                self.manifest.count("skipped", stat.st_size)
+                continue
+            changed.append({"path": path, "file_name": os.path.relpath(path, root)})
+        metrics.inc("ingest_dedup_total", unchanged, outcome="skipped")
+
+        summary = self.ingest_batch(
+            changed,
+            concurrency,
+            max_retries,
+            metadata=metadata,
+            progress_callback=progress_callback,
+            preprocess=preprocess,
+        )
+
+        deleted = []
+        if delete_missing:
+            for source, entry in known.items():
+                if source not in files and not os.path.exists(source):
+                    self.manifest.forget(namespace, source)
+                    self._release_job(entry["job_id"])
+                    if self.replica is not None:
+                        self.replica.remove_source(namespace, source)
+                    deleted.append(source)
+            metrics.inc("ingest_dedup_total", len(deleted), outcome="deleted")
+
+        elapsed = time.perf_counter() - start_time
+        logger.info(
+            f"Synced {root}: {len(files)} files, {len(changed)} new or changed, "
+            f"{unchanged} unchanged, {len(deleted)} deleted in {elapsed:.2f}s"
+        )
+        return {
+            **summary,
+            "scanned": len(files),
+            "unchanged": unchanged + summary["skipped"],
+            "deleted": len(deleted),
+            "deleted_sources": deleted,
+            "elapsed_seconds": elapsed,
+        }
+
+    def watch_directory(
+        self,
+        root: str,
+        stop_event: threading.Event = None,
+        include: Iterable = None,
+        exclude: Iterable = None,
+        debounce: float = 2.0,
+        max_delay: float = 30.0,
+        poll_interval: float = 5.0,
+        on_sync: Callable[[dict], None] = None,
+        **sync_options,
+    ):
+        """
+        Keep the namespace in sync with a directory until stop_event is set.
+
+        Runs a full sync_directory first, then syncs only the paths reported
+        by a DirectoryWatcher, one coalesced batch at a time.
+
+        Args:
+            root: Directory to watch
+            stop_event: Set it to stop watching (runs until interrupted when None)
+            include: Glob patterns a file must match (all files when empty)
+            exclude: Glob patterns of files to leave out
+            debounce: Quiet seconds before a batch of changes is synced
+            max_delay: Upper bound in seconds for holding back a batch
+            poll_interval: Seconds between scans when watchdog is not installed
+            on_sync: Called with every sync_directory summary
+            **sync_options: Further sync_directory arguments
+        """
+        stop_event = stop_event or threading.Event()
+        watcher = DirectoryWatcher(
+            root,
+            path_filter(root, include, exclude),
+            debounce=debounce,
+            max_delay=max_delay,
+            poll_interval=poll_interval,
+        ).start()
+        try:
+            # Watching starts before the full sync so changes made during it are not lost
+            summary = self.sync_directory(root, include=include, exclude=exclude, **sync_options)
+            if on_sync:
+                on_sync(summary)
+            while not stop_event.is_set():
+                batch = watcher.next_batch(timeout=1.0)
+                if batch:
+                    summary = self.sync_directory(
+                        root, paths=batch, include=include, exclude=exclude, **sync_options
+                    )
+                    if on_sync:
+                        on_sync(summary)
+        finally:
+            watcher.stop()
+
+    def _ingest_item(
+        self, item, max_retries: int, backoff: float, metadata: dict = None, preprocess: bool = False
+    ) -> dict:
+        """
+        Ingest one batch item, retrying transient failures with exponential backoff and jitter.
+
+        Each API call is already retried by the resilience layer, so an item
+        is only run again when its last error was transient and certainly not
+        processed (e.g. a 429 or 503 that outlasted those retries). Permanent
+        errors such as a missing file or a 4xx fail the item at once.
+        """
+        try:
+            kind, kwargs = self._classify_item(item, metadata)
+        except ValueError as e:
+            return {"success": False, "item": str(item), "error": str(e), "message": str(e), "attempts": 0}
+        if kind == "path" and preprocess:
+            kwargs["preprocess"] = True
+
+        ingest = {
+            "text": self.ingest_text,
+            "url": self.ingest_file_from_url,
+            "path": self.ingest_local_file,
+        }[kind]
+        label = kwargs.get("file_path") or kwargs.get("file_url") or kwargs.get("file_name") or "text"
+
+        for attempt in range(max_retries + 1):
+            result = ingest(**kwargs)
+            if result["success"] or not result.get("retryable"):
+                break
+            if attempt < max_retries:
+                delay = backoff * (2**attempt) * random.uniform(0.5, 1.5)
+                logger.warning(
+                    f"Ingesting {label} failed (attempt {attempt + 1}), retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+        return {**result, "item": label, "type": kind, "attempts": attempt + 1}
+
+    @staticmethod
+    def _classify_item(item, metadata: dict = None) -> tuple:
+        """Map a batch item to an ingest method name and its keyword arguments."""
+        if isinstance(item, dict):
+            item_metadata = item.get("metadata", metadata)
+            if "text" in item:
+                return "text", {
+                    "text_content": item["text"],
+                    "file_name": item.get("file_name"),
+                    "metadata": item_metadata,
+                    "document_id": item.get("id"),
+                }
+            if "url" in item:
+                return "url", {
+                    "document_name": item.get("name") or item["url"].rstrip("/").split("/")[-1],
+                    "file_url": item["url"],
+                    "metadata": item_metadata,
+                }
+            if "path" in item:
+                return "path", {
+                    "file_path": os.fspath(item["path"]),
+                    "file_name": item.get("file_name"),
+                    "metadata": item_metadata,
+                }
+            raise ValueError(f"Batch item needs a 'text', 'url' or 'path' key: {item}")
+
+        if isinstance(item, os.PathLike):
+            return "path", {"file_path": os.fspath(item), "metadata": metadata}
+        if not isinstance(item, str):
+            raise ValueError(f"Unsupported batch item type: {type(item).__name__}")
+        if item.startswith(("http://", "https://")):
+            return "url", {
+                "document_name": item.rstrip("/").split("/")[-1],
+                "file_url": item,
+                "metadata": metadata,
+            }
+        if len(item) < 4096 and os.path.isfile(item):
+            return "path", {"file_path": item, "metadata": metadata}
+        return "text", {"text_content": item, "metadata": metadata}
+
+    @staticmethod
+    def _batch_summary(results: list, elapsed: float) -> dict:
+        """Summarize per-item batch results with throughput."""
+        succeeded = sum(1 for r in results if r["success"])
+        skipped = [r for r in results if r.get("skipped")]
+        docs_per_second = len(results) / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"Batch finished: {succeeded}/{len(results)} succeeded ({len(skipped)} unchanged) "
+            f"in {elapsed:.2f}s ({docs_per_second:.2f} docs/s)"
+        )
+        return {
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "skipped": len(skipped),
+            "replaced": sum(1 for r in results if r.get("dedup") == "replaced"),
+            "bytes_saved": sum(r.get("bytes") or 0 for r in skipped),
+            "elapsed_seconds": elapsed,
+            "docs_per_second": docs_per_second,
+        }
+
+    def _upload_file(
+        self, upload_url: str, file_path: str, file_size: int, content_type: str
+    ):
+        """
+        Stream a local file to a presigned upload URL.
+
+        The body is read from disk in UPLOAD_CHUNK_SIZE pieces while it is
+        sent, so memory use stays flat regardless of file size.
+
+        Args:
+            upload_url: Presigned PUT URL
+            file_path: Path to the local file
+            file_size: Size of the file in bytes (sent as Content-Length)
+            content_type: Content type the URL was signed for
+        """
+        logger.info(
+            f"Uploading file to presigned URL with Content-Type: {content_type}"
+        )
+        # A PUT to the same URL is idempotent, so failed uploads are retried;
+        # _FileChunks reopens the file for every attempt
+        self.resilience.call("upload", self._put_file, upload_url, file_path, file_size, content_type)
+
+    def _put_file(self, upload_url: str, file_path: str, file_size: int, content_type: str):
+        import requests
+
+        response = requests.put(
+            upload_url,
+            data=_FileChunks(file_path, file_size, UPLOAD_CHUNK_SIZE),
+            headers={"Content-Type": content_type},
+            timeout=self.upload_timeout,
+        )
+
+        if response.status_code not in [200, 204]:
+            logger.error(
+                f"Upload failed with status {response.status_code}: {response.text}"
+            )
+            raise requests.HTTPError(
+                f"File upload failed: {response.status_code} - {response.text}",
+                response=response,
+            )
+
     def get_job_status(self, job_id: str) -> dict:
         """
         Get the status of an ingestion job.
 
+        Only reads the status: caches and the manifest are updated by the
+        job tracker when it sees a tracked job finish.
+
         Args:
             job_id: The job ID to check
 
@@ -238,8 +1081,12 @@ class DocumentIngester:
         logger.info(f"Checking status of job: {job_id}")
 
         try:
-            job = self.client.ingest_jobs.get(job_id=job_id)
-
+            job = self.resilience.call(
+                "agentset_ingest",
+                self.client.ingest_jobs.get,
+                job_id=job_id,
+                timeout_ms=self.resilience.timeout_ms("agentset_ingest"),
+            )
             return {
                 "success": True,
                 "job_id": job_id,
@@ -248,6 +1095,7 @@ class DocumentIngester:
             }
         except Exception as e:
             logger.error(f"Error checking job status: {str(e)}")
+            metrics.inc("errors_total", operation="get_job_status")
             return {
                 "success": False,
                 "error": str(e),
@@ -260,38 +1108,23 @@ class DocumentIngester:
         """
         Wait for an ingestion job to complete.
 
+        The job is followed by the ingester's shared JobTracker, so many
+        concurrent waits share one polling loop instead of a sleep loop each.
+
         Args:
             job_id: The job ID to wait for
             max_wait_seconds: Maximum time to wait (default 1 hour)
-            poll_interval: How often to check status in seconds
+            poll_interval: Upper bound in seconds between status checks for this job
 
         Returns:
             Dictionary containing final job status
         """
         logger.info(f"Waiting for job completion: {job_id}")
 
-        start_time = time.time()
-
         try:
-            while time.time() - start_time < max_wait_seconds:
-                job = self.client.ingest_jobs.get(job_id=job_id)
-                status = job.data.status
-
-                logger.debug(f"Job status: {status}")
-
-                if status in ["COMPLETED", "FAILED"]:
-                    logger.info(f"Job {job_id} finished with status: {status}")
-                    return {
-                        "success": status == "COMPLETED",
-                        "job_id": job_id,
-                        "status": status,
-                        "message": f"Job completed successfully!"
-                        if status == "COMPLETED"
-                        else "Job failed",
-                    }
-
-                time.sleep(poll_interval)
-
+            future = self.job_tracker.track(job_id, max_interval=poll_interval)
+            return future.result(timeout=max_wait_seconds)
+        except FutureTimeoutError:
             logger.error(
                 f"Job {job_id} did not complete within {max_wait_seconds} seconds"
             )
@@ -309,6 +1142,30 @@ class DocumentIngester:
                 "message": f"Error waiting for job: {str(e)}",
             }
 
+    @property
+    def job_tracker(self) -> JobTracker:
+        """Background tracker for this namespace's ingest jobs, started on first use."""
+        if self._job_tracker is None:
+            with self._job_tracker_lock:
+                if self._job_tracker is None:
+                    self._job_tracker = JobTracker(
+                        self.client,
+                        on_completed=self._on_job_completed,
+                        on_failed=self._on_job_failed,
+                    )
+        return self._job_tracker
+
+    def _on_job_completed(self, job_id: str):
+        """Drop cached search results once new content is searchable."""
+        if self.retrieval_cache is not None:
+            logger.debug(f"Job {job_id} completed, invalidating retrieval cache")
+            self.retrieval_cache.invalidate_namespace(self.agentset_namespace_id)
+
+    def _on_job_failed(self, job_id: str):
+        """Forget a failed job's documents so the next ingest does not skip them."""
+        if self.manifest is not None and self.manifest.forget_job(job_id):
+            logger.info(f"Job {job_id} failed, removed it from the ingest manifest")
+
     @staticmethod
     def _get_content_type(file_path: str) -> str:
         """
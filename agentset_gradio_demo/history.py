@@ -0,0 +1,128 @@
+"""
+History - Server-side chat transcript with a bounded window
+Keeps the last turns of a session verbatim, compacts older ones into one
+short line each, and hands the model as much of the conversation as fits
+a token budget
+"""
+
+import logging
+import re
+
+from agentset_gradio_demo.context_builder import count_tokens
+from agentset_gradio_demo.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    """First sentence of text (or its first max_chars characters), on one line."""
+    text = " ".join(text.split())
+    text = _SENTENCE_END.split(text, maxsplit=1)[0]
+    return text if len(text) <= max_chars else text[: max_chars - 3].rstrip() + "..."
+
+
+class ChatHistory:
+    """
+    Transcript of one chat session, kept on the server.
+
+    The last max_turns turns are kept verbatim. Older turns are compacted
+    into one line each ("Q: ... A: ...", cut to their first sentence), and
+    only the newest max_summary_lines of those are kept. Retrieved sources
+    are stored for display only and never sent back to the model.
+
+    Args:
+        max_turns: Turns kept verbatim (and shown in the chat window)
+        token_budget: Tokens of earlier conversation sent with each question
+        max_summary_lines: Compacted turns kept beyond the window
+        summary_chars: Characters per compacted question and answer
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 10,
+        token_budget: int = 1000,
+        max_summary_lines: int = 20,
+        summary_chars: int = 160,
+    ):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_summary_lines = max_summary_lines
+        self.summary_chars = summary_chars
+        self.turns = []
+        self.summary = []
+        self.compacted = 0
+
+    def add(self, question: str, answer: str, footer: str = ""):
+        """
+        Record a finished turn, compacting the oldest ones beyond the window.
+
+        Args:
+            question: User's question
+            answer: Model's answer (what the model sees in later turns)
+            footer: Markdown shown under the answer only (e.g. sources)
+        """
+        self.turns.append({"question": question, "answer": answer, "footer": footer})
+        while len(self.turns) > self.max_turns:
+            turn = self.turns.pop(0)
+            self.summary.append(
+                f"Q: {_shorten(turn['question'], self.summary_chars)} "
+                f"A: {_shorten(turn['answer'], self.summary_chars)}"
+            )
+            self.compacted += 1
+            logger.debug(f"Compacted chat turn '{turn['question']}' ({self.compacted} so far)")
+            metrics.inc("history_compacted_total")
+        if len(self.summary) > self.max_summary_lines:
+            del self.summary[: len(self.summary) - self.max_summary_lines]
+
+    def clear(self):
+        """Forget the whole conversation."""
+        self.turns, self.summary, self.compacted = [], [], 0
+
+    def messages(self, model: str = "gpt-4o-mini") -> list:
+        """
+        Earlier conversation for the model, newest turns first until the token budget is spent.
+
+        Args:
+            model: Model whose tokenizer measures the budget
+
+        Returns:
+            Chat messages in order, starting with a system message holding the
+            compacted turns when any fit
+        """
+        budget = self.token_budget
+        recent = []
+        turns = [turn for turn in self.turns if turn["answer"]]  # Failed turns are only shown
+        for turn in reversed(turns):
+            cost = count_tokens(turn["question"], model) + count_tokens(turn["answer"], model)
+            if cost > budget:
+                break
+            budget -= cost
+            recent[:0] = [
+                {"role": "user", "content": turn["question"]},
+                {"role": "assistant", "content": turn["answer"]},
+            ]
+        lines = []
+        if len(recent) == 2 * len(turns):  # Older turns only after all recent ones fit
+            for line in reversed(self.summary):
+                cost = count_tokens(line, model)
+                if cost > budget:
+                    break
+                budget -= cost
+                lines.insert(0, line)
+        if lines:
+            summary = "Summary of earlier conversation:\n" + "\n".join(lines)
+            recent.insert(0, {"role": "system", "content": summary})
+        return recent
+
+    def display(self) -> list:
+        """Chatbot messages for the window: a note for compacted turns, then the kept turns."""
+        shown = []
+        if self.compacted:
+            turns = "turn" if self.compacted == 1 else "turns"
+            shown.append({"role": "assistant", "content": f"<sub>{self.compacted} earlier {turns} compacted</sub>"})
+        for turn in self.turns:
+            shown.append({"role": "user", "content": turn["question"]})
+            shown.append({"role": "assistant", "content": turn["answer"] + turn["footer"]})
+        return shown
@@ -0,0 +1,290 @@
+"""
+Job Tracker - Follows many Agentset ingest jobs from one background loop
+Polls with adaptive exponential backoff and jitter, batches status lookups
+through the list endpoint, and resolves futures/callbacks on completion
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable
+
+from agentset_gradio_demo.metrics import metrics
+
+if TYPE_CHECKING:
+    from agentset import Agentset
+
+logger = logging.getLogger(__name__)
+
+LOST_STATUS = "LOST"  # Given up on after repeated failed lookups (e.g. a deleted job)
+TERMINAL_STATUSES = {"COMPLETED", "FAILED", "CANCELLED", LOST_STATUS}
+
+
+class _TrackedJob:
+    """Polling state for one tracked job."""
+
+    def __init__(self, job_id: str, interval: float, max_interval: float):
+        self.job_id = job_id
+        self.status = "UNKNOWN"
+        self.interval = interval
+        self.max_interval = max_interval
+        self.next_poll = time.monotonic()
+        self.polls = 0
+        self.failed_polls = 0
+        self.started_at = time.time()
+        self.updated_at = None
+        self.future = Future()
+        self.callbacks = []
+
+
+class JobTracker:
+    """
+    Background service that tracks ingest jobs until they finish.
+
+    A single daemon thread polls every tracked job. Each job's polling
+    interval starts at min_interval and grows by backoff_factor (with
+    jitter) while its status is unchanged, up to max_interval. It drops
+    back to min_interval whenever the status moves. When batch_threshold
+    or more jobs are due at once, one list call replaces the per-job
+    lookups.
+
+    Args:
+        client: Agentset client for the namespace
+        min_interval: Seconds before the first status check and after a status change
+        max_interval: Upper bound for the polling interval in seconds
+        backoff_factor: Interval multiplier while a job's status is unchanged
+        jitter: Relative random jitter applied to every interval (0-1)
+        batch_threshold: Due jobs at which one list call replaces per-job lookups
+        on_completed: Called with the job ID whenever a job reaches COMPLETED
+        on_failed: Called with the job ID whenever a job ends FAILED, CANCELLED or LOST
+        max_failed_polls: Consecutive failed lookups after which a job is given up as LOST
+    """
+
+    def __init__(
+        self,
+        client: "Agentset",
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        backoff_factor: float = 2.0,
+        jitter: float = 0.2,
+        batch_threshold: int = 5,
+        on_completed: Callable[[str], None] = None,
+        on_failed: Callable[[str], None] = None,
+        max_failed_polls: int = 20,
+    ):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.batch_threshold = batch_threshold
+        self.on_completed = on_completed
+        self.on_failed = on_failed
+        self.max_failed_polls = max_failed_polls
+        self.api_calls = 0
+
+        self._jobs = {}
+        self._finished = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def track(
+        self,
+        job_id: str,
+        callback: Callable[[dict], None] = None,
+        max_interval: float = None,
+    ) -> Future:
+        """
+        Start tracking a job.
+
+        Args:
+            job_id: The job ID to follow
+            callback: Called with the final status dictionary when the job finishes
+            max_interval: Per-job cap on the polling interval (defaults to the tracker's)
+
+        Returns:
+            Future resolving to the final status dictionary
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            finished = self._finished.get(job_id) if job is None else None
+            if finished is None:
+                if job is None:
+                    job = _TrackedJob(
+                        job_id,
+                        self.min_interval,
+                        min(max_interval or self.max_interval, self.max_interval),
+                    )
+                    self._jobs[job_id] = job
+                    logger.info(f"Tracking ingest job {job_id}")
+                if callback:
+                    job.callbacks.append(callback)
+                self._ensure_thread()
+                self._cond.notify()
+                return job.future
+
+        # Finished jobs may still be resolving (running their hooks), so wait outside the lock
+        if callback:
+            finished.future.add_done_callback(lambda future: _run_callback(job_id, callback, future.result()))
+        return finished.future
+
+    def jobs(self) -> list:
+        """Return a snapshot of tracked and recently finished jobs, newest first."""
+        with self._cond:
+            entries = list(self._jobs.values()) + list(self._finished.values())
+        entries.sort(key=lambda job: job.started_at, reverse=True)
+        return [
+            {
+                "job_id": job.job_id,
+                "status": job.status,
+                "polls": job.polls,
+                "elapsed_seconds": (job.updated_at or time.time()) - job.started_at,
+            }
+            for job in entries
+        ]
+
+    def stop(self):
+        """Stop the polling thread; pending futures are left unresolved."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(
+                target=self._run, name="agentset-job-tracker", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._jobs:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [job for job in self._jobs.values() if job.next_poll <= now]
+                if not due:
+                    wait = min(job.next_poll for job in self._jobs.values()) - now
+                    self._cond.wait(timeout=max(wait, 0.01))
+                    continue
+
+            try:
+                statuses = self._fetch_statuses(due)
+            except Exception as e:
+                logger.error(f"Error polling ingest jobs: {str(e)}")
+                statuses = {}
+
+            with self._cond:
+                finished = [job for job in due if self._update(job, statuses.get(job.job_id))]
+            for job in finished:
+                self._resolve(job)
+
+    def _fetch_statuses(self, due: list) -> dict:
+        """Look up statuses for due jobs, batching through the list endpoint when worthwhile."""
+        statuses = {}
+        if len(due) >= self.batch_threshold:
+            wanted = {job.job_id for job in due}
+            self._count_call("list")
+            response = self.client.ingest_jobs.list(per_page=100)
+            # Page through the listing until every due job is found or the cursor runs out
+            while response is not None:
+                for listed in response.result.data:
+                    if listed.id in wanted:
+                        statuses[listed.id] = listed.status
+                if len(statuses) == len(wanted) or not response.result.pagination.has_more:
+                    break
+                self._count_call("list")
+                response = response.next()
+
+        for job in due:
+            if job.job_id in statuses:
+                continue
+            try:
+                self._count_call("get")
+                statuses[job.job_id] = self.client.ingest_jobs.get(job_id=job.job_id).data.status
+            except Exception as e:
+                logger.warning(f"Error checking status of job {job.job_id}: {str(e)}")
+        return statuses
+
+    def _count_call(self, kind: str):
+        """Count one status request ('list' or 'get')."""
+        with self._cond:
+            self.api_calls += 1
+        metrics.inc("job_status_requests_total", kind=kind)
+
+    def _update(self, job: _TrackedJob, status: str) -> bool:
+        """
+        Apply a fetched status to a job and reschedule it. Caller holds the lock.
+
+        Returns:
+            True if the job reached a terminal status and was moved to the finished set
+        """
+        job.polls += 1
+        if status is None:
+            job.failed_polls += 1
+            job.interval = min(job.interval * self.backoff_factor, job.max_interval)
+            if job.failed_polls >= self.max_failed_polls:
+                logger.warning(f"Giving up on job {job.job_id} after {job.failed_polls} failed status lookups")
+                job.status = LOST_STATUS
+                job.updated_at = time.time()
+        elif status != job.status:
+            logger.debug(f"Job {job.job_id} status: {status}")
+            job.status = status
+            job.updated_at = time.time()
+            job.interval = self.min_interval
+        else:
+            job.interval = min(job.interval * self.backoff_factor, job.max_interval)
+        if status is not None:
+            job.failed_polls = 0
+
+        if job.status in TERMINAL_STATUSES:
+            logger.info(f"Job {job.job_id} finished with status: {job.status}")
+            del self._jobs[job.job_id]
+            self._finished[job.job_id] = job
+            # Keep a bounded history of finished jobs for jobs()/late track() calls
+            while len(self._finished) > 200:
+                self._finished.pop(next(iter(self._finished)))
+            return True
+
+        spread = job.interval * self.jitter
+        job.next_poll = time.monotonic() + job.interval + random.uniform(-spread, spread)
+        return False
+
+    def _resolve(self, job: _TrackedJob):
+        """Run completion hooks and resolve a finished job's future and callbacks."""
+        metrics.observe("job_wait_seconds", time.time() - job.started_at, status=job.status)
+        result = {
+            "success": job.status == "COMPLETED",
+            "job_id": job.job_id,
+            "status": job.status,
+            "message": "Job completed successfully!"
+            if job.status == "COMPLETED"
+            else "Job status could not be read"
+            if job.status == LOST_STATUS
+            else f"Job {job.status.lower()}",
+        }
+        hook = self.on_completed if job.status == "COMPLETED" else self.on_failed
+        if hook:
+            try:
+                hook(job.job_id)
+            except Exception as e:
+                logger.error(f"Error in job completion hook: {str(e)}")
+        job.future.set_result(result)
+        for callback in job.callbacks:
+            _run_callback(job.job_id, callback, result)
+
+
+def _run_callback(job_id: str, callback: Callable[[dict], None], result: dict):
+    """Call a job callback, logging instead of raising its errors."""
+    try:
+        callback(result)
+    except Exception as e:
+        logger.error(f"Error in job callback for {job_id}: {str(e)}")
@@ -0,0 +1,226 @@
+"""
+Manifest - Local record of what was ingested into each namespace
+Maps a content fingerprint per namespace and source to the ingest job that
+holds it, so unchanged documents are skipped and changed ones replaced
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # Bytes read from disk per hashing step
+
+
+def hash_file(file_path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Streamed SHA-256 of a file's contents (memory use does not grow with file size)."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 of text content encoded as UTF-8."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_metadata(metadata: dict = None) -> str:
+    """Stable hash of ingest metadata, so changing it also counts as a change."""
+    if not metadata:
+        return ""
+    payload = json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def url_fingerprint(url: str, timeout: float = 10) -> str:
+    """
+    Fingerprint a remote document from its HTTP validators without downloading it.
+
+    Args:
+        url: Document URL
+        timeout: Seconds to wait for the HEAD request
+
+    Returns:
+        "etag:..." or "last-modified:...:<length>", or None when the server
+        sends neither header (or cannot be reached) and the URL cannot be
+        compared with an earlier ingest
+    """
+    import requests
+
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {url}: {str(e)}")
+        return None
+    if not response.ok:
+        return None
+
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return f"etag:{etag}"
+    last_modified = response.headers.get("Last-Modified")
+    if last_modified:
+        return f"last-modified:{last_modified}:{response.headers.get('Content-Length', '')}"
+    return None
+
+
+class IngestManifest:
+    """
+    SQLite manifest of ingested documents.
+
+    Each row maps (namespace, source) to the content hash, metadata hash and
+    ingest job of the last ingest of that source (the comma-separated jobs of
+    its parts for a preprocessed file). Sources are absolute paths
+    for local files, URLs, and a name (or "text:<hash>") for text. Local files
+    also keep their size and mtime, so an unchanged file is recognized
+    without reading it again.
+
+    The counters behind report() cover what this process skipped, replaced
+    and newly ingested since it started.
+
+    Args:
+        path: SQLite database file (":memory:" keeps the manifest in memory)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_manifest ("
+                "namespace TEXT, source TEXT, content_hash TEXT, metadata_hash TEXT, "
+                "job_id TEXT, size INTEGER, mtime_ns INTEGER, ingested_at REAL, "
+                "PRIMARY KEY (namespace, source))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ingest_manifest_content "
+                "ON ingest_manifest (namespace, content_hash)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ingest_manifest_job ON ingest_manifest (job_id)"
+            )
+        self._counts = {"new": 0, "replaced": 0, "skipped": 0}
+        self._bytes = {"ingested": 0, "saved": 0}
+
+    def lookup(self, namespace: str, source: str) -> dict:
+        """Return the manifest entry for a source, or None if it was never ingested."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, content_hash, metadata_hash, job_id, size, mtime_ns, ingested_at "
+                "FROM ingest_manifest WHERE namespace = ? AND source = ?",
+                (namespace, source),
+            ).fetchone()
+        return self._entry(row)
+
+    def find_content(self, namespace: str, content_hash: str, metadata_hash: str) -> dict:
+        """Return any entry in the namespace holding identical content and metadata."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, content_hash, metadata_hash, job_id, size, mtime_ns, ingested_at "
+                "FROM ingest_manifest WHERE namespace = ? AND content_hash = ? AND metadata_hash = ? "
+                "LIMIT 1",
+                (namespace, content_hash, metadata_hash),
+            ).fetchone()
+        return self._entry(row)
+
+    def file_hash(self, namespace: str, source: str, size: int, mtime_ns: int) -> str:
+        """
+        Content hash of a local file, reusing the recorded one while size and mtime match.
+
+        Args:
+            namespace: Namespace ID
+            source: Absolute file path
+            size: Current file size in bytes
+            mtime_ns: Current modification time in nanoseconds
+
+        Returns:
+            SHA-256 hex digest of the file
+        """
+        entry = self.lookup(namespace, source)
+        if entry and entry["content_hash"] and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+            return entry["content_hash"]
+        return hash_file(source)
+
+    def record(
+        self,
+        namespace: str,
+        source: str,
+        content_hash: str,
+        metadata_hash: str,
+        job_id: str,
+        size: int = None,
+        mtime_ns: int = None,
+    ):
+        """Record the ingest job holding a source's content, replacing any earlier entry."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingest_manifest VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (namespace, source, content_hash, metadata_hash, job_id, size, mtime_ns, time.time()),
+            )
+
+    def count(self, outcome: str, size: int = None):
+        """Count an ingest outcome ("new", "replaced" or "skipped") for report()."""
+        with self._lock:
+            self._counts[outcome] += 1
+            self._bytes["saved" if outcome == "skipped" else "ingested"] += size or 0
+
+    def references(self, job_id: str) -> int:
+        """Number of sources whose content is held by a job."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM ingest_manifest WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+
+    def forget(self, namespace: str, source: str):
+        """Drop a source so its next ingest is treated as new."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM ingest_manifest WHERE namespace = ? AND source = ?", (namespace, source)
+            )
+
+    def forget_job(self, job_id: str) -> int:
+        """Drop the entries of a job that failed, so its documents are ingested again."""
+        with self._lock, self._conn:
+            # Entries of preprocessed files hold the comma-separated jobs of their parts
+            cursor = self._conn.execute(
+                "DELETE FROM ingest_manifest WHERE instr(',' || job_id || ',', ?) > 0",
+                (f",{job_id},",),
+            )
+            return cursor.rowcount
+
+    def entries(self, namespace: str, prefix: str = "") -> list:
+        """Every manifest entry of a namespace (optionally only sources starting with prefix), oldest first."""
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, content_hash, metadata_hash, job_id, size, mtime_ns, ingested_at "
+                "FROM ingest_manifest WHERE namespace = ? AND source LIKE ? ESCAPE '\\' "
+                "ORDER BY ingested_at",
+                (namespace, pattern),
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def report(self) -> dict:
+        """Documents and bytes skipped, replaced and ingested by this process."""
+        with self._lock:
+            return {
+                **self._counts,
+                "jobs_saved": self._counts["skipped"],
+                "bytes_saved": self._bytes["saved"],
+                "bytes_ingested": self._bytes["ingested"],
+            }
+
+    @staticmethod
+    def _entry(row) -> dict:
+        if row is None:
+            return None
+        keys = ("source", "content_hash", "metadata_hash", "job_id", "size", "mtime_ns", "ingested_at")
+        return dict(zip(keys, row))
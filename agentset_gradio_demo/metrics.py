@@ -0,0 +1,366 @@
+"""
+Metrics - Lightweight latency histograms and counters for the hot paths
+Rendered in the Prometheus text exposition format for the /metrics endpoint
+"""
+
+import atexit
+import functools
+import glob
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+from agentset_gradio_demo import config
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "agentset_demo_"
+
+# Latency buckets in seconds, from fast cache hits to slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Size buckets for character and token counts
+SIZE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of histograms and counters.
+
+    Args:
+        enabled: When False every recording call returns immediately
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+        self._export_path = None
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+        """Record a value into a histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(_label_key(labels))
+            if histogram is None:
+                histogram = series[_label_key(labels)] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Increment a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def timed(self, name: str, **labels):
+        """Context manager recording the duration of a block (and errors raised in it)."""
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, name, labels)
+
+    def describe(self, name: str, help_text: str):
+        """Attach HELP text to a metric."""
+        self._help[name] = help_text
+
+    def register_collector(self, collector: Callable[[], dict]):
+        """
+        Register a callable polled at render time for gauge values.
+
+        The callable returns {metric_name: value} or
+        {metric_name: [(labels_dict, value), ...]}.
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        """Return a JSON-serializable copy of every histogram and counter."""
+        with self._lock:
+            return {
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            "buckets": list(h.buckets),
+                            "counts": list(h.counts),
+                            "sum": h.total,
+                            "count": h.count,
+                        }
+                        for key, h in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+            }
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        return render_snapshot(self.snapshot(), self._help, self._collect_gauges())
+
+    def export_snapshots(self, directory: str, interval: float = 5.0) -> str:
+        """
+        Periodically write this process's snapshot into a directory shared by
+        several worker processes, so any of them can render the combined totals.
+
+        Args:
+            directory: Directory holding one snapshot file per worker
+            interval: Seconds between writes
+
+        Returns:
+            Path of this process's snapshot file
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"worker-{os.getpid()}.json")
+
+        def write():
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    write()
+                except Exception as e:
+                    logger.warning(f"Error exporting metrics snapshot: {str(e)}")
+
+        def remove():
+            if os.path.exists(path):
+                os.remove(path)
+
+        write()
+        threading.Thread(target=loop, name="metrics-export", daemon=True).start()
+        atexit.register(remove)
+        self._export_path = path
+        return path
+
+    def render_aggregated(self, directory: str) -> str:
+        """Render the sum of this process's metrics and every other worker's exported snapshot."""
+        snapshots = [self.snapshot()]
+        for path in glob.glob(os.path.join(directory, "worker-*.json")):
+            if path == self._export_path:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable metrics snapshot {path}: {str(e)}")
+        return render_snapshot(merge_snapshots(snapshots), self._help, self._collect_gauges())
+
+    def _collect_gauges(self) -> dict:
+        gauges = {}
+        for collector in self._collectors:
+            try:
+                for name, value in collector().items():
+                    series = value if isinstance(value, list) else [({}, value)]
+                    gauges.setdefault(name, []).extend(series)
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {str(e)}")
+        return gauges
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def merge_snapshots(snapshots: list) -> dict:
+    """Sum several registry snapshots (e.g. one per worker process) series by series."""
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, series in snapshot["histograms"].items():
+            merged = histograms.setdefault(name, {})
+            for entry in series:
+                key = _label_key(entry["labels"])
+                target = merged.get(key)
+                if target is None:
+                    merged[key] = {**entry, "counts": list(entry["counts"])}
+                    continue
+                if target["buckets"] != entry["buckets"]:
+                    continue
+                target["counts"] = [a + b for a, b in zip(target["counts"], entry["counts"])]
+                target["sum"] += entry["sum"]
+                target["count"] += entry["count"]
+        for name, series in snapshot["counters"].items():
+            merged = counters.setdefault(name, {})
+            for entry in series:
+                key = _label_key(entry["labels"])
+                merged[key] = merged.get(key, 0) + entry["value"]
+    return {
+        "histograms": {name: list(series.values()) for name, series in histograms.items()},
+        "counters": {
+            name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+            for name, series in counters.items()
+        },
+    }
+
+
+def render_snapshot(snapshot: dict, help_texts: dict = None, gauges: dict = None) -> str:
+    """Render a registry snapshot (plus optional gauges) as Prometheus text."""
+    help_texts = help_texts or {}
+    lines = []
+
+    def header(name, kind):
+        if name in help_texts:
+            lines.append(f"# HELP {PREFIX}{name} {help_texts[name]}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for name, series in sorted(snapshot["histograms"].items()):
+        header(name, "histogram")
+        for entry in series:
+            key = _label_key(entry["labels"])
+            cumulative = 0
+            for bound, count in zip(entry["buckets"], entry["counts"]):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, {'le': '+Inf'})} {entry['count']}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {entry['sum']}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {entry['count']}")
+
+    for name, series in sorted(snapshot["counters"].items()):
+        header(name, "counter")
+        for entry in series:
+            lines.append(f"{PREFIX}{name}{_format_labels(_label_key(entry['labels']))} {entry['value']}")
+
+    for name, series in sorted((gauges or {}).items()):
+        header(name, "gauge")
+        for labels, value in series:
+            lines.append(f"{PREFIX}{name}{_format_labels(_label_key(labels))} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry: MetricsRegistry, name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(f"{self.name}_seconds", time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            self.registry.inc("errors_total", operation=self.name, **self.labels)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+# Process-wide registry
+metrics = MetricsRegistry(enabled=config.METRICS_ENABLED)
+
+metrics.describe("retrieve_seconds", "Time spent retrieving and budgeting context chunks")
+metrics.describe("search_seconds", "Time per Agentset search, by branch (original query or expanded sub-query)")
+metrics.describe("generate_response_seconds", "Time spent generating an answer with OpenAI")
+metrics.describe("query_seconds", "End-to-end RAG query time")
+metrics.describe("time_to_first_token_seconds", "Time from query start to the first streamed token")
+metrics.describe("ingest_stage_seconds", "Time spent per ingestion stage (hash, preprocess, presign, put, job_create)")
+metrics.describe("preprocess_bytes_total", "File bytes read (in) and text characters produced (out) by local preprocessing")
+metrics.describe("ingest_dedup_total", "Documents checked against the ingest manifest, by outcome (new, replaced, skipped)")
+metrics.describe("ingest_bytes_saved_total", "Bytes not uploaded because unchanged content was skipped")
+metrics.describe("job_wait_seconds", "Time from tracking an ingest job until it finished")
+metrics.describe("job_status_requests_total", "Ingest job status lookups, by kind (get or list)")
+metrics.describe("prefetch_total", "Speculative retrieval prefetches, by outcome")
+metrics.describe("context_chars", "Characters of retrieved context per query")
+metrics.describe("context_tokens", "Tokens of retrieved context per query, after budgeting")
+metrics.describe("tokens_total", "OpenAI tokens used, by kind")
+metrics.describe("errors_total", "Errors raised, by operation")
+metrics.describe("coalesced_total", "Requests served by an identical call already in flight, by operation (search, generate)")
+metrics.describe("retries_total", "API calls retried after a transient failure, by endpoint and reason")
+metrics.describe("hedges_total", "Duplicate requests sent because the first was slow, by endpoint")
+metrics.describe("hedge_wins_total", "Hedged requests where the duplicate answered first, by endpoint")
+metrics.describe("circuit_open_total", "Times an endpoint's circuit breaker opened")
+metrics.describe("circuit_rejections_total", "Calls failed fast because the endpoint's circuit was open")
+metrics.describe("model_routes_total", "Model routing decisions, by model, tier and reason (signals, slo_fallback, probe)")
+metrics.describe("model_latency_seconds", "Model latency, by model and kind (answer, or first_token when streamed)")
+metrics.describe("history_compacted_total", "Chat turns compacted out of a session's history window")
+metrics.describe("replica_total", "Retrievals answered by the local replica, by outcome (served, fallback, miss)")
+
+
+def instrument(name: str):
+    """
+    Decorator timing a function as '<name>_seconds' and counting its errors.
+
+    Works for plain and async functions.
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not metrics.enabled:
+                    return await func(*args, **kwargs)
+                with metrics.timed(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with metrics.timed(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,152 @@
+"""
+Multi Query - Query expansion and result fusion for fan-out retrieval
+Splits compound questions into sub-queries and merges the ranked hit lists
+of several searches with reciprocal-rank fusion
+"""
+
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Rank offset from the original RRF paper; dampens the weight of top ranks
+RRF_K = 60
+
+EXPANSION_PROMPT = """Rewrite the user's question into at most {max_queries} short, self-contained search queries.
+Split compound questions into their parts and keep the original wording where possible.
+Return one query per line with no numbering or extra text."""
+
+# Question marks and semicolons end independent questions
+_SENTENCE_PATTERN = re.compile(r"\?\s+|;\s*")
+# Conjunctions that may join two questions; a split is only kept when both sides are clauses
+_CONJUNCTION_PATTERN = re.compile(
+    r"\s+(?:and also|as well as|and|versus|vs\.?|compared to|or)\s+", re.IGNORECASE
+)
+# Words a self-contained question or request starts with
+_CLAUSE_STARTS = frozenset(
+    "what who whom whose where when why how which is are was were do does did can could "
+    "should would will has have list explain describe".split()
+)
+_MIN_PART_WORDS = 2
+
+
+def _is_clause(part: str) -> bool:
+    words = part.lower().split()
+    return len(words) >= _MIN_PART_WORDS and words[0] in _CLAUSE_STARTS
+
+
+def _split_sentence(sentence: str) -> list:
+    """Parts of one sentence joined by conjunctions, or [] unless every part is a full clause."""
+    parts = [p.strip(" ,.?!") for p in _CONJUNCTION_PATTERN.split(sentence)]
+    if len(parts) > 1 and all(_is_clause(p) for p in parts):
+        return parts
+    return []
+
+
+def expand_query(query: str, max_queries: int = 4) -> list:
+    """
+    Expand a question into sub-queries with simple rules.
+
+    The original question always comes first. Questions separated by question
+    marks or semicolons follow, provided they have at least two words. A
+    conjunction ("and", "vs", "compared to", ...) only splits a sentence when
+    every side is a clause of its own ("what is X and how does Y work"), so
+    phrases such as "pros and cons" or "black and white" stay whole. When a
+    split is unsure, only the original question is searched.
+
+    Args:
+        query: The user's question
+        max_queries: Maximum number of queries returned, including the original
+
+    Returns:
+        List of distinct queries, original first
+    """
+    queries = [query.strip()]
+    sentences = [s.strip(" ,.?!") for s in _SENTENCE_PATTERN.split(query)]
+    sentences = [s for s in sentences if len(s.split()) >= _MIN_PART_WORDS]
+    for sentence in sentences:
+        parts = _split_sentence(sentence)
+        if parts:
+            queries.extend(parts)
+        elif len(sentences) > 1:
+            queries.append(sentence)
+    return _dedupe(queries)[:max_queries]
+
+
+def parse_expansion(query: str, text: str, max_queries: int = 4) -> list:
+    """
+    Parse a model's expansion output (one query per line) into a query list.
+
+    Args:
+        query: The original question, kept as the first query
+        text: Model output
+        max_queries: Maximum number of queries returned, including the original
+
+    Returns:
+        List of distinct queries, original first
+    """
+    lines = [re.sub(r"^\s*(?:[-*]|\d+[.)])\s*", "", line).strip() for line in text.splitlines()]
+    return _dedupe([query.strip()] + [line for line in lines if line])[:max_queries]
+
+
+def expansion_messages(query: str, max_queries: int = 4) -> list:
+    """Build the chat messages asking a model to expand a question into sub-queries."""
+    return [
+        {"role": "system", "content": EXPANSION_PROMPT.format(max_queries=max_queries)},
+        {"role": "user", "content": query},
+    ]
+
+
+def _dedupe(queries: list) -> list:
+    seen, unique = set(), []
+    for q in queries:
+        key = " ".join(q.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(q)
+    return unique
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(result_lists: list, k: int = RRF_K) -> list:
+    """
+    Merge several ranked hit lists with reciprocal-rank fusion.
+
+    Each hit contributes 1 / (k + rank) to its fused score. Hits are matched
+    by ID and by normalized text, so the same chunk returned by several
+    sub-queries (or namespaces) is counted once with the summed score.
+
+    Args:
+        result_lists: Hit lists (dictionaries with 'id', 'text', 'score', 'metadata'),
+            each in the order returned by its search
+        k: RRF rank offset
+
+    Returns:
+        Fused hits, highest fused score first. 'score' keeps the best score any
+        search gave the hit and 'rrf_score' holds the fused score, which is only
+        meant for ordering.
+    """
+    fused, aliases = {}, {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            text_key = _text_key(hit.get("text") or "")
+            key = aliases.get(hit.get("id")) or aliases.get(text_key) or hit.get("id") or text_key
+            aliases[hit.get("id")] = aliases[text_key] = key
+
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {**hit, "score": hit.get("score") or 0.0, "rrf_score": 0.0}
+            else:
+                entry["score"] = max(entry["score"], hit.get("score") or 0.0)
+            entry["rrf_score"] += 1.0 / (k + rank)
+
+    merged = sorted(fused.values(), key=lambda h: h["rrf_score"], reverse=True)
+    logger.debug(
+        f"Fused {sum(len(h) for h in result_lists)} hits from {len(result_lists)} searches "
+        f"into {len(merged)}"
+    )
+    return merged
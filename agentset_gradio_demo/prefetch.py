@@ -0,0 +1,181 @@
+"""
+Prefetch - Speculative retrieval while the user is still typing
+Starts a debounced search for the partial chat message and hands the result
+to the chat handler when the submitted question matches or extends it
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from agentset_gradio_demo.cache import normalize_query
+from agentset_gradio_demo.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Prefetch:
+    """A scheduled or finished prefetch for one session."""
+
+    __slots__ = ("query", "params", "task", "started", "created_at")
+
+    def __init__(self, query: str, params: tuple):
+        self.query = query
+        self.params = params
+        self.task = None
+        self.started = False
+        self.created_at = time.monotonic()
+
+
+class PrefetchManager:
+    """
+    Per-session speculative retrieval.
+
+    Each input change replaces (and cancels) the session's previous prefetch.
+    A prefetch waits `debounce` seconds before searching, so only pauses in
+    typing reach Agentset. At most max_inflight searches run at once across
+    all sessions; prefetches beyond that are skipped rather than queued.
+
+    Args:
+        debounce: Seconds of typing inactivity before a prefetch searches
+        max_inflight: Maximum concurrent prefetch searches
+        min_chars: Shortest partial message worth prefetching
+        ttl: Seconds a finished prefetch stays usable
+        min_coverage: Share (0-1) of the submitted question's words the
+            prefetched text must cover when the question extends it
+        max_sessions: Sessions tracked before the oldest are dropped
+    """
+
+    def __init__(
+        self,
+        debounce: float = 0.4,
+        max_inflight: int = 4,
+        min_chars: int = 10,
+        ttl: float = 60.0,
+        min_coverage: float = 0.75,
+        max_sessions: int = 1024,
+    ):
+        self.debounce = debounce
+        self.max_inflight = max_inflight
+        self.min_chars = min_chars
+        self.ttl = ttl
+        self.min_coverage = min_coverage
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._inflight = 0
+
+    def schedule(
+        self, session_id: str, query: str, params: tuple, fetch: Callable[[str], Awaitable]
+    ) -> bool:
+        """
+        Schedule a debounced prefetch for a session's partial message.
+
+        Must be called from the event loop that later calls take().
+
+        Args:
+            session_id: Identifies the chat session
+            query: The partial message
+            params: Retrieval settings the result is only valid for
+            fetch: Coroutine function running the retrieval for a query
+
+        Returns:
+            True if a new prefetch was scheduled
+        """
+        query = query.strip()
+        if len(query) < self.min_chars:
+            return False
+
+        previous = self._entries.get(session_id)
+        if previous is not None:
+            if (
+                normalize_query(previous.query) == normalize_query(query)
+                and previous.params == params
+                and not self._expired(previous)
+            ):
+                return False
+            self._cancel(previous)
+
+        entry = _Prefetch(query, params)
+        entry.task = asyncio.ensure_future(self._run(entry, fetch))
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._cancel(self._entries.popitem(last=False)[1])
+        return True
+
+    async def take(self, session_id: str, query: str, params: tuple):
+        """
+        Claim the session's prefetched result for a submitted question.
+
+        A running prefetch is awaited; one still in its debounce delay is
+        cancelled since searching now is faster than waiting for it.
+
+        Args:
+            session_id: Identifies the chat session
+            query: The submitted question
+            params: Retrieval settings of the request
+
+        Returns:
+            The prefetched result, or None when there is nothing reusable
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+
+        if (
+            entry.params != params
+            or self._expired(entry)
+            or not self._covers(entry.query, query)
+            or not entry.started
+        ):
+            self._cancel(entry)
+            metrics.inc("prefetch_total", outcome="miss")
+            return None
+
+        result = await entry.task
+        if result is None:
+            metrics.inc("prefetch_total", outcome="miss")
+            return None
+        logger.info(f"Reusing prefetched retrieval for '{entry.query}'")
+        metrics.inc("prefetch_total", outcome="hit")
+        return result
+
+    async def _run(self, entry: _Prefetch, fetch: Callable[[str], Awaitable]):
+        await asyncio.sleep(self.debounce)
+        if self._inflight >= self.max_inflight:
+            metrics.inc("prefetch_total", outcome="skipped")
+            return None
+
+        entry.started = True
+        entry.created_at = time.monotonic()
+        self._inflight += 1
+        metrics.inc("prefetch_total", outcome="started")
+        try:
+            return await fetch(entry.query)
+        except Exception as e:
+            logger.warning(f"Prefetch for '{entry.query}' failed: {str(e)}")
+            return None
+        finally:
+            self._inflight -= 1
+
+    def _covers(self, prefetched: str, query: str) -> bool:
+        """True if the submitted query equals the prefetched one or extends it closely enough."""
+        prefetched, query = normalize_query(prefetched), normalize_query(query)
+        if prefetched == query:
+            return True
+        # Must end at a word boundary: "capital of fra" does not cover "capital of france"
+        if not query.startswith(prefetched + " "):
+            return False
+        # The search may have run while the last word was still being typed, so it does not count
+        complete_words = len(prefetched.split()) - 1
+        return complete_words / len(query.split()) >= self.min_coverage
+
+    def _expired(self, entry: _Prefetch) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def _cancel(self, entry: _Prefetch):
+        if entry.task is not None and not entry.task.done():
+            entry.task.cancel()
+            metrics.inc("prefetch_total", outcome="cancelled")
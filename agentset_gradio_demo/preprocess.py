@@ -0,0 +1,254 @@
+"""
+Preprocess - Local text extraction and chunking before ingestion
+Turns txt/md/html/csv/json files into normalized, boilerplate-free text
+split into size-bounded parts that are ingested as TEXT jobs
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from html.parser import HTMLParser
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024  # Bytes of HTML fed to the parser at a time
+BOILERPLATE_MIN_REPEATS = 3  # Times a short line must repeat to count as boilerplate
+BOILERPLATE_MAX_CHARS = 100  # Longer lines are never treated as boilerplate
+
+_PLAIN = {".txt", ".text", ".log", ".rst"}
+_MARKDOWN = {".md", ".markdown"}
+_HTML = {".html", ".htm", ".xhtml"}
+_CSV = {".csv": ",", ".tsv": "\t"}
+_JSON = {".json"}
+_JSON_LINES = {".jsonl", ".ndjson"}
+SUPPORTED_EXTENSIONS = _PLAIN | _MARKDOWN | _HTML | set(_CSV) | _JSON | _JSON_LINES
+
+_CONTROL = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+_MD_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_MD_COMMENT = re.compile(r"<!--.*?-->")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def supports(file_path: str) -> bool:
+    """True if the file's extension has a local text extractor."""
+    return os.path.splitext(file_path)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def normalize(line: str) -> str:
+    """NFKC-normalize a line, drop control characters and collapse runs of spaces."""
+    # The str methods run in C; the regex and NFKC only run for lines that need them
+    if not line.isascii():
+        line = unicodedata.normalize("NFKC", line)
+    line = " ".join(line.split())
+    return line if line.isprintable() else _CONTROL.sub("", line)
+
+
+class _HTMLText(HTMLParser):
+    """Collects the visible text of an HTML page as blocks, leaving out page chrome."""
+
+    SKIP = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe"}
+    BLOCK = {
+        "p", "div", "br", "li", "tr", "section", "article", "main", "table", "pre",
+        "blockquote", "h1", "h2", "h3", "h4", "h5", "h6", "dt", "dd", "hr",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCK:
+            self.flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK:
+            self.flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def flush(self):
+        if self._parts:
+            self.blocks.append("".join(self._parts))
+            self._parts = []
+
+
+def _plain_lines(file_path: str, markdown: bool = False) -> Iterator[str]:
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if markdown:
+                line = _MD_COMMENT.sub("", _MD_LINK.sub(r"\1", _MD_IMAGE.sub(r"\1", line)))
+            yield line
+
+
+def _html_lines(file_path: str) -> Iterator[str]:
+    parser = _HTMLText()
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        while data := f.read(READ_CHUNK_SIZE):
+            parser.feed(data)
+            yield from _drain(parser)
+    parser.close()
+    parser.flush()
+    yield from _drain(parser)
+
+
+def _drain(parser: _HTMLText) -> Iterator[str]:
+    blocks, parser.blocks = parser.blocks, []
+    for block in blocks:
+        yield from block.splitlines()
+        yield ""  # Blocks are paragraphs
+
+
+def _csv_lines(file_path: str, delimiter: str) -> Iterator[str]:
+    with open(file_path, encoding="utf-8", errors="replace", newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        for row in reader:
+            fields = [f"{name}: {value}" for name, value in zip(header, row) if value.strip()]
+            if fields:
+                yield "; ".join(fields)
+                yield ""  # One paragraph per row
+
+
+def _flatten(value, prefix: str = "") -> Iterator[str]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for item in value:
+            yield from _flatten(item, prefix)
+    elif value is not None and value != "":
+        yield f"{prefix}: {value}" if prefix else str(value)
+
+
+def _json_lines(file_path: str, lines: bool) -> Iterator[str]:
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        records = (json.loads(line) for line in f if line.strip()) if lines else [json.load(f)]
+        for record in records:
+            yield from _flatten(record)
+            yield ""  # One paragraph per record
+
+
+def extract_lines(file_path: str) -> Iterator[str]:
+    """
+    Stream the text lines of a supported file; empty lines separate paragraphs.
+
+    txt/md/html/csv/jsonl are read incrementally. A .json file is one
+    document and is parsed as a whole.
+
+    Raises:
+        ValueError: If the extension is not supported
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in _PLAIN or extension in _MARKDOWN:
+        return _plain_lines(file_path, markdown=extension in _MARKDOWN)
+    if extension in _HTML:
+        return _html_lines(file_path)
+    if extension in _CSV:
+        return _csv_lines(file_path, _CSV[extension])
+    if extension in _JSON or extension in _JSON_LINES:
+        return _json_lines(file_path, lines=extension in _JSON_LINES)
+    raise ValueError(f"No text extractor for {extension or 'files without extension'}")
+
+
+def paragraphs(lines: Iterable[str], strip_boilerplate: bool = True) -> list:
+    """
+    Normalize lines and join them into paragraphs.
+
+    With strip_boilerplate, short lines repeated BOILERPLATE_MIN_REPEATS or
+    more times (running headers, footers, cookie notices) are removed.
+    """
+    lines = [normalize(line) for line in lines]
+    repeated = set()
+    if strip_boilerplate:
+        counts = Counter(line for line in lines if line and len(line) <= BOILERPLATE_MAX_CHARS)
+        repeated = {line for line, count in counts.items() if count >= BOILERPLATE_MIN_REPEATS}
+
+    result, current = [], []
+    for line in lines:
+        if not line:
+            if current:
+                result.append(" ".join(current))
+                current = []
+        elif line not in repeated:
+            current.append(line)
+    if current:
+        result.append(" ".join(current))
+    return result
+
+
+def _split_long(paragraph: str, max_chars: int) -> Iterator[str]:
+    """Split a paragraph longer than max_chars at sentence ends, then at spaces."""
+    piece = ""
+    for sentence in _SENTENCE_END.split(paragraph):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if piece:
+                yield piece
+                piece = ""
+            yield sentence[:cut]
+            sentence = sentence[cut:].lstrip()
+        if piece and len(piece) + 1 + len(sentence) > max_chars:
+            yield piece
+            piece = ""
+        piece = f"{piece} {sentence}" if piece else sentence
+    if piece:
+        yield piece
+
+
+def chunk_paragraphs(items: Iterable[str], max_chars: int) -> list:
+    """Pack paragraphs into parts of at most max_chars characters, splitting only oversized ones."""
+    parts, current, size = [], [], 0
+    for paragraph in items:
+        for piece in _split_long(paragraph, max_chars) if len(paragraph) > max_chars else (paragraph,):
+            added = len(piece) + (2 if current else 0)
+            if current and size + added > max_chars:
+                parts.append("\n\n".join(current))
+                current, size, added = [], 0, len(piece)
+            current.append(piece)
+            size += added
+    if current:
+        parts.append("\n\n".join(current))
+    return parts
+
+
+def preprocess_file(file_path: str, max_chars: int = 32000, strip_boilerplate: bool = True) -> dict:
+    """
+    Extract, clean and chunk one file. Runs in preprocessing worker processes.
+
+    Args:
+        file_path: Path to a supported file
+        max_chars: Upper bound for the characters of every part
+        strip_boilerplate: Remove repeated short lines (not applied to csv/json)
+
+    Returns:
+        Dictionary with 'parts' (list of strings), 'bytes_in', 'chars_out'
+        and 'seconds' (time spent in the worker)
+    """
+    start = time.perf_counter()
+    structured = os.path.splitext(file_path)[1].lower() in set(_CSV) | _JSON | _JSON_LINES
+    items = paragraphs(extract_lines(file_path), strip_boilerplate and not structured)
+    parts = chunk_paragraphs(items, max_chars)
+    return {
+        "parts": parts,
+        "bytes_in": os.stat(file_path).st_size,
+        "chars_out": sum(len(part) for part in parts),
+        "seconds": time.perf_counter() - start,
+    }
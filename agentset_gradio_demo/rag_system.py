@@ -3,14 +3,388 @@ RAG System - Retrieval Augmented Generation using Agentset and OpenAI
 Simple class to handle document retrieval and AI-powered responses
 """
 
+import asyncio
+import json
 import logging
-from agentset import Agentset
-from openai import OpenAI as OpenAIClient
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterator
+
+from agentset_gradio_demo.cache import ResponseCache, RetrievalCache, normalize_query
+from agentset_gradio_demo.coalesce import AsyncSingleFlight, SingleFlight
+from agentset_gradio_demo.context_builder import build_context, format_context
+from agentset_gradio_demo.metrics import SIZE_BUCKETS, instrument, metrics
+from agentset_gradio_demo.multi_query import (
+    expand_query,
+    expansion_messages,
+    parse_expansion,
+    reciprocal_rank_fusion,
+)
+from agentset_gradio_demo.resilience import Resilience
+from agentset_gradio_demo.router import AUTO_MODEL, ModelRouter
+
+if TYPE_CHECKING:  # The SDKs are imported on first use to keep startup fast
+    from agentset import Agentset
+    from openai import AsyncOpenAI as AsyncOpenAIClient
+    from openai import OpenAI as OpenAIClient
+
+    from agentset_gradio_demo.replica import ReplicaStore
 
 logger = logging.getLogger(__name__)
 
 
-class RAGSystem:
+def _new_agentset_client(namespace_id: str, api_token: str) -> "Agentset":
+    from agentset import Agentset
+
+    return Agentset(namespace_id=namespace_id, token=api_token)
+
+
+def _search_hits(results) -> list:
+    """Convert Agentset search results into plain (cacheable) hit dictionaries."""
+    return [
+        {"id": r.id, "text": r.text, "score": r.score, "metadata": r.metadata or {}}
+        for r in results.data
+        if r.text
+    ]
+
+
+def _select_chunks(hits: list, model: str, token_budget: int) -> list:
+    """Build the budgeted context chunks for a set of hits and record their size."""
+    chunks = build_context(hits, model=model, token_budget=token_budget)
+    metrics.observe("context_chars", sum(len(c.text) for c in chunks), buckets=SIZE_BUCKETS)
+    metrics.observe("context_tokens", sum(c.tokens for c in chunks), buckets=SIZE_BUCKETS)
+    return chunks
+
+
+def _branches(queries: list, namespaces: list) -> list:
+    """Pair every query with every namespace as (query, namespace_id, branch kind)."""
+    return [
+        (q, ns, "original" if i == 0 else "subquery")
+        for ns in namespaces
+        for i, q in enumerate(queries)
+    ]
+
+
+def _fuse(branches: list, outcomes: list) -> list:
+    """Fuse the hit lists of the branches that succeeded; re-raise if none did."""
+    result_lists = []
+    for (q, ns, _), outcome in zip(branches, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning(f"Search for '{q}' in namespace {ns} failed: {str(outcome)}")
+        else:
+            result_lists.append(outcome)
+    if not result_lists:
+        raise outcomes[0]
+    return reciprocal_rank_fusion(result_lists)
+
+
+def _prompt_key(messages: list) -> str:
+    """Everything in the prompt before the question: the system prompt and any earlier turns."""
+    if len(messages) == 2:
+        return messages[0]["content"]
+    return json.dumps(messages[:-1])
+
+
+def _response_cache_key(
+    response_cache: ResponseCache, use_cache: bool, query: str, context: str, messages: list, model: str
+) -> str:
+    """Return the response cache key for a request, or None when caching is off."""
+    if not use_cache or response_cache is None:
+        return None
+    return ResponseCache.make_key(query, context, _prompt_key(messages), model)
+
+
+def _search_flight_key(query, namespace_id, top_k, min_score, rerank, rerank_model) -> tuple:
+    """Key under which identical concurrent searches share one upstream call."""
+    return (namespace_id, top_k, min_score, rerank, rerank_model, normalize_query(query))
+
+
+def _generation_flight_key(query: str, context: str, messages: list, model: str) -> str:
+    """Key under which identical concurrent generations share one completion."""
+    return ResponseCache.make_key(normalize_query(query), context, _prompt_key(messages), model)
+
+
+def _search_replica(replica: "ReplicaStore", query: str, namespace_id: str, top_k: int, min_score: float) -> list:
+    """Local replica hits for a query, or an empty list when the replica cannot be searched."""
+    try:
+        return replica.search(namespace_id, query, top_k, min_score)
+    except Exception as e:
+        logger.warning(f"Replica search for '{query}' failed: {str(e)}")
+        return []
+
+
+def _replicate_hits(replica: "ReplicaStore", namespace_id: str, hits: list):
+    """Keep search hits in the local replica for later offline or local retrieval."""
+    try:
+        replica.add(namespace_id, hits)
+    except Exception as e:
+        logger.warning(f"Could not add hits to the replica of namespace {namespace_id}: {str(e)}")
+
+
+def _replica_fallback(replica: "ReplicaStore", query: str, namespace_id: str, top_k: int, error: Exception) -> list:
+    """Replica hits served after a failed search; re-raises the error when there are none."""
+    hits = _search_replica(replica, query, namespace_id, top_k, 0.0)
+    if not hits:
+        metrics.inc("replica_total", outcome="miss")
+        raise error
+    metrics.inc("replica_total", outcome="fallback")
+    logger.warning(
+        f"Search for '{query}' failed, serving {len(hits)} hits from the local replica: {str(error)}"
+    )
+    return hits
+
+
+def _record_usage(usage):
+    """Count prompt/completion tokens reported by OpenAI."""
+    if usage is not None:
+        metrics.inc("tokens_total", usage.prompt_tokens or 0, kind="prompt")
+        metrics.inc("tokens_total", usage.completion_tokens or 0, kind="completion")
+
+
+def _build_messages(query: str, context: str, system_prompt: str = None, history: list = None) -> list:
+    """Build the chat messages for a query, filling the context into the system prompt."""
+    if system_prompt is None:
+        system_prompt = (
+            f"Answer questions based on the following context:\n\n{context}"
+        )
+    else:
+        # Replace {context} placeholder in system prompt
+        system_prompt = system_prompt.format(context=context)
+
+    return [
+        {"role": "system", "content": system_prompt},
+        *(history or []),
+        {"role": "user", "content": query},
+    ]
+
+
+class _RAGBase(ABC):
+    """
+    State and helpers shared by RAGSystem and AsyncRAGSystem.
+
+    Subclasses add the I/O: how searches and completions are awaited, the
+    request coalescing (single-flight) class and the default OpenAI client.
+    """
+
+    _single_flight = SingleFlight
+
+    def __init__(
+        self,
+        agentset_namespace_id: str,
+        agentset_api_token: str,
+        openai_api_key: str,
+        system_prompt: str,
+        model: str,
+        openai_client,
+        agentset_client: "Agentset",
+        retrieval_cache: RetrievalCache,
+        response_cache: ResponseCache,
+        context_token_budget: int,
+        agentset_client_factory: Callable[[str], "Agentset"],
+        query_expander: str,
+        expansion_model: str,
+        max_queries: int,
+        resilience: Resilience,
+        coalesce_requests: bool,
+        replica: "ReplicaStore",
+        replica_mode: str,
+        replica_min_score: float,
+        router: ModelRouter,
+    ):
+        """Store the settings shared by both systems; see RAGSystem for the arguments."""
+        self.agentset_namespace_id = agentset_namespace_id
+        self.agentset_api_token = agentset_api_token
+        self.openai_api_key = openai_api_key
+        self.system_prompt = system_prompt
+        self.model = model
+        self.retrieval_cache = retrieval_cache
+        self.response_cache = response_cache
+        self.context_token_budget = context_token_budget
+        self.agentset_client_factory = agentset_client_factory
+        self.query_expander = query_expander
+        self.expansion_model = expansion_model
+        self.max_queries = max_queries
+        self.resilience = resilience or Resilience()
+        self.replica = replica
+        self.replica_mode = replica_mode
+        self.replica_min_score = replica_min_score
+        self.router = router or (ModelRouter() if model == AUTO_MODEL else None)
+        self._searches = self._single_flight("search", coalesce_requests)
+        self._generations = self._single_flight("generate", coalesce_requests)
+        self._clients_lock = threading.Lock()
+
+        # Initialize OpenAI client
+        if openai_client is None:
+            # Retries are left to self.resilience instead of stacking on top of it
+            openai_client = self._new_openai_client(openai_api_key)
+        self.openai_client = openai_client
+        logger.debug("OpenAI client initialized")
+
+        # Initialize Agentset client using Python SDK
+        self.agentset_client = agentset_client or _new_agentset_client(
+            agentset_namespace_id, agentset_api_token
+        )
+        logger.debug("Agentset client initialized")
+        self._agentset_clients = {agentset_namespace_id: self.agentset_client}
+
+    @staticmethod
+    @abstractmethod
+    def _new_openai_client(openai_api_key: str):
+        """OpenAI client used when none is passed in, with SDK retries off."""
+
+    def _pick_model(
+        self, query: str, chunks: list = None, context: str = "", streaming: bool = False, fastest: bool = False
+    ) -> str:
+        """This system's model, or the router's choice for the question when it is "auto"."""
+        if self.model != AUTO_MODEL:
+            return self.model
+        if fastest:
+            return self.router.fastest()
+        return self.router.choose(query, chunks, context, streaming)
+
+    def _get_agentset_client(self, namespace_id: str) -> "Agentset":
+        """Return the Agentset client for a namespace, building it on first use."""
+        with self._clients_lock:
+            client = self._agentset_clients.get(namespace_id)
+            if client is None:
+                if self.agentset_client_factory is not None:
+                    client = self.agentset_client_factory(namespace_id)
+                else:
+                    client = _new_agentset_client(namespace_id, self.agentset_api_token)
+                self._agentset_clients[namespace_id] = client
+            return client
+
+    def _expansion_request(self, query: str) -> dict:
+        """Chat completion arguments asking the model to split a question."""
+        return dict(
+            model=self.expansion_model or self._pick_model(query, fastest=True),
+            messages=expansion_messages(query, self.max_queries),
+            timeout=self.resilience.timeout("openai"),
+        )
+
+    def _expansion_queries(self, query: str, response) -> list:
+        """Sub-queries parsed from the expansion model's answer, the original first."""
+        _record_usage(response.usage)
+        return parse_expansion(query, response.choices[0].message.content or "", self.max_queries)
+
+    def _cached_hits(self, cache_key: tuple) -> list:
+        """Hits of a search from the retrieval cache, or None."""
+        if self.retrieval_cache is None:
+            return None
+        hits = self.retrieval_cache.get(*cache_key)
+        if hits is not None:
+            logger.info(f"Serving retrieval for '{cache_key[0]}' from cache")
+        return hits
+
+    def _search_request(self, cache_key: tuple) -> dict:
+        """Agentset search arguments for a retrieval cache key."""
+        query, namespace_id, top_k, min_score, rerank, rerank_model = cache_key
+        return dict(
+            query=query,
+            top_k=top_k,
+            min_score=min_score,
+            rerank=rerank,
+            rerank_limit=top_k,
+            rerank_model=rerank_model,
+            timeout_ms=self.resilience.timeout_ms("agentset_search"),
+        )
+
+    def _store_hits(self, cache_key: tuple, results) -> list:
+        """Hits of a finished search, stored in the retrieval cache."""
+        logger.debug(f"Agentset SDK returned {len(results.data)} results for '{cache_key[0]}'")
+        hits = _search_hits(results)
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.set(*cache_key, hits)
+        return hits
+
+    def _build_messages(
+        self, query: str, context: str, system_prompt: str = None, history: list = None
+    ) -> list:
+        """Build the chat messages for a query, filling the context into the system prompt."""
+        if system_prompt is None:
+            system_prompt = self.system_prompt
+        return _build_messages(query, context, system_prompt, history)
+
+    def _prepare_answer(
+        self, query: str, context: str, system_prompt: str, use_cache: bool, model: str, history: list
+    ) -> tuple:
+        """
+        Messages and response cache key for a question.
+
+        Returns:
+            (messages, cache key or None, cached answer or None)
+        """
+        messages = self._build_messages(query, context, system_prompt, history)
+        cache_key = _response_cache_key(
+            self.response_cache, use_cache, query, context, messages, model
+        )
+        cached = None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Serving response for '{query}' from cache")
+        return messages, cache_key, cached
+
+    def _completion_request(self, messages: list, model: str, stream: bool = False) -> dict:
+        """Chat completion arguments, streamed with a final usage chunk when stream is set."""
+        request = dict(model=model, messages=messages, timeout=self.resilience.timeout("openai"))
+        if stream:
+            request.update(stream=True, stream_options={"include_usage": True})
+        return request
+
+    def _finish_completion(self, response, cache_key: str, model: str, start_time: float) -> str:
+        """Answer of a finished completion, recorded by the router and stored in the response cache."""
+        if self.router is not None:
+            self.router.observe(model, time.perf_counter() - start_time)
+
+        result = response.choices[0].message.content
+        logger.debug(f"Generated response of {len(result)} characters")
+        _record_usage(response.usage)
+
+        if cache_key is not None:
+            self.response_cache.set(cache_key, result)
+        return result
+
+    def _stream_delta(self, chunk, parts: list, model: str, start_time: float) -> str:
+        """Text of a streamed chunk (empty for none), recording usage and the first token's latency."""
+        if not chunk.choices:
+            _record_usage(chunk.usage)
+            return ""
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if not parts and self.router is not None:
+                self.router.observe(model, time.perf_counter() - start_time, streaming=True)
+            parts.append(delta)
+        return delta or ""
+
+    def _finish_stream(self, parts: list, cache_key: str):
+        """Store a fully streamed answer in the response cache."""
+        if cache_key is not None:
+            self.response_cache.set(cache_key, "".join(parts))
+
+    @staticmethod
+    def _first_token(start_time: float) -> float:
+        """Record the time to the first token of a streamed query."""
+        time_to_first_token = time.perf_counter() - start_time
+        metrics.observe("time_to_first_token_seconds", time_to_first_token)
+        logger.info(f"Time to first token: {time_to_first_token:.3f}s")
+        return time_to_first_token
+
+    @staticmethod
+    def _query_result(query: str, context: str, chunks: list, response: str, model: str) -> dict:
+        """Result dictionary of a complete query."""
+        return {
+            "query": query,
+            "context": context,
+            "chunks": [chunk.to_dict() for chunk in chunks],
+            "response": response,
+            "model": model,
+        }
+
+
+class RAGSystem(_RAGBase):
     """
     A simple RAG (Retrieval Augmented Generation) system.
     Retrieves relevant documents and generates responses using OpenAI.
@@ -23,6 +397,22 @@ class RAGSystem:
         openai_api_key: str,
         system_prompt: str = None,
         model: str = "gpt-4o-mini",
+        openai_client: "OpenAIClient" = None,
+        agentset_client: "Agentset" = None,
+        retrieval_cache: RetrievalCache = None,
+        response_cache: ResponseCache = None,
+        context_token_budget: int = 3000,
+        agentset_client_factory: Callable[[str], "Agentset"] = None,
+        query_expander: str = "rules",
+        expansion_model: str = None,
+        max_queries: int = 4,
+        fanout_workers: int = 8,
+        resilience: Resilience = None,
+        coalesce_requests: bool = True,
+        replica: "ReplicaStore" = None,
+        replica_mode: str = "fallback",
+        replica_min_score: float = 0.6,
+        router: ModelRouter = None,
     ):
         """
         Initialize the RAG system with API credentials.
@@ -32,26 +422,59 @@ class RAGSystem:
             agentset_api_token: Agentset API token
             openai_api_key: OpenAI API key
             system_prompt: Custom system prompt (optional)
-            model: OpenAI model to use for generation (default: gpt-4o-mini)
+            model: OpenAI model to use for generation (default: gpt-4o-mini; "auto"
+                lets the router pick one per question)
+            openai_client: Pre-built OpenAI client to reuse (optional)
+            agentset_client: Pre-built Agentset client to reuse (optional)
+            retrieval_cache: Cache for search results (optional)
+            response_cache: Cache for generated answers (optional)
+            context_token_budget: Maximum prompt context tokens (None for no limit)
+            agentset_client_factory: Builds the client for an extra namespace (optional)
+            query_expander: How multi-query retrieval splits questions ("rules" or "model")
+            expansion_model: OpenAI model for the "model" expander (default: model)
+            max_queries: Maximum queries per multi-query retrieval, including the original
+            fanout_workers: Searches run in parallel by multi-query retrieval
+            resilience: Timeout/retry/hedging policy, shared between clients (optional)
+            coalesce_requests: Share one search/completion between identical concurrent requests
+            replica: Local replica that keeps search hits and serves retrieval from them (optional)
+            replica_mode: "fallback" (serve the replica when a search fails) or "first"
+                (also skip the search when the replica has confident hits)
+            replica_min_score: Lowest replica score served without a search in "first" mode
+            router: Picks the model per question for "auto" and tracks model
+                latency (default: a ModelRouter with default tiers for "auto")
         """
         logger.info("Initializing RAG System")
 
-        self.agentset_namespace_id = agentset_namespace_id
-        self.agentset_api_token = agentset_api_token
-        self.openai_api_key = openai_api_key
-        self.system_prompt = system_prompt
-        self.model = model
+        super().__init__(
+            agentset_namespace_id,
+            agentset_api_token,
+            openai_api_key,
+            system_prompt,
+            model,
+            openai_client,
+            agentset_client,
+            retrieval_cache,
+            response_cache,
+            context_token_budget,
+            agentset_client_factory,
+            query_expander,
+            expansion_model,
+            max_queries,
+            resilience,
+            coalesce_requests,
+            replica,
+            replica_mode,
+            replica_min_score,
+            router,
+        )
+        self.fanout_workers = fanout_workers
+        self._fanout_pool = None
 
-        # Initialize OpenAI client
-        self.openai_client = OpenAIClient(api_key=openai_api_key)
-        logger.debug("OpenAI client initialized")
+    @staticmethod
+    def _new_openai_client(openai_api_key: str) -> "OpenAIClient":
+        from openai import OpenAI as OpenAIClient
 
-        # Initialize Agentset client using Python SDK
-        self.agentset_client = Agentset(
-            namespace_id=agentset_namespace_id,
-            token=agentset_api_token,
-        )
-        logger.debug("Agentset client initialized")
+        return OpenAIClient(api_key=openai_api_key, max_retries=0)
 
     def retrieve(
         self,
@@ -60,6 +483,8 @@ class RAGSystem:
         min_score: float = 0.5,
         rerank: bool = True,
         rerank_model: str = "zeroentropy:zerank-2",
+        multi_query: bool = False,
+        namespaces: list = None,
     ) -> str:
         """
         Retrieve relevant documents from Agentset based on query.
@@ -70,36 +495,166 @@ class RAGSystem:
             min_score: Minimum relevance score (0-1)
             rerank: Whether to rerank results
             rerank_model: Model to use for reranking
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
 
         Returns:
-            Extracted context from retrieved documents
+            Context string of the selected chunks, each labelled with its source ID
         """
-        logger.info(
-            f"Retrieving documents for query: '{query}' (top_k={top_k}, min_score={min_score})"
+        return format_context(
+            self.retrieve_chunks(
+                query, top_k, min_score, rerank, rerank_model, multi_query, namespaces
+            )
         )
 
-        # Use Agentset Python SDK for search
-        results = self.agentset_client.search.execute(
-            query=query,
-            top_k=top_k,
-            min_score=min_score,
-            rerank=rerank,
-            rerank_limit=top_k,
-            rerank_model=rerank_model,
-        )
+    @instrument("retrieve")
+    def retrieve_chunks(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.5,
+        rerank: bool = True,
+        rerank_model: str = "zeroentropy:zerank-2",
+        multi_query: bool = False,
+        namespaces: list = None,
+    ) -> list:
+        """
+        Retrieve relevant chunks from Agentset, deduplicated and fitted to the token budget.
 
-        logger.debug(f"Agentset SDK returned {len(results.data)} results")
+        With multi_query or several namespaces, every (sub-query, namespace)
+        pair is searched concurrently and the hit lists are merged with
+        reciprocal-rank fusion. Failed branches are skipped unless all fail.
 
-        # Extract context from search results
-        context = "".join([r.text for r in results.data if r.text])
+        Args:
+            query: Search query
+            top_k: Number of top results to return
+            min_score: Minimum relevance score (0-1)
+            rerank: Whether to rerank results
+            rerank_model: Model to use for reranking
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
 
+        Returns:
+            List of ContextChunk objects, best first (by fused rank when several searches ran)
+        """
         logger.info(
-            f"Extracted context of {len(context)} characters from {len(results.data)} documents"
+            f"Retrieving documents for query: '{query}' (top_k={top_k}, min_score={min_score})"
         )
-        return context.strip()
 
+        queries = self.expand_query(query) if multi_query else [query]
+        branches = _branches(queries, namespaces or [self.agentset_namespace_id])
+
+        if len(branches) == 1:
+            hits = self._search(query, branches[0][1], top_k, min_score, rerank, rerank_model)
+        else:
+            start_time = time.perf_counter()
+            futures = [
+                self._fanout_executor().submit(
+                    self._search, q, ns, top_k, min_score, rerank, rerank_model, kind
+                )
+                for q, ns, kind in branches
+            ]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+            hits = _fuse(branches, outcomes)
+            logger.info(
+                f"Fanned out {len(branches)} searches in {time.perf_counter() - start_time:.3f}s"
+            )
+
+        return _select_chunks(hits, self.model, self.context_token_budget)
+
+    def _fanout_executor(self) -> ThreadPoolExecutor:
+        with self._clients_lock:
+            if self._fanout_pool is None:
+                self._fanout_pool = ThreadPoolExecutor(
+                    max_workers=self.fanout_workers, thread_name_prefix="agentset-search"
+                )
+            return self._fanout_pool
+
+    def expand_query(self, query: str) -> list:
+        """
+        Split a question into sub-queries for multi-query retrieval.
+
+        Args:
+            query: User's question
+
+        Returns:
+            List of queries, the original first
+        """
+        if self.query_expander == "model":
+            try:
+                response = self.resilience.call(
+                    "openai", self.openai_client.chat.completions.create, **self._expansion_request(query)
+                )
+                return self._expansion_queries(query, response)
+            except Exception as e:
+                logger.warning(f"Query expansion failed, falling back to rules: {str(e)}")
+        return expand_query(query, self.max_queries)
+
+    def _search(
+        self,
+        query: str,
+        namespace_id: str,
+        top_k: int,
+        min_score: float,
+        rerank: bool,
+        rerank_model: str,
+        branch: str = "original",
+    ) -> list:
+        """Run one search through the retrieval cache and return its hits."""
+        cache_key = (query, namespace_id, top_k, min_score, rerank, rerank_model)
+        hits = self._cached_hits(cache_key)
+        if hits is not None:
+            return hits
+
+        if self.replica is not None and self.replica_mode == "first":
+            hits = _search_replica(self.replica, query, namespace_id, top_k, self.replica_min_score)
+            if hits:
+                metrics.inc("replica_total", outcome="served")
+                logger.info(f"Serving retrieval for '{query}' from the local replica")
+                return hits
+
+        # The same search already running for another session is shared
+        try:
+            return self._searches.do(
+                _search_flight_key(*cache_key), self._fetch_hits, cache_key, branch
+            )
+        except Exception as e:
+            if self.replica is None:
+                raise
+            return _replica_fallback(self.replica, query, namespace_id, top_k, e)
+
+    def _fetch_hits(self, cache_key: tuple, branch: str) -> list:
+        """Search Agentset and store the hits in the retrieval cache."""
+        namespace_id = cache_key[1]
+
+        # Use Agentset Python SDK for search
+        with metrics.timed("search", branch=branch):
+            # Read-only and latency-critical, so a slow search is hedged
+            results = self.resilience.hedged(
+                "agentset_search",
+                self._get_agentset_client(namespace_id).search.execute,
+                **self._search_request(cache_key),
+            )
+
+        hits = self._store_hits(cache_key, results)
+        if self.replica is not None:
+            _replicate_hits(self.replica, namespace_id, hits)
+        return hits
+
+    @instrument("generate_response")
     def generate_response(
-        self, query: str, context: str, system_prompt: str = None
+        self,
+        query: str,
+        context: str,
+        system_prompt: str = None,
+        use_cache: bool = True,
+        model: str = None,
+        history: list = None,
     ) -> str:
         """
         Generate a response using OpenAI based on retrieved context.
@@ -108,39 +663,109 @@ class RAGSystem:
             query: User's question
             context: Retrieved context from documents
             system_prompt: Custom system prompt (optional, uses instance prompt if not provided)
+            use_cache: Whether to serve/store the answer through the response cache
+            model: Model to answer with (default: this system's model, routed if "auto")
+            history: Earlier conversation messages sent before the question (optional)
 
         Returns:
             Generated response from OpenAI
         """
         logger.info(f"Generating response for query: '{query}'")
 
-        if system_prompt is None:
-            system_prompt = self.system_prompt
+        model = model or self._pick_model(query, context=context)
+        messages, cache_key, cached = self._prepare_answer(
+            query, context, system_prompt, use_cache, model, history
+        )
+        if cached is not None:
+            return cached
 
-        if system_prompt is None:
-            system_prompt = (
-                f"Answer questions based on the following context:\n\n{context}"
-            )
-        else:
-            # Replace {context} placeholder in system prompt
-            system_prompt = system_prompt.format(context=context)
+        # The same question with the same context already being answered is shared
+        return self._generations.do(
+            _generation_flight_key(query, context, messages, model),
+            self._complete,
+            messages,
+            cache_key,
+            model,
+        )
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query},
-        ]
+    def _complete(self, messages: list, cache_key: str, model: str) -> str:
+        """Run one chat completion and store the answer in the response cache."""
+        logger.info(f"Using model: {model}")
+        start_time = time.perf_counter()
+        response = self.resilience.call(
+            "openai", self.openai_client.chat.completions.create, **self._completion_request(messages, model)
+        )
+        return self._finish_completion(response, cache_key, model, start_time)
+
+    def stream_response(
+        self,
+        query: str,
+        context: str,
+        system_prompt: str = None,
+        use_cache: bool = True,
+        model: str = None,
+        history: list = None,
+    ) -> Iterator[str]:
+        """
+        Stream a response from OpenAI token by token.
+
+        Args:
+            query: User's question
+            context: Retrieved context from documents
+            system_prompt: Custom system prompt (optional, uses instance prompt if not provided)
+            use_cache: Whether to serve/store the answer through the response cache
+            model: Model to answer with (default: this system's model, routed if "auto")
+            history: Earlier conversation messages sent before the question (optional)
+
+        Yields:
+            Text deltas as they arrive from OpenAI
+        """
+        model = model or self._pick_model(query, context=context, streaming=True)
+        logger.info(f"Streaming response for query: '{query}' (model: {model})")
 
-        logger.info(f"Using model: {self.model}")
-        response = self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=messages,
+        messages, cache_key, cached = self._prepare_answer(
+            query, context, system_prompt, use_cache, model, history
         )
+        if cached is not None:
+            yield cached
+            return
 
-        result = response.choices[0].message.content
-        logger.debug(f"Generated response of {len(result)} characters")
-        return result
+        # Sessions asking the same question meanwhile replay this stream
+        # instead of opening their own
+        yield from self._generations.stream(
+            ("stream", _generation_flight_key(query, context, messages, model)),
+            lambda: self._stream_deltas(messages, cache_key, model),
+        )
+
+    def _stream_deltas(self, messages: list, cache_key: str, model: str) -> Iterator[str]:
+        """Stream one chat completion and store the full answer in the response cache."""
+        start_time = time.perf_counter()
+        # Only opening the stream is retried; retrying after tokens were shown would repeat them
+        stream = self.resilience.call(
+            "openai",
+            self.openai_client.chat.completions.create,
+            **self._completion_request(messages, model, stream=True),
+        )
 
-    def query(self, query: str, top_k: int = 10, min_score: float = 0.5) -> dict:
+        parts = []
+        for chunk in stream:
+            delta = self._stream_delta(chunk, parts, model, start_time)
+            if delta:
+                yield delta
+        self._finish_stream(parts, cache_key)
+
+    @instrument("query")
+    def query(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.5,
+        use_cache: bool = True,
+        multi_query: bool = False,
+        namespaces: list = None,
+        chunks: list = None,
+        history: list = None,
+    ) -> dict:
         """
         Execute a complete RAG pipeline: retrieve and generate.
 
@@ -148,19 +773,574 @@ class RAGSystem:
             query: User's question
             top_k: Number of documents to retrieve
             min_score: Minimum relevance score
+            use_cache: Whether to use the response cache for this request
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
+            chunks: Already retrieved ContextChunks (e.g. prefetched) to use instead of searching
+            history: Earlier conversation messages, e.g. ChatHistory.messages() (optional)
 
         Returns:
-            Dictionary with 'context' and 'response' keys
+            Dictionary with 'context', 'chunks' (selected sources), 'response' and
+            'model' (the model that answered) keys
         """
         logger.info(f"Starting RAG query pipeline for: '{query}'")
 
-        context = self.retrieve(query, top_k=top_k, min_score=min_score)
-        response = self.generate_response(query, context)
+        if chunks is None:
+            chunks = self.retrieve_chunks(
+                query,
+                top_k=top_k,
+                min_score=min_score,
+                multi_query=multi_query,
+                namespaces=namespaces,
+            )
+        context = format_context(chunks)
+        model = self._pick_model(query, chunks)
+        response = self.generate_response(
+            query, context, use_cache=use_cache, model=model, history=history
+        )
 
         logger.info(f"RAG query completed successfully")
 
-        return {
+        return self._query_result(query, context, chunks, response, model)
+
+    def stream_query(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.5,
+        use_cache: bool = True,
+        multi_query: bool = False,
+        namespaces: list = None,
+        chunks: list = None,
+        history: list = None,
+    ) -> Iterator[dict]:
+        """
+        Execute the RAG pipeline, streaming the generated answer.
+
+        Args:
+            query: User's question
+            top_k: Number of documents to retrieve
+            min_score: Minimum relevance score
+            use_cache: Whether to use the response cache for this request
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
+            chunks: Already retrieved ContextChunks (e.g. prefetched) to use instead of searching
+            history: Earlier conversation messages, e.g. ChatHistory.messages() (optional)
+
+        Yields:
+            Event dictionaries with a 'type' key:
+            - 'context': retrieval finished, carries 'context' and 'chunks'
+            - 'delta': a piece of the answer, carries 'content'
+            - 'done': stream finished, carries 'query', 'context', 'chunks', 'response',
+              'model' and 'time_to_first_token' (seconds from the start of the query)
+        """
+        logger.info(f"Starting streaming RAG query pipeline for: '{query}'")
+        start_time = time.perf_counter()
+
+        if chunks is None:
+            chunks = self.retrieve_chunks(
+                query,
+                top_k=top_k,
+                min_score=min_score,
+                multi_query=multi_query,
+                namespaces=namespaces,
+            )
+        context = format_context(chunks)
+        chunk_dicts = [chunk.to_dict() for chunk in chunks]
+        yield {"type": "context", "context": context, "chunks": chunk_dicts}
+
+        parts = []
+        time_to_first_token = None
+        model = self._pick_model(query, chunks, streaming=True)
+        deltas = self.stream_response(query, context, use_cache=use_cache, model=model, history=history)
+        for delta in deltas:
+            if time_to_first_token is None:
+                time_to_first_token = self._first_token(start_time)
+            parts.append(delta)
+            yield {"type": "delta", "content": delta}
+
+        logger.info("Streaming RAG query completed successfully")
+
+        metrics.observe("query_seconds", time.perf_counter() - start_time)
+
+        yield {
+            "type": "done",
             "query": query,
             "context": context,
-            "response": response,
+            "chunks": chunk_dicts,
+            "response": "".join(parts),
+            "model": model,
+            "time_to_first_token": time_to_first_token,
+        }
+
+
+class AsyncRAGSystem(_RAGBase):
+    """
+    Asyncio counterpart of RAGSystem.
+    Uses the async OpenAI client and the Agentset SDK's async search so a
+    single event loop can serve many in-flight queries without a thread each.
+    """
+
+    _single_flight = AsyncSingleFlight
+
+    def __init__(
+        self,
+        agentset_namespace_id: str,
+        agentset_api_token: str,
+        openai_api_key: str,
+        system_prompt: str = None,
+        model: str = "gpt-4o-mini",
+        openai_client: "AsyncOpenAIClient" = None,
+        agentset_client: "Agentset" = None,
+        retrieval_cache: RetrievalCache = None,
+        response_cache: ResponseCache = None,
+        context_token_budget: int = 3000,
+        agentset_client_factory: Callable[[str], "Agentset"] = None,
+        query_expander: str = "rules",
+        expansion_model: str = None,
+        max_queries: int = 4,
+        resilience: Resilience = None,
+        coalesce_requests: bool = True,
+        replica: "ReplicaStore" = None,
+        replica_mode: str = "fallback",
+        replica_min_score: float = 0.6,
+        router: ModelRouter = None,
+    ):
+        """
+        Initialize the async RAG system with API credentials.
+
+        Args:
+            agentset_namespace_id: Agentset namespace ID
+            agentset_api_token: Agentset API token
+            openai_api_key: OpenAI API key
+            system_prompt: Custom system prompt (optional)
+            model: OpenAI model to use for generation (default: gpt-4o-mini; "auto"
+                lets the router pick one per question)
+            openai_client: Pre-built async OpenAI client to reuse (optional)
+            agentset_client: Pre-built Agentset client to reuse (optional)
+            retrieval_cache: Cache for search results (optional)
+            response_cache: Cache for generated answers (optional)
+            context_token_budget: Maximum prompt context tokens (None for no limit)
+            agentset_client_factory: Builds the client for an extra namespace (optional)
+            query_expander: How multi-query retrieval splits questions ("rules" or "model")
+            expansion_model: OpenAI model for the "model" expander (default: model)
+            max_queries: Maximum queries per multi-query retrieval, including the original
+            resilience: Timeout/retry/hedging policy, shared between clients (optional)
+            coalesce_requests: Share one search/completion between identical concurrent requests
+            replica: Local replica that keeps search hits and serves retrieval from them (optional)
+            replica_mode: "fallback" (serve the replica when a search fails) or "first"
+                (also skip the search when the replica has confident hits)
+            replica_min_score: Lowest replica score served without a search in "first" mode
+            router: Picks the model per question for "auto" and tracks model
+                latency (default: a ModelRouter with default tiers for "auto")
+        """
+        logger.info("Initializing async RAG System")
+
+        super().__init__(
+            agentset_namespace_id,
+            agentset_api_token,
+            openai_api_key,
+            system_prompt,
+            model,
+            openai_client,
+            agentset_client,
+            retrieval_cache,
+            response_cache,
+            context_token_budget,
+            agentset_client_factory,
+            query_expander,
+            expansion_model,
+            max_queries,
+            resilience,
+            coalesce_requests,
+            replica,
+            replica_mode,
+            replica_min_score,
+            router,
+        )
+
+    @staticmethod
+    def _new_openai_client(openai_api_key: str) -> "AsyncOpenAIClient":
+        from openai import AsyncOpenAI as AsyncOpenAIClient
+
+        return AsyncOpenAIClient(api_key=openai_api_key, max_retries=0)
+
+    async def aretrieve(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.5,
+        rerank: bool = True,
+        rerank_model: str = "zeroentropy:zerank-2",
+        multi_query: bool = False,
+        namespaces: list = None,
+    ) -> str:
+        """
+        Retrieve relevant documents from Agentset based on query.
+
+        Args:
+            query: Search query
+            top_k: Number of top results to return
+            min_score: Minimum relevance score (0-1)
+            rerank: Whether to rerank results
+            rerank_model: Model to use for reranking
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
+
+        Returns:
+            Context string of the selected chunks, each labelled with its source ID
+        """
+        return format_context(
+            await self.aretrieve_chunks(
+                query, top_k, min_score, rerank, rerank_model, multi_query, namespaces
+            )
+        )
+
+    @instrument("retrieve")
+    async def aretrieve_chunks(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.5,
+        rerank: bool = True,
+        rerank_model: str = "zeroentropy:zerank-2",
+        multi_query: bool = False,
+        namespaces: list = None,
+    ) -> list:
+        """
+        Retrieve relevant chunks from Agentset, deduplicated and fitted to the token budget.
+
+        With multi_query or several namespaces, every (sub-query, namespace)
+        pair is searched concurrently and the hit lists are merged with
+        reciprocal-rank fusion. Failed branches are skipped unless all fail.
+
+        Args:
+            query: Search query
+            top_k: Number of top results to return
+            min_score: Minimum relevance score (0-1)
+            rerank: Whether to rerank results
+            rerank_model: Model to use for reranking
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
+
+        Returns:
+            List of ContextChunk objects, best first (by fused rank when several searches ran)
+        """
+        logger.info(
+            f"Retrieving documents for query: '{query}' (top_k={top_k}, min_score={min_score})"
+        )
+
+        queries = await self.aexpand_query(query) if multi_query else [query]
+        branches = _branches(queries, namespaces or [self.agentset_namespace_id])
+
+        if len(branches) == 1:
+            hits = await self._asearch(query, branches[0][1], top_k, min_score, rerank, rerank_model)
+        else:
+            start_time = time.perf_counter()
+            outcomes = await asyncio.gather(
+                *(
+                    self._asearch(q, ns, top_k, min_score, rerank, rerank_model, kind)
+                    for q, ns, kind in branches
+                ),
+                return_exceptions=True,
+            )
+            hits = _fuse(branches, outcomes)
+            logger.info(
+                f"Fanned out {len(branches)} searches in {time.perf_counter() - start_time:.3f}s"
+            )
+
+        return _select_chunks(hits, self.model, self.context_token_budget)
+
+    async def aexpand_query(self, query: str) -> list:
+        """
+        Split a question into sub-queries for multi-query retrieval.
+
+        Args:
+            query: User's question
+
+        Returns:
+            List of queries, the original first
+        """
+        if self.query_expander == "model":
+            try:
+                response = await self.resilience.acall(
+                    "openai", self.openai_client.chat.completions.create, **self._expansion_request(query)
+                )
+                return self._expansion_queries(query, response)
+            except Exception as e:
+                logger.warning(f"Query expansion failed, falling back to rules: {str(e)}")
+        return expand_query(query, self.max_queries)
+
+    async def _asearch(
+        self,
+        query: str,
+        namespace_id: str,
+        top_k: int,
+        min_score: float,
+        rerank: bool,
+        rerank_model: str,
+        branch: str = "original",
+    ) -> list:
+        """Run one search through the retrieval cache and return its hits."""
+        cache_key = (query, namespace_id, top_k, min_score, rerank, rerank_model)
+        hits = self._cached_hits(cache_key)
+        if hits is not None:
+            return hits
+
+        if self.replica is not None and self.replica_mode == "first":
+            hits = await asyncio.to_thread(
+                _search_replica, self.replica, query, namespace_id, top_k, self.replica_min_score
+            )
+            if hits:
+                metrics.inc("replica_total", outcome="served")
+                logger.info(f"Serving retrieval for '{query}' from the local replica")
+                return hits
+
+        try:
+            return await self._searches.do(
+                _search_flight_key(*cache_key), self._afetch_hits, cache_key, branch
+            )
+        except Exception as e:
+            if self.replica is None:
+                raise
+            return await asyncio.to_thread(
+                _replica_fallback, self.replica, query, namespace_id, top_k, e
+            )
+
+    async def _afetch_hits(self, cache_key: tuple, branch: str) -> list:
+        """Search Agentset and store the hits in the retrieval cache."""
+        namespace_id = cache_key[1]
+
+        with metrics.timed("search", branch=branch):
+            results = await self.resilience.ahedged(
+                "agentset_search",
+                self._get_agentset_client(namespace_id).search.execute_async,
+                **self._search_request(cache_key),
+            )
+
+        hits = self._store_hits(cache_key, results)
+        if self.replica is not None:
+            await asyncio.to_thread(_replicate_hits, self.replica, namespace_id, hits)
+        return hits
+
+    @instrument("generate_response")
+    async def agenerate_response(
+        self,
+        query: str,
+        context: str,
+        system_prompt: str = None,
+        use_cache: bool = True,
+        model: str = None,
+        history: list = None,
+    ) -> str:
+        """
+        Generate a response using OpenAI based on retrieved context.
+
+        Args:
+            query: User's question
+            context: Retrieved context from documents
+            system_prompt: Custom system prompt (optional, uses instance prompt if not provided)
+            use_cache: Whether to serve/store the answer through the response cache
+            model: Model to answer with (default: this system's model, routed if "auto")
+            history: Earlier conversation messages sent before the question (optional)
+
+        Returns:
+            Generated response from OpenAI
+        """
+        model = model or self._pick_model(query, context=context)
+        logger.info(f"Generating response for query: '{query}' (model: {model})")
+
+        messages, cache_key, cached = self._prepare_answer(
+            query, context, system_prompt, use_cache, model, history
+        )
+        if cached is not None:
+            return cached
+
+        return await self._generations.do(
+            _generation_flight_key(query, context, messages, model),
+            self._acomplete,
+            messages,
+            cache_key,
+            model,
+        )
+
+    async def _acomplete(self, messages: list, cache_key: str, model: str) -> str:
+        """Run one chat completion and store the answer in the response cache."""
+        start_time = time.perf_counter()
+        response = await self.resilience.acall(
+            "openai", self.openai_client.chat.completions.create, **self._completion_request(messages, model)
+        )
+        return self._finish_completion(response, cache_key, model, start_time)
+
+    async def astream_response(
+        self,
+        query: str,
+        context: str,
+        system_prompt: str = None,
+        use_cache: bool = True,
+        model: str = None,
+        history: list = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from OpenAI token by token.
+
+        Args:
+            query: User's question
+            context: Retrieved context from documents
+            system_prompt: Custom system prompt (optional, uses instance prompt if not provided)
+            use_cache: Whether to serve/store the answer through the response cache
+            model: Model to answer with (default: this system's model, routed if "auto")
+            history: Earlier conversation messages sent before the question (optional)
+
+        Yields:
+            Text deltas as they arrive from OpenAI
+        """
+        model = model or self._pick_model(query, context=context, streaming=True)
+        logger.info(f"Streaming response for query: '{query}' (model: {model})")
+
+        messages, cache_key, cached = self._prepare_answer(
+            query, context, system_prompt, use_cache, model, history
+        )
+        if cached is not None:
+            yield cached
+            return
+
+        deltas = self._generations.stream(
+            ("stream", _generation_flight_key(query, context, messages, model)),
+            lambda: self._astream_deltas(messages, cache_key, model),
+        )
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()  # Unsubscribe now, not when garbage collected
+
+    async def _astream_deltas(self, messages: list, cache_key: str, model: str) -> AsyncIterator[str]:
+        """Stream one chat completion and store the full answer in the response cache."""
+        start_time = time.perf_counter()
+        # Only opening the stream is retried; retrying after tokens were shown would repeat them
+        stream = await self.resilience.acall(
+            "openai",
+            self.openai_client.chat.completions.create,
+            **self._completion_request(messages, model, stream=True),
+        )
+
+        parts = []
+        async for chunk in stream:
+            delta = self._stream_delta(chunk, parts, model, start_time)
+            if delta:
+                yield delta
+        self._finish_stream(parts, cache_key)
+
+    @instrument("query")
+    async def aquery(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.5,
+        use_cache: bool = True,
+        multi_query: bool = False,
+        namespaces: list = None,
+        chunks: list = None,
+        history: list = None,
+    ) -> dict:
+        """
+        Execute a complete RAG pipeline: retrieve and generate.
+
+        Args:
+            query: User's question
+            top_k: Number of documents to retrieve
+            min_score: Minimum relevance score
+            use_cache: Whether to use the response cache for this request
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
+            chunks: Already retrieved ContextChunks (e.g. prefetched) to use instead of searching
+            history: Earlier conversation messages, e.g. ChatHistory.messages() (optional)
+
+        Returns:
+            Dictionary with 'context', 'chunks' (selected sources), 'response' and
+            'model' (the model that answered) keys
+        """
+        logger.info(f"Starting async RAG query pipeline for: '{query}'")
+
+        if chunks is None:
+            chunks = await self.aretrieve_chunks(
+                query,
+                top_k=top_k,
+                min_score=min_score,
+                multi_query=multi_query,
+                namespaces=namespaces,
+            )
+        context = format_context(chunks)
+        model = self._pick_model(query, chunks)
+        response = await self.agenerate_response(
+            query, context, use_cache=use_cache, model=model, history=history
+        )
+
+        logger.info("Async RAG query completed successfully")
+
+        return self._query_result(query, context, chunks, response, model)
+
+    async def astream_query(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.5,
+        use_cache: bool = True,
+        multi_query: bool = False,
+        namespaces: list = None,
+        chunks: list = None,
+        history: list = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Execute the RAG pipeline, streaming the generated answer.
+
+        Args:
+            query: User's question
+            top_k: Number of documents to retrieve
+            min_score: Minimum relevance score
+            use_cache: Whether to use the response cache for this request
+            multi_query: Expand the query into sub-queries searched in parallel
+            namespaces: Namespace IDs to search (default: this system's namespace)
+            chunks: Already retrieved ContextChunks (e.g. prefetched) to use instead of searching
+            history: Earlier conversation messages, e.g. ChatHistory.messages() (optional)
+
+        Yields:
+            The same 'context', 'delta' and 'done' events as RAGSystem.stream_query
+        """
+        logger.info(f"Starting async streaming RAG query pipeline for: '{query}'")
+        start_time = time.perf_counter()
+
+        if chunks is None:
+            chunks = await self.aretrieve_chunks(
+                query,
+                top_k=top_k,
+                min_score=min_score,
+                multi_query=multi_query,
+                namespaces=namespaces,
+            )
+        context = format_context(chunks)
+        chunk_dicts = [chunk.to_dict() for chunk in chunks]
+        yield {"type": "context", "context": context, "chunks": chunk_dicts}
+
+        parts = []
+        time_to_first_token = None
+        model = self._pick_model(query, chunks, streaming=True)
+        deltas = self.astream_response(query, context, use_cache=use_cache, model=model, history=history)
+        async for delta in deltas:
+            if time_to_first_token is None:
+                time_to_first_token = self._first_token(start_time)
+            parts.append(delta)
+            yield {"type": "delta", "content": delta}
+
+        metrics.observe("query_seconds", time.perf_counter() - start_time)
+
+        yield {
+            "type": "done",
+            "query": query,
+            "context": context,
+            "chunks": chunk_dicts,
+            "response": "".join(parts),
+            "model": model,
+            "time_to_first_token": time_to_first_token,
         }
@@ -0,0 +1,452 @@
+"""
+Replica - Local NumPy copy of namespace chunks for low-latency and offline retrieval
+Chunks that were ingested or seen in search results are kept as hashed
+BM25 term vectors in a memory-mapped, quantized matrix, so they can be
+searched without the network or an embedding model
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable
+
+import numpy as np
+
+from agentset_gradio_demo.preprocess import chunk_paragraphs
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2  # Term frequency saturation
+BM25_B = 0.75  # Document length normalization
+ADD_BATCH = 8192  # Chunks vectorized and written per step of add()
+SEARCH_BLOCK = 65536  # Chunks scored per matrix block (bounds temporary memory)
+MIN_CANDIDATES = 200  # Fewest candidates re-scored exactly per query
+SQL_BATCH = 900  # Row numbers per SQLite IN (...) query
+
+_TOKEN = re.compile(r"\w+")
+# A saturated term frequency stays below k1 + 1, which int8 maps onto 0..127
+_INT8_SCALE = 127 / (BM25_K1 + 1)
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens of a text."""
+    return _TOKEN.findall(text.lower())
+
+
+@lru_cache(maxsize=1 << 20)
+def _bucket(term: str, dims: int) -> int:
+    # crc32 rather than hash(): buckets must be stable across processes
+    return zlib.crc32(term.encode("utf-8")) % dims
+
+
+def split_text(text: str, max_chars: int = 1500) -> list:
+    """Split a document into retrieval-sized chunks at paragraph boundaries."""
+    paragraphs = (" ".join(p.split()) for p in re.split(r"\n\s*\n", text))
+    return chunk_paragraphs([p for p in paragraphs if p], max_chars)
+
+
+def _saturate(tf, length: int, avg_length: float):
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+
+
+def _lock_directory(root: str):
+    """Hold an exclusive lock on a replica directory for the life of the process."""
+    handle = open(os.path.join(root, ".lock"), "a")
+    try:
+        import fcntl
+    except ImportError:  # No advisory locks on Windows
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        raise RuntimeError(f"Replica directory {root} is in use by another process")
+    return handle
+
+
+class ReplicaIndex:
+    """
+    Local search index over the chunks of one namespace.
+
+    Every chunk is a column of a (dims x capacity) matrix in vectors.bin:
+    its words are hashed into dims buckets and each bucket holds the BM25
+    saturated term frequency, quantized to int8 (or stored as float16).
+    The matrix is bucket-major, so a query only reads the rows of its own
+    buckets from disk. Query buckets are weighted by their IDF, the best
+    candidates of the batched matrix product are then re-scored with exact
+    per-term BM25 on their text. Texts and metadata live in SQLite next to
+    the matrix; removed chunks leave an all-zero column behind.
+
+    Scores are the BM25 score divided by that of a chunk of average length
+    containing every query word once, capped at 1.
+
+    Args:
+        path: Directory holding the index files (created if missing)
+        dims: Hash buckets per chunk vector (an existing index keeps its own)
+        dtype: "int8" or "float16" matrix entries (an existing index keeps its own)
+    """
+
+    def __init__(self, path: str, dims: int = 2048, dtype: str = "int8"):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported replica dtype: {dtype}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._meta_path = os.path.join(path, "meta.json")
+        self._matrix_path = os.path.join(path, "vectors.bin")
+        self._df_path = os.path.join(path, "df.npy")
+
+        meta = {"dims": dims, "dtype": dtype, "count": 0, "capacity": 0, "live": 0, "tokens": 0}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+        self.dims = meta["dims"]
+        self.dtype = np.dtype(meta["dtype"])
+        self._count = meta["count"]
+        self._capacity = meta["capacity"]
+        self._live = meta["live"]
+        self._tokens = meta["tokens"]
+        self._df = (
+            np.load(self._df_path) if os.path.exists(self._df_path) else np.zeros(self.dims, np.int64)
+        )
+        self._matrix = None
+        if self._capacity:
+            self._matrix = np.memmap(
+                self._matrix_path, self.dtype, "r+", shape=(self.dims, self._capacity)
+            )
+
+        self._db = sqlite3.connect(os.path.join(path, "chunks.db"), check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, source TEXT, "
+                "text TEXT NOT NULL, metadata TEXT, terms TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)")
+            # Rows written after the last saved state (the process died mid-add)
+            self._db.execute("DELETE FROM chunks WHERE row >= ?", (self._count,))
+
+    def __len__(self) -> int:
+        return self._live
+
+    def add(self, chunks: Iterable[dict], source: str = None) -> int:
+        """
+        Add chunks to the index, skipping IDs it already holds.
+
+        Args:
+            chunks: Dictionaries with 'id', 'text' and optional 'metadata'
+            source: Document the chunks belong to, for remove_source() (optional)
+
+        Returns:
+            Number of chunks added
+        """
+        chunks = [c for c in chunks if c.get("text")]
+        added = 0
+        with self._lock:
+            for start in range(0, len(chunks), ADD_BATCH):
+                added += self._add_batch(chunks[start:start + ADD_BATCH], source)
+            if added:
+                self._db.commit()
+                self._save_state()
+        return added
+
+    def _add_batch(self, chunks: list, source: str) -> int:
+        ids = [str(c["id"]) for c in chunks]
+        known = self._known_ids(ids)
+        fresh, seen = [], set()
+        for chunk_id, chunk in zip(ids, chunks):
+            if chunk_id not in known and chunk_id not in seen:
+                seen.add(chunk_id)
+                fresh.append((chunk_id, chunk))
+        if not fresh:
+            return 0
+
+        tokens = [tokenize(chunk["text"]) for _, chunk in fresh]
+        self._live += len(fresh)
+        self._tokens += sum(len(t) for t in tokens)
+        avg_length = max(self._tokens / self._live, 1.0)
+
+        block = np.zeros((self.dims, len(fresh)), np.float32)
+        for column, words in enumerate(tokens):
+            counts = Counter(_bucket(word, self.dims) for word in words)
+            buckets = np.fromiter(counts.keys(), np.int64, len(counts))
+            tf = np.fromiter(counts.values(), np.float32, len(counts))
+            block[buckets, column] = _saturate(tf, len(words), avg_length)
+            self._df[buckets] += 1
+
+        start = self._count
+        self._ensure_capacity(start + len(fresh))
+        self._matrix[:, start:start + len(fresh)] = self._quantize(block)
+        self._db.executemany(
+            "INSERT INTO chunks (row, id, source, text, metadata, terms) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (start + i, chunk_id, source, chunk["text"],
+                 json.dumps(chunk.get("metadata") or {}, default=str), " ".join(words))
+                for i, ((chunk_id, chunk), words) in enumerate(zip(fresh, tokens))
+            ],
+        )
+        self._count += len(fresh)
+        return len(fresh)
+
+    def _known_ids(self, ids: list) -> set:
+        known = set()
+        for start in range(0, len(ids), SQL_BATCH):
+            batch = ids[start:start + SQL_BATCH]
+            known.update(
+                row[0] for row in self._db.execute(
+                    f"SELECT id FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+            )
+        return known
+
+    def _quantize(self, block):
+        if self.dtype == np.int8:
+            # Hash collisions can add up past k1 + 1, so clip
+            return np.clip(np.rint(block * _INT8_SCALE), 0, 127).astype(np.int8)
+        return block.astype(np.float16)
+
+    def _ensure_capacity(self, needed: int):
+        """Grow the matrix file (doubling) so it holds at least needed columns."""
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, 2 * self._capacity, 1024)
+        grown_path = self._matrix_path + ".tmp"
+        grown = np.memmap(grown_path, self.dtype, "w+", shape=(self.dims, capacity))
+        if self._matrix is not None:
+            for start in range(0, self._count, SEARCH_BLOCK):
+                end = min(self._count, start + SEARCH_BLOCK)
+                grown[:, start:end] = self._matrix[:, start:end]
+        grown.flush()
+        del grown
+        # Searches still reading the old matrix keep their mapping of the replaced file
+        os.replace(grown_path, self._matrix_path)
+        self._matrix = np.memmap(self._matrix_path, self.dtype, "r+", shape=(self.dims, capacity))
+        self._capacity = capacity
+
+    def _save_state(self):
+        # The matrix pages are written back by the OS; close() flushes them explicitly
+        np.save(self._df_path, self._df)
+        meta = {
+            "dims": self.dims,
+            "dtype": self.dtype.name,
+            "count": self._count,
+            "capacity": self._capacity,
+            "live": self._live,
+            "tokens": self._tokens,
+        }
+        with open(self._meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+
+    def remove_source(self, source: str) -> int:
+        """
+        Remove every chunk added for a source document.
+
+        Returns:
+            Number of chunks removed
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT row, terms FROM chunks WHERE source = ?", (source,)
+            ).fetchall()
+            if not rows:
+                return 0
+            for row, terms in rows:
+                words = terms.split()
+                buckets = list({_bucket(word, self.dims) for word in words})
+                self._df[buckets] -= 1
+                self._matrix[:, row] = 0
+                self._tokens -= len(words)
+            self._live -= len(rows)
+            with self._db:
+                self._db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._save_state()
+        logger.info(f"Removed {len(rows)} replica chunks of {source}")
+        return len(rows)
+
+    def search(self, queries: list, top_k: int = 10) -> list:
+        """
+        Search the index for a batch of queries.
+
+        Args:
+            queries: Query strings
+            top_k: Hits returned per query
+
+        Returns:
+            One list per query of hit dictionaries ('id', 'text', 'score',
+            'metadata') in descending score order, like Agentset search hits
+        """
+        terms = [sorted(set(tokenize(q))) for q in queries]
+        with self._lock:
+            count, matrix, live = self._count, self._matrix, self._live
+            df = self._df.copy()
+            avg_length = max(self._tokens / live, 1.0) if live else 1.0
+        buckets = sorted({_bucket(t, self.dims) for words in terms for t in words})
+        if not live or not buckets:
+            return [[] for _ in queries]
+
+        idf = np.log1p((live - df + 0.5) / (df + 0.5))
+        position = {b: i for i, b in enumerate(buckets)}
+        weighted = []
+        for words in terms:
+            own = sorted({position[_bucket(t, self.dims)] for t in words})
+            weighted.append((own, idf[[buckets[i] for i in own]].astype(np.float32)))
+
+        rows = self._candidates(matrix, buckets, weighted, count, max(4 * top_k, MIN_CANDIDATES))
+        terms_of = self._fetch_terms(sorted({int(r) for candidates in rows for r in candidates}))
+
+        ranked = []
+        for words, candidates in zip(terms, rows):
+            weight = {t: float(idf[_bucket(t, self.dims)]) for t in words}
+            ideal = sum(weight.values())
+            scored = []
+            for row in candidates:
+                tokens = terms_of.get(int(row))
+                if tokens is None:  # Removed since the matrix was read
+                    continue
+                score = 0.0
+                for t in words:
+                    tf = tokens.count(t)
+                    if tf:
+                        score += weight[t] * _saturate(tf, len(tokens), avg_length)
+                if score > 0:
+                    scored.append((min(score / ideal, 1.0), int(row)))
+            scored.sort(reverse=True)
+            ranked.append(scored[:top_k])
+
+        chunks = self._fetch_chunks(sorted({row for scored in ranked for _, row in scored}))
+        return [
+            [{**chunks[row], "score": score} for score, row in scored if row in chunks]
+            for scored in ranked
+        ]
+
+    @staticmethod
+    def _candidates(matrix, buckets: list, weighted: list, count: int, limit: int) -> list:
+        """
+        Row numbers of the best-scoring columns per query, from the hashed vectors.
+
+        weighted holds every query's (positions in buckets, IDF weights). The
+        bucket rows of a block are read once for the whole batch; a query
+        only keeps the columns beating its current limit-th best score.
+        """
+        best = [(np.empty(0, np.float32), np.empty(0, np.int64)) for _ in weighted]
+        floor = np.zeros(len(weighted), np.float32)  # Starts at 0: non-matching chunks never qualify
+        for start in range(0, count, SEARCH_BLOCK):
+            end = min(count, start + SEARCH_BLOCK)
+            # Only the query buckets' rows are read from the memory-mapped file
+            block = np.asarray(matrix[buckets, start:end])
+            for i, (own, weights) in enumerate(weighted):
+                scores = weights @ block[own].astype(np.float32)
+                rows = np.flatnonzero(scores > floor[i])
+                if not len(rows):
+                    continue
+                best_scores = np.concatenate([best[i][0], scores[rows]])
+                best_rows = np.concatenate([best[i][1], rows + start])
+                if len(best_scores) > limit:
+                    top = np.argpartition(-best_scores, limit - 1)[:limit]
+                    best_scores, best_rows = best_scores[top], best_rows[top]
+                    floor[i] = best_scores.min()
+                best[i] = (best_scores, best_rows)
+        return [rows for _, rows in best]
+
+    def _select(self, columns: str, rows: list) -> Iterable[tuple]:
+        with self._lock:
+            for start in range(0, len(rows), SQL_BATCH):
+                batch = rows[start:start + SQL_BATCH]
+                yield from self._db.execute(
+                    f"SELECT row, {columns} FROM chunks WHERE row IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+
+    def _fetch_terms(self, rows: list) -> dict:
+        """Tokens of the given rows, for exact scoring."""
+        return {row: terms.split() for row, terms in self._select("terms", rows)}
+
+    def _fetch_chunks(self, rows: list) -> dict:
+        """Hit dictionaries (without score) of the given rows."""
+        return {
+            row: {"id": chunk_id, "text": text, "metadata": json.loads(metadata)}
+            for row, chunk_id, text, metadata in self._select("id, text, metadata", rows)
+        }
+
+    def disk_bytes(self) -> int:
+        """Bytes used by the index files."""
+        return sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in os.listdir(self.path)
+            if os.path.isfile(os.path.join(self.path, name))
+        )
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            self._db.close()
+
+
+class ReplicaStore:
+    """
+    Replica indexes of several namespaces under one directory.
+
+    The directory is locked for the process that opened it; give every
+    worker process its own directory.
+
+    Args:
+        root: Directory holding one subdirectory per namespace
+        dims: Hash buckets per chunk vector of new indexes
+        dtype: "int8" or "float16" entries of new indexes
+    """
+
+    def __init__(self, root: str, dims: int = 2048, dtype: str = "int8"):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.dims = dims
+        self.dtype = dtype
+        self._dir_lock = _lock_directory(root)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, namespace_id: str) -> ReplicaIndex:
+        """Return the index of a namespace, opening or creating it on first use."""
+        with self._lock:
+            index = self._indexes.get(namespace_id)
+            if index is None:
+                name = re.sub(r"[^\w.-]", "_", namespace_id)
+                index = self._indexes[namespace_id] = ReplicaIndex(
+                    os.path.join(self.root, name), self.dims, self.dtype
+                )
+            return index
+
+    def search(self, namespace_id: str, query: str, top_k: int, min_score: float = 0.0) -> list:
+        """Hits for one query in a namespace's index, keeping those scoring at least min_score."""
+        hits = self.index(namespace_id).search([query], top_k)[0]
+        return [hit for hit in hits if hit["score"] >= min_score]
+
+    def add(self, namespace_id: str, chunks: Iterable[dict], source: str = None) -> int:
+        """Add chunks to a namespace's index (see ReplicaIndex.add)."""
+        return self.index(namespace_id).add(chunks, source)
+
+    def remove_source(self, namespace_id: str, source: str) -> int:
+        """Remove a source document's chunks from a namespace's index."""
+        return self.index(namespace_id).remove_source(source)
+
+    def chunk_count(self) -> int:
+        """Chunks held across the namespaces opened so far."""
+        with self._lock:
+            return sum(len(index) for index in self._indexes.values())
+
+    def close(self):
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
+            self._dir_lock.close()
+
@@ -0,0 +1,441 @@
+"""
+Resilience - Retries, rate-limit throttling, hedging and circuit breaking for API calls
+Shared by RAGSystem and DocumentIngester so transient Agentset and OpenAI
+failures (timeouts, 429, 5xx) are retried instead of surfacing to the user
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from email.utils import parsedate_to_datetime
+
+from agentset_gradio_demo.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Statuses where the server did not act on the request, so retrying a
+# non-idempotent call (such as creating an ingest job) cannot duplicate it
+UNPROCESSED_STATUS = {425, 429, 502, 503, 504}
+
+# Exception class names (anywhere in the MRO) of network failures raised by
+# httpx, requests and the OpenAI/Agentset SDKs; matching by name avoids
+# importing every SDK here
+_NETWORK_ERRORS = {"TransportError", "APIConnectionError", "ConnectionError", "Timeout", "TimeoutError", "NoResponseError"}
+_CONNECT_ERRORS = {"ConnectError", "ConnectTimeout", "ConnectTimeoutError"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+def _status_code(error: Exception) -> int:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(error: Exception) -> float:
+    """Seconds the server asked to wait (Retry-After header), or None."""
+    for holder in (error, getattr(error, "response", None), getattr(error, "raw_response", None)):
+        headers = getattr(holder, "headers", None)
+        value = headers.get("retry-after") if headers is not None else None
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    return None
+    return None
+
+
+def classify(error: Exception) -> tuple:
+    """
+    Decide whether a failed call may be retried.
+
+    Returns:
+        (retryable, unprocessed): retryable for transient failures;
+        unprocessed when the request certainly did not take effect, which is
+        required before retrying a non-idempotent call
+    """
+    if isinstance(error, CircuitOpenError):
+        return False, True
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS, status in UNPROCESSED_STATUS
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & _CONNECT_ERRORS:
+        return True, True
+    return bool(names & _NETWORK_ERRORS), False
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold failed calls in a row the circuit opens
+    and calls fail fast for reset_timeout seconds. Then a single probe call
+    is let through: success closes the circuit, failure opens it again.
+
+    Args:
+        name: Endpoint name used in logs and metrics
+        failure_threshold: Consecutive failed calls that open the circuit
+        reset_timeout: Seconds the circuit stays open before a probe
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or (
+                self.state == "closed" and self._failures >= self.failure_threshold
+            ):
+                logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+                metrics.inc("circuit_open_total", endpoint=self.name)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class _Endpoint:
+    """Per-endpoint breaker, rate-limit cooldown, latency window and hedge budget."""
+
+    def __init__(self, name: str, breaker: CircuitBreaker, hedge_ratio: float):
+        self.name = name
+        self.breaker = breaker
+        self.hedge_ratio = hedge_ratio
+        self.cooldown_until = 0.0
+        self.latencies = deque(maxlen=256)
+        self.hedge_tokens = 10.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> float:
+        with self.lock:
+            if len(self.latencies) < min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def take_hedge(self) -> bool:
+        """Spend hedge budget; it refills by hedge_ratio per call, so hedges stay a bounded share."""
+        with self.lock:
+            if self.hedge_tokens >= 1.0:
+                self.hedge_tokens -= 1.0
+                return True
+            return False
+
+    def refill(self):
+        with self.lock:
+            self.hedge_tokens = min(10.0, self.hedge_tokens + self.hedge_ratio)
+
+    def throttle(self, seconds: float):
+        """Hold back every caller of this endpoint until a rate limit has passed."""
+        with self.lock:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    def cooldown(self) -> float:
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+
+class Resilience:
+    """
+    Retry, throttle, hedge and circuit-break calls to named endpoints.
+
+    Transient failures (network errors, timeouts, 408/425/429/5xx) are retried
+    up to max_attempts with exponential backoff and full jitter, waiting at
+    least as long as a Retry-After header asks. A 429 also pauses every other
+    caller of the endpoint for that time instead of letting them hit the limit
+    too. Non-idempotent calls are only retried when the request provably did
+    not take effect (connection refused, 429, 502-504).
+
+    Hedged calls send a duplicate request when the first has not answered
+    after hedge_delay seconds (by default the endpoint's observed
+    hedge_quantile latency) and use whichever answers first. Hedges are
+    limited to about max_hedge_ratio of calls.
+
+    Args:
+        max_attempts: Attempts per call, including the first
+        base_delay: Backoff before the first retry in seconds (doubles per retry)
+        max_delay: Upper bound for a single backoff or Retry-After wait
+        timeouts: Per-endpoint request timeouts in seconds
+        default_timeout: Timeout for endpoints missing from timeouts
+        failure_threshold: Consecutive calls failing after retries that open an endpoint's circuit
+        reset_timeout: Seconds an open circuit waits before a probe call
+        hedge_delay: Fixed hedge delay in seconds (None adapts to observed latency)
+        hedge_quantile: Latency quantile used as the adaptive hedge delay
+        min_hedge_delay: Lower bound for the adaptive hedge delay
+        max_hedge_ratio: Share of calls that may be hedged (0 disables hedging)
+        hedge_workers: Threads running hedged synchronous calls
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 10.0,
+        timeouts: dict = None,
+        default_timeout: float = 60.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        hedge_delay: float = None,
+        hedge_quantile: float = 0.95,
+        min_hedge_delay: float = 0.02,
+        max_hedge_ratio: float = 0.1,
+        hedge_workers: int = 32,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_delay = hedge_delay
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.hedge_workers = hedge_workers
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def timeout(self, endpoint: str) -> float:
+        """Request timeout in seconds for an endpoint."""
+        return self.timeouts.get(endpoint, self.default_timeout)
+
+    def timeout_ms(self, endpoint: str) -> int:
+        """Request timeout in milliseconds (the Agentset SDK's unit)."""
+        return int(self.timeout(endpoint) * 1000)
+
+    def call(self, endpoint: str, fn, *args, idempotent: bool = True, **kwargs):
+        """
+        Call fn(*args, **kwargs) with retries and circuit breaking.
+
+        Args:
+            endpoint: Name grouping calls that share a breaker and rate limit
+            fn: The API call
+            idempotent: False for calls that must not run twice (e.g. creating a job)
+
+        Returns:
+            Whatever fn returns
+
+        Raises:
+            CircuitOpenError: If the endpoint's circuit is open
+            Exception: The last error once retries are exhausted or the error is permanent
+        """
+        state = self._endpoint(endpoint)
+        for attempt in range(1, self.max_attempts + 1):
+            wait = state.cooldown()
+            if wait:
+                time.sleep(min(wait, self.max_delay))
+            self._admit(state)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(state, e, attempt, idempotent)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            state.breaker.record_success()
+            return result
+
+    async def acall(self, endpoint: str, fn, *args, idempotent: bool = True, **kwargs):
+        """Async variant of call() for coroutine functions."""
+        state = self._endpoint(endpoint)
+        for attempt in range(1, self.max_attempts + 1):
+            wait = state.cooldown()
+            if wait:
+                await asyncio.sleep(min(wait, self.max_delay))
+            self._admit(state)
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(state, e, attempt, idempotent)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            state.breaker.record_success()
+            return result
+
+    def hedged(self, endpoint: str, fn, *args, **kwargs):
+        """call() for an idempotent, latency-critical call, hedging slow attempts."""
+        return self.call(endpoint, self._hedge, endpoint, fn, args, kwargs)
+
+    async def ahedged(self, endpoint: str, fn, *args, **kwargs):
+        """Async variant of hedged()."""
+        return await self.acall(endpoint, self._ahedge, endpoint, fn, args, kwargs)
+
+    def breaker_states(self) -> dict:
+        """Circuit state per endpoint ("closed", "open" or "half_open")."""
+        with self._lock:
+            return {name: state.breaker.state for name, state in self._endpoints.items()}
+
+    def _endpoint(self, name: str) -> _Endpoint:
+        with self._lock:
+            state = self._endpoints.get(name)
+            if state is None:
+                breaker = CircuitBreaker(name, self.failure_threshold, self.reset_timeout)
+                state = self._endpoints[name] = _Endpoint(name, breaker, self.max_hedge_ratio)
+            return state
+
+    def _admit(self, state: _Endpoint):
+        if not state.breaker.allow():
+            metrics.inc("circuit_rejections_total", endpoint=state.name)
+            raise CircuitOpenError(f"{state.name} is unavailable (circuit open), try again shortly")
+
+    def _on_error(self, state: _Endpoint, error: Exception, attempt: int, idempotent: bool) -> float:
+        """Record a failure; return the delay before retrying, or None to give up."""
+        retryable, unprocessed = classify(error)
+        give_up = not retryable or (not idempotent and not unprocessed) or attempt >= self.max_attempts
+
+        # The breaker counts calls that failed after their retries, not single
+        # attempts. Client errors and rate limits say nothing about the
+        # endpoint's health, and a failed half-open probe reopens at once.
+        status = _status_code(error)
+        if not retryable or status == 429:
+            state.breaker.record_success()
+        elif give_up or state.breaker.state == "half_open":
+            state.breaker.record_failure()
+
+        if give_up or state.breaker.state == "open":
+            return None
+
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        wait = retry_after(error)
+        if status == 429:
+            state.throttle(min(wait if wait is not None else backoff, self.max_delay))
+        delay = min(self.max_delay, max(backoff, wait or 0.0))
+        metrics.inc("retries_total", endpoint=state.name, reason=str(status or type(error).__name__))
+        logger.warning(
+            f"{state.name} call failed (attempt {attempt}/{self.max_attempts}): {str(error)}; "
+            f"retrying in {delay:.2f}s"
+        )
+        return delay
+
+    def _delay_for(self, state: _Endpoint) -> float:
+        state.refill()
+        if self.max_hedge_ratio <= 0:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        observed = state.quantile(self.hedge_quantile)
+        return None if observed is None else max(self.min_hedge_delay, observed)
+
+    def _hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.hedge_workers, thread_name_prefix="hedged-call"
+                )
+            return self._pool
+
+    def _hedge(self, endpoint: str, fn, args: tuple, kwargs: dict):
+        state = self._endpoint(endpoint)
+        delay = self._delay_for(state)
+        start = time.perf_counter()
+        if delay is None:
+            result = fn(*args, **kwargs)
+            state.observe(time.perf_counter() - start)
+            return result
+
+        pool = self._hedge_pool()
+        first = pool.submit(fn, *args, **kwargs)
+        # The delay adapts to how long first attempts take, even ones that lose to a hedge
+        first.add_done_callback(
+            lambda f: f.exception() is None and state.observe(time.perf_counter() - start)
+        )
+        done, _ = wait_futures([first], timeout=delay)
+        if done or not state.take_hedge():
+            return first.result()
+
+        metrics.inc("hedges_total", endpoint=endpoint)
+        second = pool.submit(fn, *args, **kwargs)
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        metrics.inc("hedge_wins_total", endpoint=endpoint)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _ahedge(self, endpoint: str, fn, args: tuple, kwargs: dict):
+        state = self._endpoint(endpoint)
+        delay = self._delay_for(state)
+        start = time.perf_counter()
+        if delay is None:
+            result = await fn(*args, **kwargs)
+            state.observe(time.perf_counter() - start)
+            return result
+
+        first = asyncio.ensure_future(fn(*args, **kwargs))
+        first.add_done_callback(
+            lambda t: not t.cancelled() and t.exception() is None and state.observe(time.perf_counter() - start)
+        )
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not state.take_hedge():
+                return await first
+
+            metrics.inc("hedges_total", endpoint=endpoint)
+            second = asyncio.ensure_future(fn(*args, **kwargs))
+            pending, error = {first, second}, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            metrics.inc("hedge_wins_total", endpoint=endpoint)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
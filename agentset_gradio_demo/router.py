@@ -0,0 +1,198 @@
+"""
+Router - Per-question model choice from cheap local signals
+Short lookups with a clear best source go to a fast model and long or
+reasoning-heavy questions to a stronger one; a model whose observed latency
+breaks the SLO hands its traffic to a faster tier
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from agentset_gradio_demo.context_builder import CHARS_PER_TOKEN
+from agentset_gradio_demo.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+AUTO_MODEL = "auto"  # Model setting that routes every question
+
+# Fastest first; a question goes to the first tier whose limits all hold
+DEFAULT_TIERS = (
+    {
+        "name": "fast",
+        "model": "gpt-4o-mini",
+        "max_query_words": 16,
+        "max_context_tokens": 1500,
+        "min_score_spread": 0.15,
+        "reasoning": False,
+    },
+    {
+        "name": "standard",
+        "model": "gpt-4o",
+        "max_query_words": 60,
+        "max_context_tokens": 6000,
+        "reasoning": False,
+    },
+    {"name": "reasoning", "model": "gpt-5.1"},
+)
+
+_REASONING = re.compile(
+    r"\b(why|how (?:does|do|did|would|could|can)|compare[ds]?|comparison|differen(?:ce|ces|t)|"
+    r"explain|analy[sz]e|evaluate|implications?|trade-?offs?|pros and cons|step by step|"
+    r"should (?:i|we))\b",
+    re.IGNORECASE,
+)
+
+
+def route_signals(query: str, chunks: list = None, context: str = "") -> dict:
+    """
+    Local signals describing how demanding a question is.
+
+    Args:
+        query: User's question
+        chunks: Selected ContextChunks (optional)
+        context: Context string, used for its size when chunks are not given
+
+    Returns:
+        Dictionary with 'query_words', 'context_tokens', 'score_spread'
+        (top search score minus the median of the others, the same for fused
+        multi-query or multi-namespace results; None when unknown) and
+        'reasoning' (the question asks for explanation or comparison)
+    """
+    if chunks is None:
+        context_tokens, spread = len(context) // CHARS_PER_TOKEN, None
+    else:
+        context_tokens = sum(c.tokens for c in chunks)
+        scores = sorted((c.score or 0.0 for c in chunks), reverse=True)
+        if not scores:
+            spread = 1.0  # Nothing retrieved: nothing to reason over
+        elif len(scores) == 1:
+            spread = scores[0]
+        else:
+            spread = scores[0] - scores[1:][len(scores[1:]) // 2]
+    return {
+        "query_words": len(query.split()),
+        "context_tokens": context_tokens,
+        "score_spread": spread,
+        "reasoning": bool(_REASONING.search(query)),
+    }
+
+
+def _fits(tier: dict, signals: dict) -> bool:
+    if signals["query_words"] > tier.get("max_query_words", float("inf")):
+        return False
+    if signals["context_tokens"] > tier.get("max_context_tokens", float("inf")):
+        return False
+    spread = signals["score_spread"]
+    if spread is not None and spread < tier.get("min_score_spread", 0.0):
+        return False
+    return tier.get("reasoning", True) or not signals["reasoning"]
+
+
+class ModelRouter:
+    """
+    Chooses the model for each question and tracks every model's latency.
+
+    Latency is kept per model for streamed answers (time to first token)
+    and full answers separately, over a sliding window. When the chosen
+    tier's p95 is over its SLO, the question goes to the next faster tier
+    within its SLO (the fastest tier if none is). probe_ratio of those
+    questions still go to the slow model, so its p95 is refreshed and it
+    takes its traffic back once it recovers.
+
+    Args:
+        tiers: Tier dictionaries, fastest first, with 'name', 'model' and optional
+            limits 'max_query_words', 'max_context_tokens', 'min_score_spread'
+            and 'reasoning' (False keeps reasoning questions out); the last
+            tier should have no limits
+        latency_slo: p95 seconds allowed for a full answer
+        first_token_slo: p95 seconds allowed until the first streamed token
+        window: Seconds of latency samples the p95 is computed from
+        min_samples: Samples needed before a model's p95 is trusted
+        probe_ratio: Share of fallback decisions sent to the slow model anyway
+    """
+
+    def __init__(
+        self,
+        tiers: list = DEFAULT_TIERS,
+        latency_slo: float = 20.0,
+        first_token_slo: float = 4.0,
+        window: float = 300.0,
+        min_samples: int = 20,
+        probe_ratio: float = 0.05,
+    ):
+        if not tiers:
+            raise ValueError("ModelRouter needs at least one tier")
+        self.tiers = list(tiers)
+        self.latency_slo = latency_slo
+        self.first_token_slo = first_token_slo
+        self.window = window
+        self.min_samples = min_samples
+        self.probe_ratio = probe_ratio
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def fastest(self) -> str:
+        """Model of the fastest tier (for side tasks such as query expansion)."""
+        return self.tiers[0]["model"]
+
+    def choose(self, query: str, chunks: list = None, context: str = "", streaming: bool = False) -> str:
+        """
+        Pick the model for one question.
+
+        Args:
+            query: User's question
+            chunks: Selected ContextChunks (optional)
+            context: Context string, used when chunks are not given
+            streaming: The answer is streamed (judged by time to first token)
+
+        Returns:
+            Model name
+        """
+        signals = route_signals(query, chunks, context)
+        index = next(
+            (i for i, tier in enumerate(self.tiers) if _fits(tier, signals)), len(self.tiers) - 1
+        )
+        tier, reason = self.tiers[index], "signals"
+
+        if index and self.p95(tier["model"], streaming) > self._slo(streaming):
+            if random.random() < self.probe_ratio:
+                reason = "probe"
+            else:
+                faster = [t for t in self.tiers[:index] if self.p95(t["model"], streaming) <= self._slo(streaming)]
+                tier, reason = (faster[-1] if faster else self.tiers[0]), "slo_fallback"
+
+        metrics.inc("model_routes_total", model=tier["model"], tier=tier["name"], reason=reason)
+        logger.info(
+            f"Routed '{query}' to {tier['model']} ({tier['name']}, {reason}): "
+            f"{signals['query_words']} words, {signals['context_tokens']} context tokens"
+        )
+        return tier["model"]
+
+    def observe(self, model: str, seconds: float, streaming: bool = False):
+        """Record how long a model took (to the first token when streaming)."""
+        kind = "first_token" if streaming else "answer"
+        metrics.observe("model_latency_seconds", seconds, model=model, kind=kind)
+        with self._lock:
+            samples = self._samples.setdefault((model, streaming), deque(maxlen=1024))
+            samples.append((time.monotonic(), seconds))
+
+    def p95(self, model: str, streaming: bool = False) -> float:
+        """Windowed p95 latency of a model in seconds (0 until min_samples are seen)."""
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            samples = self._samples.get((model, streaming))
+            if samples is None:
+                return 0.0
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            values = sorted(seconds for _, seconds in samples)
+        if len(values) < self.min_samples:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * 0.95))]
+
+    def _slo(self, streaming: bool) -> float:
+        return self.first_token_slo if streaming else self.latency_slo
@@ -0,0 +1,231 @@
+"""
+Sync - Directory scanning and change watching for folder sync
+Finds the files of a tree that a sync should consider and collects file
+system changes into debounced batches for DocumentIngester.watch_directory
+"""
+
+import fnmatch
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+def path_filter(
+    root: str, include: Iterable = None, exclude: Iterable = None, include_hidden: bool = False
+) -> Callable[[str], bool]:
+    """
+    Build a predicate deciding whether a file under root takes part in a sync.
+
+    Patterns are shell globs matched against the path relative to root (with
+    "/" separators) and against the file name, so "*.pdf" and "docs/*.md" both work.
+
+    Args:
+        root: Directory being synced
+        include: Patterns a file must match (all files when empty)
+        exclude: Patterns that rule a file out
+        include_hidden: Also sync files and folders whose name starts with "."
+
+    Returns:
+        Function taking an absolute path and returning True if it is synced
+    """
+    root = os.path.abspath(root)
+    include, exclude = list(include or []), list(exclude or [])
+
+    def matches(path: str, patterns: list) -> bool:
+        relative = os.path.relpath(path, root).replace(os.sep, "/")
+        name = os.path.basename(path)
+        return any(fnmatch.fnmatch(relative, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+    def accept(path: str) -> bool:
+        relative = os.path.relpath(path, root)
+        if relative.startswith(os.pardir):
+            return False
+        if not include_hidden and any(part.startswith(".") for part in relative.split(os.sep)):
+            return False
+        if include and not matches(path, include):
+            return False
+        return not (exclude and matches(path, exclude))
+
+    return accept
+
+
+def scan_directory(root: str, accept: Callable[[str], bool] = None) -> dict:
+    """
+    List the regular files under a directory with their stat results.
+
+    Symlinked directories are not followed, so a link cannot make the scan loop.
+
+    Args:
+        root: Directory to scan
+        accept: Predicate from path_filter (every file when None)
+
+    Returns:
+        Dictionary mapping absolute file paths to os.stat_result
+    """
+    files = {}
+    pending = [os.path.abspath(root)]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file() and (accept is None or accept(entry.path)):
+                            files[entry.path] = entry.stat()
+                    except OSError as e:
+                        logger.warning(f"Skipping {entry.path}: {str(e)}")
+        except OSError as e:
+            logger.warning(f"Could not scan directory: {str(e)}")
+    return files
+
+
+class DirectoryWatcher:
+    """
+    Collects changed paths under a directory into coalesced batches.
+
+    Changes come from file system events (inotify, FSEvents or
+    ReadDirectoryChangesW through the optional watchdog package) or, without
+    watchdog, from comparing size and mtime of every file each poll_interval
+    seconds. Repeated events for one path collapse into a single entry. A
+    batch is released once no new change arrived for `debounce` seconds, or
+    `max_delay` seconds after its first change while the tree keeps changing.
+
+    Args:
+        root: Directory to watch (recursively)
+        accept: Predicate from path_filter for the files of interest
+        debounce: Quiet seconds before a batch is released
+        max_delay: Upper bound in seconds for holding back a batch
+        poll_interval: Seconds between scans when polling
+        use_events: Use file system events when watchdog is installed
+    """
+
+    def __init__(
+        self,
+        root: str,
+        accept: Callable[[str], bool] = None,
+        debounce: float = 2.0,
+        max_delay: float = 30.0,
+        poll_interval: float = 5.0,
+        use_events: bool = True,
+    ):
+        self.root = os.path.abspath(root)
+        self.accept = accept
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_events = use_events
+        self.events = 0
+        self._pending = set()
+        self._first_at = None
+        self._last_at = None
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def start(self) -> "DirectoryWatcher":
+        """Start watching; changes made from now on show up in next_batch()."""
+        if self.use_events and self._start_observer():
+            logger.info(f"Watching {self.root} with file system events")
+        else:
+            logger.info(f"Watching {self.root} by polling every {self.poll_interval}s")
+            snapshot = self._snapshot()
+            self._thread = threading.Thread(
+                target=self._poll, args=(snapshot,), name="directory-watcher", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
+        with self._cond:
+            self._cond.notify_all()
+
+    def add(self, path: str):
+        """Record a changed (created, modified, moved or deleted) path."""
+        with self._cond:
+            now = time.monotonic()
+            self.events += 1
+            if not self._pending:
+                self._first_at = now
+            self._pending.add(os.path.abspath(path))
+            self._last_at = now
+            self._cond.notify_all()
+
+    def next_batch(self, timeout: float = None) -> set:
+        """
+        Wait for the next batch of changed paths.
+
+        Args:
+            timeout: Seconds to wait at most (None waits until stopped)
+
+        Returns:
+            Set of absolute paths (files or directories, possibly deleted),
+            or an empty set on timeout or when stopped
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._stopped.is_set():
+                now = time.monotonic()
+                if self._pending:
+                    ready_at = min(self._last_at + self.debounce, self._first_at + self.max_delay)
+                    if now >= ready_at:
+                        batch, self._pending = self._pending, set()
+                        return batch
+                    wait = ready_at - now
+                else:
+                    wait = None
+                if deadline is not None:
+                    if now >= deadline:
+                        return set()
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._cond.wait(wait)
+        return set()
+
+    def _start_observer(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ("opened", "closed_no_write"):
+                    return
+                if event.is_directory and event.event_type == "modified":
+                    return  # A file inside changed, which has its own event
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        watcher.add(os.fsdecode(path))
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), self.root, recursive=True)
+        self._observer.start()
+        return True
+
+    def _snapshot(self) -> dict:
+        return {
+            path: (stat.st_size, stat.st_mtime_ns)
+            for path, stat in scan_directory(self.root, self.accept).items()
+        }
+
+    def _poll(self, snapshot: dict):
+        while not self._stopped.wait(self.poll_interval):
+            current = self._snapshot()
+            for path in current.keys() | snapshot.keys():
+                if current.get(path) != snapshot.get(path):
+                    self.add(path)
+            snapshot = current
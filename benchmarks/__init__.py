@@ -0,0 +1 @@
+"""Offline benchmarks for agentset-gradio-demo, run against local stub servers"""
@@ -0,0 +1,71 @@
+"""
+Benchmark: concurrent RAG queries through the sync (thread pool) and async pipelines
+
+Usage:
+    python -m benchmarks.bench_async_concurrency --users 200 --threads 16 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agentset_gradio_demo import config
+from agentset_gradio_demo.client_pool import ClientRegistry
+from benchmarks.common import summarize
+from benchmarks.stub_servers import AgentsetStub, OpenAIStub
+
+
+def run_sync(registry: ClientRegistry, users: int, threads: int) -> dict:
+    rag = registry.get_rag_system("ns_bench", "token", "sk-bench", config.SYSTEM_PROMPT)
+
+    def one(i):
+        start = time.perf_counter()
+        rag.query(f"question {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(users)))
+    wall = time.perf_counter() - start
+    return {"wall_s": round(wall, 3), "qps": round(users / wall, 2), **summarize(latencies)}
+
+
+async def run_async(registry: ClientRegistry, users: int) -> dict:
+    rag = registry.get_async_rag_system("ns_bench", "token", "sk-bench", config.SYSTEM_PROMPT)
+
+    async def one(i):
+        start = time.perf_counter()
+        await rag.aquery(f"question {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(users)))
+    wall = time.perf_counter() - start
+    return {"wall_s": round(wall, 3), "qps": round(users / wall, 2), **summarize(latencies)}
+
+
+def run(users: int, threads: int, latency: float) -> dict:
+    with AgentsetStub(latency=latency) as agentset, OpenAIStub(latency=latency) as openai_stub:
+        config.AGENTSET_BASE_URL, config.OPENAI_BASE_URL = agentset.url, f"{openai_stub.url}/v1"
+        registry = ClientRegistry()
+        return {
+            "users": users,
+            "stub_latency_s": latency,
+            f"sync_{threads}_threads": run_sync(registry, users, threads),
+            "async": asyncio.run(run_async(registry, users)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="Concurrent chats")
+    parser.add_argument("--threads", type=int, default=16, help="Worker threads for the sync run")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub server latency (s)")
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.threads, args.latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
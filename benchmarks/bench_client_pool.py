@@ -0,0 +1,66 @@
+"""
+Benchmark: per-chat-turn latency with fresh clients vs. the pooled client registry
+
+Usage:
+    python -m benchmarks.bench_client_pool --turns 200
+"""
+
+import argparse
+import json
+import time
+
+from agentset import Agentset
+from openai import OpenAI as OpenAIClient
+
+from agentset_gradio_demo import config
+from agentset_gradio_demo.client_pool import ClientRegistry
+from agentset_gradio_demo.rag_system import RAGSystem
+from benchmarks.common import summarize
+from benchmarks.stub_servers import AgentsetStub, OpenAIStub
+
+
+def fresh_rag_system(agentset_url: str, openai_url: str) -> RAGSystem:
+    """Build a RAGSystem the way the app did before pooling: new clients every turn."""
+    return RAGSystem(
+        "ns_bench",
+        "token",
+        "sk-bench",
+        config.SYSTEM_PROMPT,
+        openai_client=OpenAIClient(api_key="sk-bench", base_url=openai_url),
+        agentset_client=Agentset(namespace_id="ns_bench", token="token", server_url=agentset_url),
+    )
+
+
+def run(turns: int, latency: float) -> dict:
+    with AgentsetStub(latency=latency) as agentset, OpenAIStub(latency=latency) as openai_stub:
+        openai_url = f"{openai_stub.url}/v1"
+        config.AGENTSET_BASE_URL, config.OPENAI_BASE_URL = agentset.url, openai_url
+
+        fresh = []
+        for i in range(turns):
+            start = time.perf_counter()
+            fresh_rag_system(agentset.url, openai_url).query(f"question {i}")
+            fresh.append(time.perf_counter() - start)
+
+        registry = ClientRegistry()
+        pooled = []
+        for i in range(turns):
+            start = time.perf_counter()
+            registry.get_rag_system("ns_bench", "token", "sk-bench", config.SYSTEM_PROMPT).query(
+                f"question {i}"
+            )
+            pooled.append(time.perf_counter() - start)
+
+    return {"turns": turns, "fresh": summarize(fresh), "pooled": summarize(pooled)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub server latency (s)")
+    args = parser.parse_args()
+    print(json.dumps(run(args.turns, args.latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
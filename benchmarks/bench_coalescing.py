@@ -0,0 +1,117 @@
+"""
+Benchmark: bursts of identical questions with and without request coalescing
+
+Every burst sends --sessions concurrent questions drawn from --distinct
+popular questions, through the streaming async pipeline the chat handler
+uses and through the sync pipeline in a thread pool. Caches are off, so
+every saving comes from single-flight coalescing. Reports the upstream
+requests (searches and completions) per mode and the reduction factor,
+latency percentiles, and whether every session got the complete answer.
+
+Usage:
+    python -m benchmarks.bench_coalescing --sessions 64 --distinct 4 --bursts 5
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agentset_gradio_demo import config
+from agentset_gradio_demo.client_pool import ClientRegistry
+from benchmarks.common import summarize
+from benchmarks.stub_servers import AgentsetStub, OpenAIStub
+
+
+def _questions(sessions: int, distinct: int, burst: int) -> list:
+    # Case and punctuation differ between sessions; the normalized key does not
+    variants = ["What is {}?", "what is {}", "WHAT IS {}?!"]
+    return [
+        variants[i % len(variants)].format(f"topic {burst}-{i % distinct}")
+        for i in range(sessions)
+    ]
+
+
+async def _async_bursts(registry: ClientRegistry, sessions: int, distinct: int, bursts: int) -> tuple:
+    rag = registry.get_async_rag_system("ns_bench", "token", "sk-bench", config.SYSTEM_PROMPT)
+
+    async def one(question):
+        start = time.perf_counter()
+        answer = ""
+        async for event in rag.astream_query(question):
+            if event["type"] == "done":
+                answer = event["response"]
+        return time.perf_counter() - start, answer
+
+    outcomes = []
+    for burst in range(bursts):
+        outcomes += await asyncio.gather(*(one(q) for q in _questions(sessions, distinct, burst)))
+    return outcomes
+
+
+def _sync_bursts(registry: ClientRegistry, sessions: int, distinct: int, bursts: int) -> list:
+    rag = registry.get_rag_system("ns_bench", "token", "sk-bench", config.SYSTEM_PROMPT)
+
+    def one(question):
+        start = time.perf_counter()
+        answer = rag.query(question)["response"]
+        return time.perf_counter() - start, answer
+
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        for burst in range(bursts):
+            outcomes += pool.map(one, _questions(sessions, distinct, burst))
+    return outcomes
+
+
+def run_mode(pipeline: str, coalesce: bool, args, stubs: tuple, expected_words: int) -> dict:
+    config.COALESCE_REQUESTS = coalesce
+    registry = ClientRegistry()
+    before = [stub.request_count for stub in stubs]
+    start = time.perf_counter()
+    if pipeline == "async":
+        outcomes = asyncio.run(_async_bursts(registry, args.sessions, args.distinct, args.bursts))
+    else:
+        outcomes = _sync_bursts(registry, args.sessions, args.distinct, args.bursts)
+    wall = time.perf_counter() - start
+    searches, completions = (stub.request_count - b for stub, b in zip(stubs, before))
+    return {
+        "wall_s": round(wall, 3),
+        "searches": searches,
+        "completions": completions,
+        "complete_answers": sum(1 for _, answer in outcomes if len(answer.split()) == expected_words),
+        **summarize([latency for latency, _ in outcomes]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=64, help="Concurrent questions per burst")
+    parser.add_argument("--distinct", type=int, default=4, help="Distinct questions per burst")
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub server latency (s)")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="Delay between streamed tokens (s)")
+    parser.add_argument("--completion-words", type=int, default=50, help="Words per answer")
+    args = parser.parse_args()
+
+    with AgentsetStub(latency=args.latency) as agentset, OpenAIStub(
+        latency=args.latency, completion_words=args.completion_words, token_interval=args.token_interval
+    ) as openai_stub:
+        config.AGENTSET_BASE_URL, config.OPENAI_BASE_URL = agentset.url, f"{openai_stub.url}/v1"
+        report = {"sessions": args.sessions, "distinct": args.distinct, "bursts": args.bursts}
+        for pipeline in ("async", "sync"):
+            off = run_mode(pipeline, False, args, (agentset, openai_stub), args.completion_words)
+            on = run_mode(pipeline, True, args, (agentset, openai_stub), args.completion_words)
+            upstream_off = off["searches"] + off["completions"]
+            upstream_on = on["searches"] + on["completions"]
+            report[pipeline] = {
+                "off": off,
+                "on": on,
+                "upstream_reduction": round(upstream_off / upstream_on, 2) if upstream_on else None,
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark: end-to-end load test of the Gradio app through its request queue
+
+Starts the real app (FastAPI + Gradio queue) and the local stubs in their own
+processes and drives the app with gradio_client sessions. Each session saves its own configuration
+(per-session state) and sends chat messages, while a separate session issues job
+status checks to show that chat load does not starve the other event groups.
+
+Usage:
+    python -m benchmarks.bench_load --levels 1 2 4 8 16 32 --messages 4 --latency 0.2
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import summarize
+
+NAMESPACE, TOKEN, OPENAI_KEY = "ns_bench", "token", "sk-bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_stubs(latency: float):
+    """Run the stub servers in a child process; returns (urls, process)."""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_servers", "--latency", str(latency)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return json.loads(proc.stdout.readline()), proc
+
+
+def _start_app(port: int, urls: dict):
+    """Serve the app with uvicorn in a child process pointed at the stubs."""
+    env = dict(os.environ, AGENTSET_BASE_URL=urls["agentset_url"], OPENAI_BASE_URL=urls["openai_url"])
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "agentset_gradio_demo.app:create_app", "--factory",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/config", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("App did not start within 60s")
+
+
+def _session(url: str, namespace: str = NAMESPACE):
+    from gradio_client import Client
+
+    client = Client(url, verbose=False)
+    client.predict(OPENAI_KEY, TOKEN, namespace, api_name="/save_config")
+    return client
+
+
+def run_level(clients: list, status_client, users: int, messages: int) -> dict:
+    """Run `messages` chats on each of `users` sessions while polling job status."""
+    chat_latencies, status_latencies = [], []
+    stop = threading.Event()
+
+    def chat_user(u):
+        for m in range(messages):
+            start = time.perf_counter()
+            clients[u].predict(f"load question {users}-{u}-{m}", api_name="/chat")
+            chat_latencies.append(time.perf_counter() - start)
+
+    def poll_status():
+        while not stop.is_set():
+            start = time.perf_counter()
+            status_client.predict("job-load", api_name="/check_status")
+            status_latencies.append(time.perf_counter() - start)
+            time.sleep(0.05)
+
+    poller = threading.Thread(target=poll_status)
+    poller.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(chat_user, range(users)))
+    wall = time.perf_counter() - start
+    stop.set()
+    poller.join()
+
+    return {
+        "users": users,
+        "chats": len(chat_latencies),
+        "wall_s": round(wall, 3),
+        "chat_throughput_rps": round(len(chat_latencies) / wall, 2),
+        "chat": summarize(chat_latencies),
+        "status_check": summarize(status_latencies),
+    }
+
+
+def run(levels: list, messages: int, latency: float) -> dict:
+    urls, stubs = _start_stubs(latency)
+    port = _free_port()
+    try:
+        app = _start_app(port, urls)
+        try:
+            url = f"http://127.0.0.1:{port}/"
+            clients = [_session(url) for _ in range(max(levels))]
+            status_client = _session(url)
+            return {
+                "stub_latency_s": latency,
+                "messages_per_user": messages,
+                "levels": [run_level(clients, status_client, users, messages) for users in levels],
+            }
+        finally:
+            app.terminate()
+    finally:
+        stubs.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+                        help="Concurrent sessions per step")
+    parser.add_argument("--messages", type=int, default=4, help="Chat messages per session")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub server latency (s)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(json.dumps(run(args.levels, args.messages, args.latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
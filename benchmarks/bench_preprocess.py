@@ -0,0 +1,126 @@
+"""
+Benchmark: local text extraction and chunking throughput
+
+Generates a mixed corpus of html/md/txt/csv/jsonl files and runs
+preprocess_file over it in-process and in process pools of increasing size.
+Reports MB/s of input overall and per worker core, and how much smaller the
+extracted text is than the raw files that would otherwise be uploaded.
+
+Usage:
+    python -m benchmarks.bench_preprocess --mb 64 --workers 1 2 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agentset_gradio_demo.preprocess import preprocess_file
+
+WORDS = (
+    "agentset retrieval namespace ingestion document chunk embedding vector search query "
+    "answer context latency throughput pipeline worker process thread cache manifest"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+
+
+def _write_file(path: str, kind: str, size: int, rng: random.Random):
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        if kind == "html":
+            written += f.write("<html><head><style>body{margin:0}</style><script>var x = 1;</script></head><body>")
+            written += f.write("<nav><a href='/'>Home</a> <a href='/docs'>Docs</a></nav>")
+        elif kind == "csv":
+            written += f.write("id,title,body,score\n")
+        page = 0
+        while written < size:
+            if kind == "html":
+                written += f.write(f"<div class='c'><h2>Section {page}</h2><p>{_paragraph(rng)}</p></div>")
+                written += f.write("<div class='footer'>Copyright Example Inc. All rights reserved.</div>")
+            elif kind == "md":
+                written += f.write(f"## Section {page}\n\n{_paragraph(rng)} See [the docs](https://example.com/{page}).\n\n")
+            elif kind == "txt":
+                written += f.write(f"{_paragraph(rng)}\n\nExample Corp - Confidential\n\n")
+            elif kind == "csv":
+                written += f.write(f"{page},Row {page},\"{_sentence(rng)}\",{rng.random():.3f}\n")
+            else:
+                written += f.write(json.dumps({"id": page, "meta": {"tags": WORDS[:3]}, "text": _paragraph(rng)}) + "\n")
+            page += 1
+        if kind == "html":
+            f.write("<footer>Example Inc.</footer></body></html>")
+
+
+def make_corpus(directory: str, total_mb: float, file_kb: int) -> list:
+    """Write a mixed corpus of about total_mb megabytes; returns the file paths."""
+    rng = random.Random(0)
+    kinds = ["html", "md", "txt", "csv", "jsonl"]
+    paths, total, i = [], 0, 0
+    while total < total_mb * 1024 * 1024:
+        kind = kinds[i % len(kinds)]
+        path = os.path.join(directory, f"doc-{i}.{kind}")
+        _write_file(path, kind, file_kb * 1024, rng)
+        total += os.path.getsize(path)
+        paths.append(path)
+        i += 1
+    return paths
+
+
+def _summary(results: list, wall: float, cores: int) -> dict:
+    bytes_in = sum(r["bytes_in"] for r in results)
+    chars_out = sum(r["chars_out"] for r in results)
+    mb_per_s = bytes_in / wall / 1e6 if wall else 0.0
+    return {
+        "cores": cores,
+        "wall_s": round(wall, 3),
+        "mb_per_s": round(mb_per_s, 2),
+        "mb_per_s_per_core": round(mb_per_s / cores, 2),
+        "parts": sum(len(r["parts"]) for r in results),
+        "output_ratio": round(chars_out / bytes_in, 3) if bytes_in else 0.0,
+    }
+
+
+def run(total_mb: float, file_kb: int, workers: list, max_chars: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_corpus(directory, total_mb, file_kb)
+        report = {"files": len(paths), "input_mb": round(sum(map(os.path.getsize, paths)) / 1e6, 2)}
+
+        start = time.perf_counter()
+        results = [preprocess_file(path, max_chars) for path in paths]
+        report["in_process"] = _summary(results, time.perf_counter() - start, 1)
+
+        report["pool"] = []
+        for count in workers:
+            with ProcessPoolExecutor(count, mp_context=multiprocessing.get_context("spawn")) as pool:
+                list(pool.map(preprocess_file, paths[:count]))  # Start the workers before timing
+                start = time.perf_counter()
+                results = list(pool.map(preprocess_file, paths, [max_chars] * len(paths), chunksize=4))
+                wall = time.perf_counter() - start
+            report["pool"].append(
+                {"workers": count, **_summary(results, wall, min(count, os.cpu_count() or 1))}
+            )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=64, help="Corpus size in MB")
+    parser.add_argument("--file-kb", type=int, default=256, help="Size of every file in KB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to run")
+    parser.add_argument("--max-chars", type=int, default=32000, help="Characters per TEXT part")
+    args = parser.parse_args()
+    print(json.dumps(run(args.mb, args.file_kb, args.workers, args.max_chars), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: local replica query latency at 100k and 1M chunks
+
+Builds a replica index of synthetic chunks (words drawn from a Zipf
+distribution over a fixed vocabulary) for every size and matrix dtype,
+then times single queries and batches of --batch queries against the
+warm, memory-mapped index. Every query is a handful of words taken from
+one chunk; "recall_at_k" is the share of queries whose source chunk is
+among the top-k hits. Reports build time, disk size and latency.
+
+Usage:
+    python -m benchmarks.bench_replica --sizes 100000,1000000 --dtypes int8,float16
+"""
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from agentset_gradio_demo.replica import ReplicaIndex
+from benchmarks.common import summarize
+
+ADD_STEP = 50000  # Chunks generated and added per add() call
+
+
+def _vocabulary(size: int, rng: random.Random) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def _chunks(start: int, count: int, vocabulary: list, words_per_chunk: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(words_per_chunk // 2, words_per_chunk * 3 // 2, count)
+    # The Zipf tail wraps around the vocabulary
+    draws = ((rng.zipf(1.2, lengths.sum()) - 1) % len(vocabulary)).tolist()
+    chunks, offset = [], 0
+    for i, length in enumerate(lengths):
+        words = draws[offset:offset + length]
+        offset += length
+        chunks.append({"id": f"chunk-{start + i}", "text": " ".join(vocabulary[w] for w in words)})
+    return chunks
+
+
+def _queries(index: ReplicaIndex, size: int, count: int, seed: int) -> list:
+    """(query, source chunk ID) pairs: 3-5 distinct words of random chunks."""
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count:
+        chunk_id = f"chunk-{rng.randrange(size)}"
+        row = index._db.execute("SELECT text FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+        words = sorted(set(row[0].split()))
+        if len(words) >= 3:
+            queries.append((" ".join(rng.sample(words, min(len(words), rng.randint(3, 5)))), chunk_id))
+    return queries
+
+
+def run_case(size: int, dtype: str, args, vocabulary: list) -> dict:
+    path = tempfile.mkdtemp(prefix="agentset-replica-bench-")
+    try:
+        index = ReplicaIndex(path, dims=args.dims, dtype=dtype)
+        start = time.perf_counter()
+        for offset in range(0, size, ADD_STEP):
+            count = min(ADD_STEP, size - offset)
+            index.add(_chunks(offset, count, vocabulary, args.words_per_chunk, offset))
+        build = time.perf_counter() - start
+
+        queries = _queries(index, size, args.queries, seed=size)
+        index.search([q for q, _ in queries[:8]], args.top_k)  # Warm the page cache
+
+        single, found = [], 0
+        for query, chunk_id in queries:
+            start = time.perf_counter()
+            hits = index.search([query], args.top_k)[0]
+            single.append(time.perf_counter() - start)
+            found += any(hit["id"] == chunk_id for hit in hits)
+
+        batched = []
+        for i in range(0, len(queries), args.batch):
+            batch = [q for q, _ in queries[i:i + args.batch]]
+            start = time.perf_counter()
+            index.search(batch, args.top_k)
+            batched.append((time.perf_counter() - start) / len(batch))
+
+        return {
+            "build_s": round(build, 1),
+            "disk_mb": round(index.disk_bytes() / 2**20, 1),
+            "recall_at_k": round(found / len(queries), 3),
+            "single": summarize(single),
+            "batched_per_query": summarize(batched),
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated chunk counts")
+    parser.add_argument("--dtypes", default="int8,float16", help="Comma-separated matrix dtypes")
+    parser.add_argument("--dims", type=int, default=2048, help="Hash buckets per chunk vector")
+    parser.add_argument("--vocabulary", type=int, default=50000, help="Distinct words in the corpus")
+    parser.add_argument("--words-per-chunk", type=int, default=80, help="Average words per chunk")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32, help="Queries per batched search")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    vocabulary = _vocabulary(args.vocabulary, random.Random(0))
+    report = {"dims": args.dims, "words_per_chunk": args.words_per_chunk, "top_k": args.top_k}
+    for size in (int(s) for s in args.sizes.split(",")):
+        for dtype in args.dtypes.split(","):
+            report[f"{size}/{dtype}"] = run_case(size, dtype, args, vocabulary)
+            print(json.dumps({f"{size}/{dtype}": report[f"{size}/{dtype}"]}), flush=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: RAG turns against degraded stub APIs with and without the resilience layer
+
+Both stubs answer a share of requests with 503 or 429 (with Retry-After);
+the Agentset stub also stalls a share of requests for --slow-latency seconds
+(OpenAI calls are never hedged, so stalling them would only add the same
+tail to both modes). Each mode runs the same turns: "off" makes single
+attempts without hedging, "on" uses the configured retries, rate-limit
+throttling and search hedging. Reports the error rate, latency percentiles
+of successful turns and the requests sent.
+
+Usage:
+    python -m benchmarks.bench_resilience --turns 1000 --error-rate 0.05 --slow-rate 0.05
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agentset_gradio_demo import config
+from agentset_gradio_demo.client_pool import ClientRegistry, _resilience
+from agentset_gradio_demo.resilience import Resilience
+from benchmarks.common import summarize
+from benchmarks.stub_servers import AgentsetStub, OpenAIStub
+
+
+def run_mode(resilience: Resilience, operation: str, turns: int, threads: int, stubs: tuple) -> dict:
+    registry = ClientRegistry(resilience=resilience)
+    rag = registry.get_rag_system("ns_bench", "token", "sk-bench", config.SYSTEM_PROMPT)
+    requests_before = sum(stub.request_count for stub in stubs)
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            if operation == "retrieve":
+                rag.retrieve(f"question {i}")
+            else:
+                rag.query(f"question {i}")
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(one, range(turns)))
+    wall = time.perf_counter() - start
+
+    latencies = [o for o in outcomes if o is not None]
+    return {
+        "wall_s": round(wall, 3),
+        "error_rate": round(1 - len(latencies) / turns, 4),
+        "requests_sent": sum(stub.request_count for stub in stubs) - requests_before,
+        **summarize(latencies),
+    }
+
+
+def run(turns: int, threads: int, latency: float, faults: dict) -> dict:
+    with AgentsetStub(latency=latency) as agentset, OpenAIStub(latency=latency) as openai_stub:
+        agentset.inject_faults(**faults)
+        openai_stub.inject_faults(faults["error_rate"], faults["rate_limit_rate"], seed=1)
+        config.AGENTSET_BASE_URL, config.OPENAI_BASE_URL = agentset.url, f"{openai_stub.url}/v1"
+
+        report = {"turns": turns, "threads": threads, "latency_s": latency, "faults": faults}
+        for operation in ("retrieve", "query"):
+            off = Resilience(max_attempts=1, max_hedge_ratio=0, failure_threshold=turns)
+            report[operation] = {
+                "off": run_mode(off, operation, turns, threads, (agentset, openai_stub)),
+                "on": run_mode(_resilience(), operation, turns, threads, (agentset, openai_stub)),
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent turns")
+    parser.add_argument("--latency", type=float, default=0.02, help="Normal stub latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02, help="Share of requests answered with 429")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of searches stalled")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Extra delay of a stalled request (s)")
+    args = parser.parse_args()
+    faults = {
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "slow_rate": args.slow_rate,
+        "slow_latency": args.slow_latency,
+    }
+    print(json.dumps(run(args.turns, args.threads, args.latency, faults), indent=2))
+
+
+if __name__ == "__main__":
+    main()
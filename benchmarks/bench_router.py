@@ -0,0 +1,131 @@
+"""
+Benchmark: fixed strongest model versus the "auto" model router
+
+Sends a mix of questions (short lookups, long questions, and
+"why/compare/explain" questions) through the sync pipeline in a thread
+pool, against stubs where every model answers after its own latency.
+Runs four modes: the strongest model fixed, "auto" routing, "auto" over
+two namespaces (hits merged with reciprocal-rank fusion), and "auto" with
+the strongest model degraded past the latency SLO (so its traffic should
+move to a faster tier). Reports latency percentiles and the share of
+completions each model served, and fails when fused results never reach
+the fast tier. Caches are off.
+
+Usage:
+    python -m benchmarks.bench_router --questions 300 --concurrency 16
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agentset_gradio_demo import config
+from agentset_gradio_demo.client_pool import ClientRegistry
+from agentset_gradio_demo.router import AUTO_MODEL, DEFAULT_TIERS, ModelRouter
+from benchmarks.common import summarize
+from benchmarks.stub_servers import AgentsetStub, OpenAIStub
+
+SHORT = ["What is the refund window", "Who owns the billing service", "Where is the API key page"]
+LONG = [
+    "Given the onboarding checklist, the security policy and the data retention rules in the "
+    "handbook, list every step a new contractor in the EU has to finish in their first week, "
+    "including which teams sign off on each step and the systems they need access to first"
+]
+REASONING = [
+    "Why did the ingestion pipeline switch to presigned uploads",
+    "Compare the standard and enterprise support plans",
+    "Explain the trade-offs of the retry policy",
+]
+
+
+def _questions(count: int, seed: int) -> list:
+    """Roughly 60% short lookups, 15% long questions and 25% reasoning questions."""
+    rng = random.Random(seed)
+    pools = [(SHORT, 0.6), (LONG, 0.15), (REASONING, 0.25)]
+    questions = []
+    for i in range(count):
+        pool = rng.choices([p for p, _ in pools], weights=[w for _, w in pools])[0]
+        questions.append(f"{rng.choice(pool)} ({i})")  # Distinct so nothing is coalesced
+    return questions
+
+
+def run_mode(
+    model: str, router: ModelRouter, questions: list, concurrency: int, openai_stub, namespaces: list = None
+) -> dict:
+    registry = ClientRegistry(router=router)
+    rag = registry.get_rag_system("ns_bench", "token", "sk-bench", config.SYSTEM_PROMPT, model=model)
+    openai_stub.model_counts.clear()
+
+    def one(question):
+        start = time.perf_counter()
+        rag.query(question, namespaces=namespaces)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, questions))
+    wall = time.perf_counter() - start
+    total = sum(openai_stub.model_counts.values()) or 1
+    return {
+        "wall_s": round(wall, 3),
+        "model_share": {
+            name: round(count / total, 3) for name, count in openai_stub.model_counts.most_common()
+        },
+        **summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub server latency (s)")
+    parser.add_argument(
+        "--model-latency",
+        default="gpt-4o-mini=0.1,gpt-4o=0.3,gpt-5.1=1.0",
+        help="Comma-separated model=seconds added to every completion",
+    )
+    parser.add_argument("--degraded", type=float, default=3.0, help="Strongest model's latency in the degraded mode (s)")
+    parser.add_argument("--slo", type=float, default=2.0, help="Router p95 latency SLO (s)")
+    args = parser.parse_args()
+
+    model_latency = {
+        name: float(seconds)
+        for name, seconds in (item.split("=") for item in args.model_latency.split(","))
+    }
+    strongest = DEFAULT_TIERS[-1]["model"]
+    questions = _questions(args.questions, seed=0)
+    config.RETRIEVAL_CACHE_ENABLED = config.RESPONSE_CACHE_ENABLED = False
+
+    def router():
+        return ModelRouter(latency_slo=args.slo, min_samples=10)
+
+    # A 0.05 score step gives a clear best chunk, so short lookups can use the fast tier
+    with AgentsetStub(latency=args.latency, score_step=0.05) as agentset, OpenAIStub(
+        latency=args.latency, model_latency=model_latency
+    ) as openai_stub:
+        config.AGENTSET_BASE_URL, config.OPENAI_BASE_URL = agentset.url, f"{openai_stub.url}/v1"
+        report = {"questions": args.questions, "concurrency": args.concurrency, "model_latency": dict(model_latency)}
+        report["fixed"] = run_mode(strongest, router(), questions, args.concurrency, openai_stub)
+        report["auto"] = run_mode(AUTO_MODEL, router(), questions, args.concurrency, openai_stub)
+        report["auto_fused"] = run_mode(
+            AUTO_MODEL, router(), questions, args.concurrency, openai_stub, namespaces=["ns_bench", "ns_extra"]
+        )
+        openai_stub.model_latency[strongest] = args.degraded
+        report["auto_degraded"] = run_mode(AUTO_MODEL, router(), questions, args.concurrency, openai_stub)
+    fast = DEFAULT_TIERS[0]["model"]
+    report["failures"] = [
+        f"{mode}: no question was routed to {fast}"
+        for mode in ("auto", "auto_fused")
+        if not report[mode]["model_share"].get(fast)
+    ]
+    print(json.dumps(report, indent=2))
+    if report["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
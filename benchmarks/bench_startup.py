@@ -0,0 +1,130 @@
+"""
+Benchmark: cold-start import time of the package modules
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter per
+module and sample, reports the total import time and the heaviest imports,
+and times building the UI and the ASGI app. Also checks an import-time
+budget and that modules which should stay light do not pull in the heavy SDKs.
+Exits with status 1 when a budget or forbidden-import check fails.
+
+Usage:
+    python -m benchmarks.bench_startup --samples 3 --top 10
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+
+from benchmarks.common import summarize
+
+# Module -> (import budget in ms, top-level packages it must not load)
+CHECKS = {
+    "agentset_gradio_demo.config": (200, ("gradio", "openai", "agentset", "httpx", "requests")),
+    "agentset_gradio_demo.cli": (250, ("gradio", "openai", "agentset", "httpx", "requests")),
+    "agentset_gradio_demo.rag_system": (500, ("gradio", "openai", "agentset", "httpx", "tiktoken", "numpy")),
+    "agentset_gradio_demo.client_pool": (500, ("gradio", "openai", "agentset", "httpx", "numpy")),
+    "agentset_gradio_demo.document_ingester": (500, ("gradio", "openai", "agentset", "requests", "numpy")),
+    "agentset_gradio_demo.app": (15000, ("openai", "agentset")),
+}
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+BUILD_SNIPPET = """
+import time
+start = time.perf_counter()
+from agentset_gradio_demo import app
+imported = time.perf_counter()
+app.build_demo()
+built = time.perf_counter()
+app.create_app()
+print(imported - start, built - imported, time.perf_counter() - built)
+"""
+
+
+def import_profile(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        Dict with total_ms, the loaded module names and per-module cumulative ms
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2)) / 1000
+    return {"total_ms": cumulative.get(module, 0.0), "cumulative_ms": cumulative}
+
+
+def heaviest(cumulative_ms: dict, top: int) -> list:
+    """Top-level packages ranked by their cumulative import time."""
+    roots = {name: ms for name, ms in cumulative_ms.items() if "." not in name}
+    return [
+        {"module": name, "ms": round(ms, 1)}
+        for name, ms in sorted(roots.items(), key=lambda item: -item[1])[:top]
+    ]
+
+
+def build_times(samples: int) -> dict:
+    """Time importing app, building the Blocks UI and creating the ASGI app."""
+    imports, builds, apps = [], [], []
+    for _ in range(samples):
+        out = subprocess.run(
+            [sys.executable, "-c", BUILD_SNIPPET], capture_output=True, text=True, check=True
+        ).stdout.split()
+        imports.append(float(out[0]))
+        builds.append(float(out[1]))
+        apps.append(float(out[2]))
+    return {"import_app": summarize(imports), "build_demo": summarize(builds), "create_app": summarize(apps)}
+
+
+def run(samples: int, top: int, budget_scale: float) -> dict:
+    results, failures = {}, []
+    for module, (budget_ms, forbidden) in CHECKS.items():
+        profiles = [import_profile(module) for _ in range(samples)]
+        totals = [p["total_ms"] / 1000 for p in profiles]
+        loaded = profiles[-1]["cumulative_ms"]
+        summary = summarize(totals)
+        budget = budget_ms * budget_scale
+        leaked = sorted(name for name in forbidden if name in loaded)
+
+        if summary["p50_ms"] > budget:
+            failures.append(f"{module}: {summary['p50_ms']:.0f}ms over the {budget:.0f}ms budget")
+        if leaked:
+            failures.append(f"{module}: imports {', '.join(leaked)}")
+        results[module] = {
+            "import": summary,
+            "budget_ms": budget,
+            "modules_loaded": len(loaded),
+            "forbidden_loaded": leaked,
+            "heaviest": heaviest(loaded, top),
+        }
+
+    return {"samples": samples, "modules": results, "ui": build_times(samples), "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=3, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest imports to list per module")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="Multiply every import budget (e.g. 2 on slow CI machines)")
+    args = parser.parse_args()
+
+    report = run(args.samples, args.top, args.budget_scale)
+    print(json.dumps(report, indent=2))
+    if report["failures"]:
+        print("\n".join(report["failures"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: peak memory of ingest_local_file for a large synthetic file
+
+Each upload runs in a fresh child process so its peak RSS can be measured in
+isolation; the stub upload sink runs in this process and discards the body.
+
+Usage:
+    python -m benchmarks.bench_upload_memory --size-mb 4096
+    python -m benchmarks.bench_upload_memory --size-mb 512 --baseline
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.stub_servers import AgentsetStub
+
+_CHILD_SCRIPT = """
+import json, logging, resource, sys, time
+logging.disable(logging.INFO)
+from agentset import Agentset
+from agentset_gradio_demo.document_ingester import DocumentIngester
+
+mode, server_url, path = sys.argv[1:4]
+client = Agentset(namespace_id="ns_bench", token="token", server_url=server_url)
+ingester = DocumentIngester("ns_bench", "token", client=client)
+start = time.perf_counter()
+if mode == "streaming":
+    result = ingester.ingest_local_file(path)
+else:
+    # The pre-streaming implementation: read the whole file, then PUT it
+    import os, requests
+    upload = client.uploads.create(file_name="bench.bin", file_size=os.stat(path).st_size,
+                                   content_type="application/octet-stream")
+    with open(path, "rb") as f:
+        data = f.read()
+    requests.put(upload.data.url, data=data, headers={"Content-Type": "application/octet-stream"})
+    result = {"success": True}
+elapsed = time.perf_counter() - start
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"success": result["success"], "elapsed_s": elapsed, "peak_rss_mb": peak_kb / 1024}))
+"""
+
+
+def measure(mode: str, server_url: str, path: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD_SCRIPT, mode, server_url, path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    size_mb = os.stat(path).st_size / (1024 * 1024)
+    result["throughput_mb_s"] = round(size_mb / result["elapsed_s"], 1)
+    result["elapsed_s"] = round(result["elapsed_s"], 3)
+    result["peak_rss_mb"] = round(result["peak_rss_mb"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=2048, help="Synthetic file size")
+    parser.add_argument(
+        "--baseline", action="store_true", help="Also measure the read-everything upload"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, AgentsetStub() as agentset:
+        path = os.path.join(tmp, "synthetic.bin")
+        with open(path, "wb") as f:
+            f.truncate(args.size_mb * 1024 * 1024)  # sparse: no disk cost
+
+        report = {"size_mb": args.size_mb, "streaming": measure("streaming", agentset.url, path)}
+        if args.baseline:
+            report["read_all"] = measure("read_all", agentset.url, path)
+        report["sink_received_mb"] = round(agentset.uploaded_bytes / (1024 * 1024), 1)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare two benchmark reports produced by benchmarks/run.py
+
+Prints the relative change per scenario and metric, and exits non-zero when a
+latency percentile regresses (or throughput drops) by more than --threshold.
+
+Usage:
+    python -m benchmarks.compare base.json new.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+
+# metric -> True when higher is better
+METRICS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+}
+
+
+def compare(base: dict, new: dict, threshold: float) -> tuple:
+    """Return (rows, regressions) comparing two reports' shared scenarios."""
+    rows, regressions = [], []
+    for scenario in sorted(set(base["scenarios"]) & set(new["scenarios"])):
+        for metric, higher_is_better in METRICS.items():
+            old_value = base["scenarios"][scenario].get(metric)
+            new_value = new["scenarios"][scenario].get(metric)
+            if not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            worse = -change if higher_is_better else change
+            rows.append((scenario, metric, old_value, new_value, change))
+            if worse > threshold:
+                regressions.append((scenario, metric, change))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base", help="Baseline report")
+    parser.add_argument("new", help="Report to compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows, regressions = compare(base, new, args.threshold)
+    print(f"{'scenario':<20} {'metric':<16} {base.get('commit', 'base'):>12} "
+          f"{new.get('commit', 'new'):>12} {'change':>9}")
+    for scenario, metric, old_value, new_value, change in rows:
+        print(f"{scenario:<20} {metric:<16} {old_value:>12.2f} {new_value:>12.2f} {change:>+8.1f}%")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}%:")
+        for scenario, metric, change in regressions:
+            print(f"  {scenario} {metric}: {change:+.1f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
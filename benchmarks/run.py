@@ -0,0 +1,333 @@
+"""
+Benchmark suite runner: drives the RAG, ingestion and chat paths against local stubs
+
+Reports throughput and p50/p95/p99 latency per scenario as JSON that can be
+diffed across commits with benchmarks/compare.py.
+
+Usage:
+    python -m benchmarks.run --users 16 --requests 400 --output bench.json
+    python -m benchmarks.run --scenario rag_query --scenario chat --latency 0.05
+    python -m benchmarks.run --stubs-subprocess  # stubs in their own process
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agentset_gradio_demo import config
+from benchmarks.common import summarize
+from benchmarks.stub_servers import AgentsetStub, OpenAIStub
+
+NAMESPACE, TOKEN, OPENAI_KEY = "ns_bench", "token", "sk-bench"
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _run_threads(call, users: int, requests: int) -> dict:
+    """Run call(i) for i in range(requests) on `users` threads and summarize latencies."""
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            call(i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, str(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        outcomes = list(pool.map(timed, range(requests)))
+    return _report(outcomes, time.perf_counter() - start)
+
+
+def _report(outcomes: list, wall: float) -> dict:
+    latencies = [latency for latency, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+    report = {
+        "requests": len(outcomes),
+        "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        **summarize(latencies),
+    }
+    if errors:
+        report["first_error"] = errors[0]
+    return report
+
+
+def bench_rag_query(registry, users: int, requests: int, **_) -> dict:
+    rag = registry.get_rag_system(NAMESPACE, TOKEN, OPENAI_KEY, config.SYSTEM_PROMPT)
+    # Unique questions so caches do not hide the upstream round-trips
+    return _run_threads(lambda i: rag.query(f"benchmark question {i}", use_cache=False), users, requests)
+
+
+def bench_rag_multi_query(registry, users: int, requests: int, **_) -> dict:
+    """Compound questions fanned out into parallel sub-query searches across two namespaces."""
+    rag = registry.get_rag_system(NAMESPACE, TOKEN, OPENAI_KEY, config.SYSTEM_PROMPT)
+    return _run_threads(
+        lambda i: rag.query(
+            f"how does question {i} work and what limits apply; compared to the old setup",
+            use_cache=False,
+            multi_query=True,
+            namespaces=[NAMESPACE, f"{NAMESPACE}_extra"],
+        ),
+        users,
+        requests,
+    )
+
+
+def bench_ingest_text(registry, users: int, requests: int, payload_bytes: int, **_) -> dict:
+    ingester = registry.get_ingester(NAMESPACE, TOKEN)
+    text = "x" * payload_bytes
+
+    def call(i):
+        result = ingester.ingest_text(text, f"doc-{i}.txt")
+        if not result["success"]:
+            raise RuntimeError(result["message"])
+
+    return _run_threads(call, users, requests)
+
+
+def bench_ingest_url(registry, users: int, requests: int, **_) -> dict:
+    ingester = registry.get_ingester(NAMESPACE, TOKEN)
+
+    def call(i):
+        result = ingester.ingest_file_from_url(f"doc-{i}", f"https://example.com/doc-{i}.pdf")
+        if not result["success"]:
+            raise RuntimeError(result["message"])
+
+    return _run_threads(call, users, requests)
+
+
+def bench_ingest_local_file(registry, users: int, requests: int, payload_bytes: int, **_) -> dict:
+    ingester = registry.get_ingester(NAMESPACE, TOKEN)
+    with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as f:
+        f.write(b"x" * payload_bytes)
+    try:
+
+        def call(i):
+            result = ingester.ingest_local_file(f.name, f"doc-{i}.txt")
+            if not result["success"]:
+                raise RuntimeError(result["message"])
+
+        return _run_threads(call, users, requests)
+    finally:
+        os.unlink(f.name)
+
+
+def bench_ingest_resync(registry, users: int, requests: int, payload_bytes: int, **_) -> dict:
+    """Ingest a folder, change a tenth of it, then sync it again through the ingest manifest."""
+    from agentset_gradio_demo.manifest import IngestManifest
+
+    registry.manifest = IngestManifest(":memory:")
+    ingester = registry.get_ingester(NAMESPACE, TOKEN)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for i in range(requests):
+            paths.append(os.path.join(folder, f"doc-{i}.txt"))
+            with open(paths[-1], "wb") as f:
+                f.write(f"document {i} ".encode() + os.urandom(payload_bytes))
+
+        passes = {}
+        for name in ("initial", "resync"):
+            if name == "resync":
+                for path in paths[::10]:
+                    with open(path, "ab") as f:
+                        f.write(b" edited")
+            summary = ingester.ingest_batch(paths, concurrency=users, max_retries=0)
+            passes[name] = {
+                key: summary[key] for key in ("succeeded", "failed", "skipped", "replaced", "bytes_saved")
+            }
+            passes[name]["wall_s"] = round(summary["elapsed_seconds"], 3)
+            passes[name]["docs_per_second"] = round(summary["docs_per_second"], 2)
+    return {**passes, "manifest": registry.manifest.report()}
+
+
+def bench_sync_directory(registry, users: int, requests: int, payload_bytes: int, **_) -> dict:
+    """Sync a folder of `requests` files, then re-sync after editing, adding and deleting 1% of them."""
+    from agentset_gradio_demo.manifest import IngestManifest
+
+    registry.manifest = IngestManifest(":memory:")
+    ingester = registry.get_ingester(NAMESPACE, TOKEN)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = [os.path.join(folder, f"dir-{i % 10}", f"doc-{i}.txt") for i in range(requests)]
+        for path in paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(os.urandom(payload_bytes))
+
+        report = {}
+        for name in ("initial", "unchanged", "one_percent_changed"):
+            if name == "one_percent_changed":
+                step = max(1, requests // max(1, requests // 100))
+                for i, path in enumerate(paths[::step]):
+                    if i % 3 == 0:
+                        os.remove(path)
+                    else:
+                        with open(path if i % 3 == 1 else path + ".new", "ab") as f:
+                            f.write(b" edited")
+            summary = ingester.sync_directory(folder, concurrency=users, max_retries=0)
+            report[name] = {
+                key: summary[key] for key in ("scanned", "succeeded", "failed", "unchanged", "deleted")
+            }
+            report[name]["wall_s"] = round(summary["elapsed_seconds"], 3)
+    return report
+
+
+def bench_chat(registry, users: int, requests: int, **_) -> dict:
+    """Drive the Gradio chat handler the way the UI does, one coroutine per user."""
+    return _run_chat(users, requests, prefetch=False)
+
+
+def bench_chat_prefetch(registry, users: int, requests: int, latency: float, **_) -> dict:
+    """
+    Chat with speculative prefetch: each user pauses while typing (triggering
+    a prefetch) and submits shortly after. Latency is measured from submit.
+    """
+    return _run_chat(users, requests, prefetch=True, typing_pause=latency * 2)
+
+
+def _run_chat(users: int, requests: int, prefetch: bool, typing_pause: float = 0.0) -> dict:
+    from types import SimpleNamespace
+
+    from agentset_gradio_demo import app
+
+    app.registry.clear()
+
+    async def run():
+        semaphore = asyncio.Semaphore(users)
+
+        async def one(i):
+            async with semaphore:
+                # One browser session per question, each with its own chat history
+                state = app.AppState()
+                state.openai_api_key, state.agentset_api_key, state.agentset_namespace = OPENAI_KEY, TOKEN, NAMESPACE
+                question = f"chat question {i} about the refund policy{' (prefetched)' if prefetch else ''}"
+                request = SimpleNamespace(session_hash=f"bench-{i}")
+                if prefetch:
+                    await app.prefetch(question, state, request)
+                    await asyncio.sleep(app.prefetcher.debounce + typing_pause)
+                start = time.perf_counter()
+                history = []
+                async for history, _ in app.chat(question, state, request):
+                    pass
+                reply = history[-1]["content"] if history else ""
+                error = reply if reply.startswith("Error:") else None
+                return time.perf_counter() - start, error
+
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(one(i) for i in range(requests)))
+        return _report(list(outcomes), time.perf_counter() - start)
+
+    return asyncio.run(run())
+
+
+SCENARIOS = {
+    "rag_query": bench_rag_query,
+    "rag_multi_query": bench_rag_multi_query,
+    "ingest_text": bench_ingest_text,
+    "ingest_url": bench_ingest_url,
+    "ingest_local_file": bench_ingest_local_file,
+    "ingest_resync": bench_ingest_resync,
+    "sync_directory": bench_sync_directory,
+    "chat": bench_chat,
+    "chat_prefetch": bench_chat_prefetch,
+}
+
+
+def _start_stubs(args):
+    """Start the stub servers in-process or in a child process; returns (urls, stop)."""
+    stub_args = [
+        "--latency", str(args.latency),
+        "--num-results", str(args.num_results),
+        "--chunk-chars", str(args.chunk_chars),
+        "--completion-words", str(args.completion_words),
+    ]
+    if args.stubs_subprocess:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_servers", *stub_args],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        urls = json.loads(proc.stdout.readline())
+        return urls, proc.terminate
+
+    agentset = AgentsetStub(args.latency, args.num_results, args.chunk_chars).start()
+    openai_stub = OpenAIStub(args.latency, args.completion_words).start()
+
+    def stop():
+        agentset.stop()
+        openai_stub.stop()
+
+    return {"agentset_url": agentset.url, "openai_url": f"{openai_stub.url}/v1"}, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent users")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per request (s)")
+    parser.add_argument("--num-results", type=int, default=10, help="Search results per query")
+    parser.add_argument("--chunk-chars", type=int, default=500, help="Characters per search result")
+    parser.add_argument("--completion-words", type=int, default=50, help="Words per generated answer")
+    parser.add_argument("--payload-bytes", type=int, default=4096, help="Size of ingested documents")
+    parser.add_argument("--stubs-subprocess", action="store_true",
+                        help="Run the stub servers in a separate process")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    urls, stop = _start_stubs(args)
+    config.AGENTSET_BASE_URL, config.OPENAI_BASE_URL = urls["agentset_url"], urls["openai_url"]
+
+    # Imported after the base URLs are set so pooled clients point at the stubs
+    from agentset_gradio_demo.client_pool import ClientRegistry
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "scenario")},
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            registry = ClientRegistry()
+            report["scenarios"][name] = SCENARIOS[name](
+                registry,
+                users=args.users,
+                requests=args.requests,
+                payload_bytes=args.payload_bytes,
+                latency=args.latency,
+            )
+            print(f"{name}: {json.dumps(report['scenarios'][name])}", file=sys.stderr)
+    finally:
+        stop()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Stub Servers - Local stand-ins for the Agentset and OpenAI HTTP APIs
+Used by the benchmarks so they can run offline with controllable latency
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+LOREM = (
+    "Agentset stores documents as chunks and retrieves the most relevant ones "
+    "for each question. "
+)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Request handler that dispatches to the owning stub server's routes."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def iter_body(self):
+        """Yield the request body in chunks without buffering it."""
+        remaining = int(self.headers.get("Content-Length") or 0)
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def read_body(self) -> bytes:
+        return b"".join(self.iter_body())
+
+    def send_json(self, payload: dict, status: int = 200, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method: str):
+        self.server.stub.request_count += 1
+        for route_method, pattern, handler in self.server.stub.routes:
+            match = re.fullmatch(pattern, self.path.split("?")[0])
+            if route_method == method and match:
+                if self.server.stub.latency:
+                    time.sleep(self.server.stub.latency)
+                if not self.server.stub.fault(self):
+                    handler(self, *match.groups())
+                return
+        self.read_body()
+        self.send_json({"error": f"No route for {method} {self.path}"}, 404)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 drops bursts of connections
+
+
+class StubServer:
+    """
+    Base class for a threaded local HTTP server running in the background.
+
+    Args:
+        latency: Seconds to sleep before answering every request
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.request_count = 0
+        self.fault_count = 0
+        self.routes = []
+        self.inject_faults()
+        self._httpd = None
+        self._thread = None
+
+    def inject_faults(
+        self,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 1.0,
+        retry_after: float = 0.1,
+        seed: int = 0,
+    ) -> "StubServer":
+        """
+        Make a share of requests fail or stall, like a degraded real API.
+
+        Args:
+            error_rate: Share of requests answered with 503
+            rate_limit_rate: Share of requests answered with 429 and a Retry-After header
+            slow_rate: Share of requests delayed by slow_latency (a tail-latency spike)
+            slow_latency: Extra seconds a slow request takes
+            retry_after: Seconds sent in the Retry-After header
+            seed: Seed for choosing the affected requests
+        """
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.retry_after = retry_after
+        self._fault_rng = random.Random(seed)
+        return self
+
+    def fault(self, handler) -> bool:
+        """Apply an injected fault to a request; True if it was answered with an error."""
+        roll = self._fault_rng.random()
+        if roll < self.error_rate + self.rate_limit_rate:
+            self.fault_count += 1
+            handler.read_body()
+            if roll < self.error_rate:
+                handler.send_json(self.error_body(503, "Service unavailable"), 503)
+            else:
+                handler.send_json(
+                    self.error_body(429, "Rate limit exceeded"),
+                    429,
+                    headers={"Retry-After": str(self.retry_after)},
+                )
+            return True
+        if self._fault_rng.random() < self.slow_rate:
+            self.fault_count += 1
+            time.sleep(self.slow_latency)
+        return False
+
+    def error_body(self, status: int, message: str) -> dict:
+        """JSON body of an injected error response, in the API's error format."""
+        return {"error": {"message": message, "type": "rate_limit_error" if status == 429 else "server_error"}}
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._httpd = _StubHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._httpd.stub = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class AgentsetStub(StubServer):
+    """
+    Fake Agentset API: search, presigned uploads and ingest jobs.
+
+    Args:
+        latency: Seconds to sleep before answering every request
+        num_results: Number of chunks returned by every search
+        chunk_chars: Size of every returned chunk in characters
+        polls_to_complete: Status lookups before a job reports COMPLETED
+        score_step: Score drop between consecutive chunks (the first scores 1.0)
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        num_results: int = 10,
+        chunk_chars: int = 500,
+        polls_to_complete: int = 2,
+        score_step: float = 0.02,
+    ):
+        super().__init__(latency)
+        self.num_results = num_results
+        self.score_step = score_step
+        self.chunk_chars = chunk_chars
+        self.polls_to_complete = polls_to_complete
+        self.jobs = {}
+        self.uploaded_bytes = 0
+        self._lock = threading.Lock()
+        ns = r"/v1/namespace/([^/]+)"
+        self.routes = [
+            ("POST", ns + r"/search", self._search),
+            ("POST", ns + r"/uploads", self._create_upload),
+            ("PUT", r"/upload/([^/]+)", self._put_upload),
+            ("POST", ns + r"/ingest-jobs", self._create_job),
+            ("GET", ns + r"/ingest-jobs", self._list_jobs),
+            ("GET", ns + r"/ingest-jobs/([^/]+)", self._get_job),
+            ("DELETE", ns + r"/ingest-jobs/([^/]+)", self._delete_job),
+        ]
+
+    def error_body(self, status: int, message: str) -> dict:
+        code = "rate_limit_exceeded" if status == 429 else "internal_server_error"
+        return {"success": False, "error": {"code": code, "message": message}}
+
+    def _search(self, handler, namespace_id):
+        query = json.loads(handler.read_body() or b"{}").get("query", "")
+        words = (LOREM * (self.chunk_chars // len(LOREM) + 1)).split()
+        data = []
+        for i in range(self.num_results):
+            # Distinct word order per chunk so they do not collapse as duplicates
+            random.Random(i).shuffle(words)
+            text = " ".join(words)[: self.chunk_chars]
+            data.append({"id": f"chunk-{i}", "score": round(1.0 - i * self.score_step, 3), "text": f"[{query}] {text}"})
+        handler.send_json({"success": True, "data": data})
+
+    def _create_upload(self, handler, namespace_id):
+        handler.read_body()
+        key = f"uploads/{uuid.uuid4().hex}"
+        handler.send_json(
+            {"success": True, "data": {"url": f"{self.url}/upload/{key[8:]}", "key": key}},
+            201,
+        )
+
+    def _put_upload(self, handler, key):
+        received = sum(len(chunk) for chunk in handler.iter_body())
+        with self._lock:
+            self.uploaded_bytes += received
+        handler.send_response(200)
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+
+    def _job(self, job_id: str, namespace_id: str, status: str, payload: dict) -> dict:
+        return {
+            "id": job_id,
+            "namespaceId": namespace_id,
+            "tenantId": None,
+            "externalId": None,
+            "status": status,
+            "error": None,
+            "payload": payload,
+            "config": None,
+            "createdAt": "2024-01-01T00:00:00.000Z",
+            "queuedAt": None,
+            "preProcessingAt": None,
+            "processingAt": None,
+            "completedAt": None,
+            "failedAt": None,
+        }
+
+    def _create_job(self, handler, namespace_id):
+        request = json.loads(handler.read_body() or b"{}")
+        job_id = f"job_{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self.jobs[job_id] = {
+                "namespace_id": namespace_id,
+                "payload": request.get("payload", {}),
+                "polls": 0,
+            }
+        handler.send_json(
+            {"success": True, "data": self._job(job_id, namespace_id, "QUEUED", request.get("payload", {}))},
+            201,
+        )
+
+    def _status(self, job: dict) -> str:
+        return "COMPLETED" if job["polls"] >= self.polls_to_complete else "PROCESSING"
+
+    def _get_job(self, handler, namespace_id, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                handler.send_json({"success": False, "error": {"message": "not found"}}, 404)
+                return
+            job["polls"] += 1
+            status = self._status(job)
+        handler.send_json({"success": True, "data": self._job(job_id, namespace_id, status, job["payload"])})
+
+    def _list_jobs(self, handler, namespace_id):
+        params = parse_qs(urlsplit(handler.path).query)
+        per_page = int(float(params.get("perPage", ["30"])[0]))
+        offset = int(params.get("cursor", ["0"])[0])
+        with self._lock:
+            page = list(self.jobs.items())[offset : offset + per_page]
+            has_more = offset + per_page < len(self.jobs)
+            data = []
+            for job_id, job in page:
+                job["polls"] += 1
+                data.append(self._job(job_id, namespace_id, self._status(job), job["payload"]))
+        handler.send_json(
+            {
+                "success": True,
+                "data": data,
+                "pagination": {
+                    "nextCursor": str(offset + per_page) if has_more else None,
+                    "prevCursor": None,
+                    "hasMore": has_more,
+                },
+            }
+        )
+
+    def _delete_job(self, handler, namespace_id, job_id):
+        with self._lock:
+            self.jobs.pop(job_id, None)
+        handler.send_response(204)
+        handler.end_headers()
+
+
+class OpenAIStub(StubServer):
+    """
+    Fake OpenAI chat-completions API.
+
+    Args:
+        latency: Seconds to sleep before answering every request
+        completion_words: Number of words in every generated answer
+        token_interval: Seconds between streamed tokens
+        model_latency: Extra seconds before answering, per requested model (optional)
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        completion_words: int = 50,
+        token_interval: float = 0.0,
+        model_latency: dict = None,
+    ):
+        super().__init__(latency)
+        self.completion_words = completion_words
+        self.token_interval = token_interval
+        self.model_latency = model_latency or {}
+        self.model_counts = Counter()
+        self.routes = [("POST", r"/v1/chat/completions", self._chat)]
+
+    def _chat(self, handler):
+        request = json.loads(handler.read_body() or b"{}")
+        model = request.get("model", "stub")
+        self.model_counts[model] += 1
+        if self.model_latency.get(model):
+            time.sleep(self.model_latency[model])
+        if request.get("stream"):
+            self._chat_stream(handler, request)
+            return
+        answer = " ".join(["answer"] * self.completion_words)
+        handler.send_json(
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": sum(len(m.get("content", "")) // 4 for m in request.get("messages", [])),
+                    "completion_tokens": self.completion_words,
+                    "total_tokens": self.completion_words,
+                },
+            }
+        )
+
+    def _chat_stream(self, handler, request: dict):
+        """Answer with server-sent events, one word per chunk."""
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send(data: str):
+            payload = f"data: {data}\n\n".encode()
+            handler.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        for i in range(self.completion_words):
+            if self.token_interval:
+                time.sleep(self.token_interval)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [
+                    {"index": 0, "delta": {"content": "answer" if i == 0 else " answer"}, "finish_reason": None}
+                ],
+            }
+            send(json.dumps(chunk))
+        send("[DONE]")
+        handler.wfile.write(b"0\r\n\r\n")
+
+
+def main():
+    """Run both stub servers in the foreground (keeps them off the benchmark's GIL)."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local Agentset/OpenAI stub servers")
+    parser.add_argument("--latency", type=float, default=0.0, help="Per-request latency (s)")
+    parser.add_argument("--num-results", type=int, default=10, help="Chunks per search")
+    parser.add_argument("--chunk-chars", type=int, default=500, help="Characters per chunk")
+    parser.add_argument("--completion-words", type=int, default=50, help="Words per answer")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Delay between streamed tokens (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Extra delay of a slow request (s)")
+    args = parser.parse_args()
+
+    faults = dict(
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+    )
+    agentset = AgentsetStub(args.latency, args.num_results, args.chunk_chars).inject_faults(**faults).start()
+    openai_stub = OpenAIStub(args.latency, args.completion_words, args.token_interval).inject_faults(**faults).start()
+    print(json.dumps({"agentset_url": agentset.url, "openai_url": f"{openai_stub.url}/v1"}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()